@@ -0,0 +1,132 @@
+"""
+backend/audio_cache.py
+Byte-bounded in-memory LRU for hot audio clips.
+
+A few hundred prompt/target clips (alphabet lessons, early units) account for
+almost all playback traffic. Keeping their bytes in process memory lets the
+playback endpoints answer without a DB round trip or a disk read.
+
+Keys are (exercise_id, target_key, voice, variant); target_key is None for the
+exercise-level prompt audio and variant is "normalized", "original", "opus" or
+"low". CMS writes call invalidate_exercise(); the TTL bounds staleness across
+worker processes.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+AudioKey = tuple[int, Optional[str], str, str]
+
+
+@dataclass
+class CachedAudio:
+    audio_format: str
+    content_hash: str
+    data: bytes
+    # hash of the original upload (differs from content_hash for transcoded variants)
+    source_hash: Optional[str] = None
+    # the original, served because the requested variant doesn't exist (yet)
+    fallback: bool = False
+    created_at: float = field(default_factory=time.monotonic)
+
+    def as_row(self) -> dict:
+        """Same shape as the DB rows routes_audio serves."""
+        return {
+            "audio_format": self.audio_format,
+            "content_hash": self.content_hash,
+            "file_path": None,
+            "audio_data": self.data,
+            "source_hash": self.source_hash or self.content_hash,
+            "fallback": self.fallback,
+        }
+
+
+class AudioLRUCache:
+    """LRU keyed by AudioKey, bounded by total payload bytes (thread-safe)."""
+
+    def __init__(self, max_bytes: int, max_item_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self.ttl_seconds = ttl_seconds
+        self._items: "OrderedDict[AudioKey, CachedAudio]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _drop(self, key: AudioKey) -> None:
+        item = self._items.pop(key, None)
+        if item is not None:
+            self._bytes -= len(item.data)
+
+    def get(self, key: AudioKey) -> Optional[CachedAudio]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or time.monotonic() - item.created_at > self.ttl_seconds:
+                if item is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item
+
+    def put(self, key: AudioKey, item: CachedAudio) -> bool:
+        """Insert; returns False when the clip is too large to cache."""
+        size = len(item.data)
+        if size > self.max_item_bytes or size > self.max_bytes:
+            return False
+        with self._lock:
+            self._drop(key)
+            while self._items and self._bytes + size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted.data)
+                self.evictions += 1
+            self._items[key] = item
+            self._bytes += size
+        return True
+
+    def invalidate_exercise(self, exercise_id: int) -> None:
+        with self._lock:
+            for k in [k for k in self._items if k[0] == int(exercise_id)]:
+                self._drop(k)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "max_item_bytes": self.max_item_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# Shared per-process cache used by routes_audio.py
+audio_bytes_cache = AudioLRUCache(
+    max_bytes=_env_int("AUDIO_CACHE_MAX_MB", 64) * 1024 * 1024,
+    max_item_bytes=_env_int("AUDIO_CACHE_MAX_ITEM_KB", 512) * 1024,
+    ttl_seconds=_env_int("AUDIO_CACHE_TTL_SECONDS", 600),
+)
@@ -0,0 +1,339 @@
+"""
+backend/audio_jobs.py
+Background processing of stored audio: metadata, silence trimming, loudness
+normalization and smaller delivery variants.
+
+Every audio write enqueues an "audio_process" job (job_queue.py) in the same
+transaction as the row, so the job only runs once the row is committed and
+survives restarts. The job hands the CPU-heavy part to a process pool, off the
+request path. For each clip the pool:
+  - measures duration and peak/RMS levels (ffmpeg astats)
+  - trims leading/trailing silence and loudness-normalizes it, producing:
+      "normalized": mono MP3 96 kbps (default playback)
+      "opus":       mono Opus in Ogg 32 kbps
+      "low":        mono MP3 48 kbps for clients without Opus
+Back in the parent, the variants go into audio_store/audio_variants (keyed by
+the source content hash, so a clip shared by several exercises is processed
+once) and the metadata is written onto every row that uses the clip.
+
+Playback of a clip without variants (older rows, ffmpeg added later) queues
+the same job once per process (schedule_audio_processing).
+
+When ffmpeg is not installed scheduling is a no-op and playback keeps serving
+the original upload.
+"""
+import asyncio
+import multiprocessing
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from sqlalchemy import text
+
+from audio_pack import PACK_VARIANT, forget_packs_with
+from audio_store import put_bytes, resolve
+from database import engine
+from job_queue import PermanentJobError, enqueue_job, job_handler
+
+
+FFMPEG_BIN = os.getenv("FFMPEG_BIN") or shutil.which("ffmpeg")
+AUDIO_JOB_PROCESSES = int(os.getenv("AUDIO_JOB_PROCESSES", "2"))
+FFMPEG_TIMEOUT_SECONDS = 120
+AUDIO_JOB_KIND = "audio_process"
+# how long a lazy backfill counts as "processing" (fallback not cached meanwhile)
+BACKFILL_PENDING_SECONDS = 600
+
+# Analysis runs on a fixed format so "Number of samples" converts to seconds.
+ANALYSIS_RATE = 48000
+# Drop leading/trailing audio quieter than -50 dB (reverse trick trims the tail).
+TRIM = (
+    "silenceremove=start_periods=1:start_threshold=-50dB:start_silence=0.05,"
+    "areverse,"
+    "silenceremove=start_periods=1:start_threshold=-50dB:start_silence=0.05,"
+    "areverse"
+)
+# EBU R128-ish target; speech clips are short so single-pass loudnorm is enough
+LOUDNORM = "loudnorm=I=-16:TP=-1.5:LRA=11"
+
+VARIANTS = {
+    "normalized": {
+        "format": "mp3",
+        "args": ["-ac", "1", "-ar", "44100", "-c:a", "libmp3lame", "-b:a", "96k", "-f", "mp3"],
+    },
+    "opus": {
+        "format": "ogg",
+        "args": ["-ac", "1", "-ar", "48000", "-c:a", "libopus", "-b:a", "32k", "-f", "ogg"],
+    },
+    "low": {
+        "format": "mp3",
+        "args": ["-ac", "1", "-ar", "24000", "-c:a", "libmp3lame", "-b:a", "48k", "-f", "mp3"],
+    },
+}
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+# lazy backfills requested by this process (hash -> monotonic time): don't requeue on every playback miss
+_requested: dict[str, float] = {}
+_MAX_REQUESTED = 10000
+_state_lock = threading.Lock()
+
+
+def transcode_available() -> bool:
+    return bool(FFMPEG_BIN)
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is None:
+            # spawn: children must not inherit the parent's DB connections / threads
+            # (they only run process_clip and never connect)
+            _process_pool = ProcessPoolExecutor(
+                max_workers=AUDIO_JOB_PROCESSES, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_pool
+
+
+def enqueue_audio_processing(db, source_hash: Optional[str], file_path: Optional[str]) -> Optional[int]:
+    """Queue processing of a clip in the caller's transaction (audio writes)."""
+    if not transcode_available() or not source_hash or not file_path:
+        return None
+    # no dedupe: a queued job for the same hash may start before this row commits
+    return enqueue_job(db, AUDIO_JOB_KIND, {"source_hash": source_hash, "file_path": file_path})
+
+
+def schedule_audio_processing(source_hash: Optional[str], file_path: Optional[str]) -> bool:
+    """Lazy backfill from playback (the row is already committed).
+
+    True while the requested job should still be pending; a clip that failed
+    isn't requeued on every request (at most once per process).
+    """
+    if not transcode_available() or not source_hash or not file_path:
+        return False
+    now = time.monotonic()
+    with _state_lock:
+        requested_at = _requested.get(source_hash)
+        if requested_at is not None:
+            return now - requested_at < BACKFILL_PENDING_SECONDS
+        if len(_requested) >= _MAX_REQUESTED:
+            _requested.clear()
+        _requested[source_hash] = now
+    try:
+        with engine.begin() as conn:
+            enqueue_job(
+                conn,
+                AUDIO_JOB_KIND,
+                {"source_hash": source_hash, "file_path": file_path},
+                dedupe_key=f"{AUDIO_JOB_KIND}:{source_hash}",
+            )
+    except Exception as e:
+        print(f"[audio_jobs] could not queue backfill for {source_hash[:12]}: {e}")
+        return False
+    return True
+
+
+def shutdown_audio_jobs() -> None:
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
+
+
+# ------------------------------
+# Process-pool side (no DB access here)
+# ------------------------------
+
+def _ffmpeg(ffmpeg_bin: str, src_path: str, args: list[str], loglevel: str = "error") -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [ffmpeg_bin, "-hide_banner", "-nostdin", "-loglevel", loglevel, "-i", src_path, "-vn", *args],
+        capture_output=True,
+        timeout=FFMPEG_TIMEOUT_SECONDS,
+        check=True,
+    )
+
+
+def _parse_astats(stderr: str) -> dict:
+    def last(label: str) -> Optional[float]:
+        found = re.findall(rf"{label}:\s*(-?[\d.]+|-?inf)", stderr)
+        if not found:
+            return None
+        try:
+            return float(found[-1])
+        except ValueError:
+            return None
+
+    samples = last("Number of samples")
+    return {
+        "duration_seconds": round(samples / ANALYSIS_RATE, 3) if samples else None,
+        "peak_db": last("Peak level dB"),
+        "rms_db": last("RMS level dB"),
+    }
+
+
+def process_clip(ffmpeg_bin: str, src_path: str) -> dict:
+    """Analyze + render all variants of one clip. Runs in the process pool."""
+    stats = _ffmpeg(
+        ffmpeg_bin,
+        src_path,
+        ["-af", f"aformat=sample_rates={ANALYSIS_RATE}:channel_layouts=mono,astats=metadata=0", "-f", "null", "-"],
+        loglevel="info",  # astats prints its summary at info level
+    )
+    metadata = _parse_astats(stats.stderr.decode("utf-8", "replace"))
+
+    variants = {}
+    for name, spec in VARIANTS.items():
+        try:
+            out = _ffmpeg(ffmpeg_bin, src_path, ["-af", f"{TRIM},{LOUDNORM}", *spec["args"], "pipe:1"])
+        except subprocess.SubprocessError:
+            continue
+        if out.stdout:
+            variants[name] = out.stdout
+    return {"metadata": metadata, "variants": variants}
+
+
+# ------------------------------
+# Parent side
+# ------------------------------
+
+def process_stored_clip(source_hash: str, file_path: str) -> dict:
+    src = resolve(file_path)
+    if src is None:
+        return {"skipped": "file missing"}
+    with engine.connect() as conn:
+        existing = set(
+            conn.execute(
+                text("SELECT variant FROM audio_variants WHERE source_hash = :h"),
+                {"h": source_hash},
+            ).scalars().all()
+        )
+    if existing >= set(VARIANTS):
+        # already processed (shared clip): just copy the metadata onto new rows
+        with engine.begin() as conn:
+            missing = _copy_metadata(conn, source_hash)
+        if not missing:
+            return {"variants": sorted(existing), "copied_metadata": True}
+        # no row has metadata to copy from: analyze again below
+
+    try:
+        result = _pool().submit(process_clip, FFMPEG_BIN, str(src)).result(
+            timeout=FFMPEG_TIMEOUT_SECONDS * (len(VARIANTS) + 1)
+        )
+    except subprocess.CalledProcessError as e:
+        # ffmpeg rejects the file: retrying won't help
+        raise PermanentJobError(f"ffmpeg failed: {(e.stderr or b'').decode('utf-8', 'replace')[-300:]}") from e
+    _save_results(source_hash, result)
+    return {"variants": sorted(result["variants"]), "metadata": result["metadata"]}
+
+
+@job_handler(AUDIO_JOB_KIND)
+async def audio_process_job(job_id: int, payload: dict) -> dict:
+    if not transcode_available():
+        raise PermanentJobError("ffmpeg not installed on this worker")
+    return await asyncio.to_thread(process_stored_clip, payload["source_hash"], payload["file_path"])
+
+
+def _save_results(source_hash: str, result: dict) -> None:
+    meta = result["metadata"]
+    stored = {name: put_bytes(data, VARIANTS[name]["format"]) for name, data in result["variants"].items()}
+
+    with engine.begin() as conn:
+        for name, s in stored.items():
+            conn.execute(
+                text(
+                    """
+                    INSERT INTO audio_variants (
+                        source_hash, variant, audio_format, audio_size, file_path, content_hash, created_at
+                    ) VALUES (
+                        :source_hash, :variant, :audio_format, :audio_size, :file_path, :content_hash, NOW()
+                    )
+                    ON CONFLICT (source_hash, variant) DO UPDATE SET
+                        audio_format = EXCLUDED.audio_format,
+                        audio_size = EXCLUDED.audio_size,
+                        file_path = EXCLUDED.file_path,
+                        content_hash = EXCLUDED.content_hash,
+                        created_at = NOW()
+                    """
+                ),
+                {
+                    "source_hash": source_hash,
+                    "variant": name,
+                    "audio_format": VARIANTS[name]["format"],
+                    "audio_size": s.size,
+                    "file_path": s.file_path,
+                    "content_hash": s.content_hash,
+                },
+            )
+
+        for table in ("exercise_audio", "exercise_audio_targets"):
+            conn.execute(
+                text(
+                    f"""
+                    UPDATE {table}
+                    SET duration_seconds = :duration, peak_db = :peak, rms_db = :rms
+                    WHERE content_hash = :h
+                    """
+                ),
+                {"h": source_hash, "duration": meta["duration_seconds"], "peak": meta["peak_db"], "rms": meta["rms_db"]},
+            )
+        if PACK_VARIANT in stored:
+            forget_packs_with(conn, source_hash)
+
+
+def _copy_metadata(conn, source_hash: str) -> bool:
+    """Copy metadata from sibling rows; True if some row still has none."""
+    for table in ("exercise_audio", "exercise_audio_targets"):
+        conn.execute(
+            text(
+                f"""
+                UPDATE {table} t
+                SET duration_seconds = src.duration_seconds, peak_db = src.peak_db, rms_db = src.rms_db
+                FROM (
+                    SELECT duration_seconds, peak_db, rms_db FROM exercise_audio
+                    WHERE content_hash = :h AND duration_seconds IS NOT NULL
+                    UNION ALL
+                    SELECT duration_seconds, peak_db, rms_db FROM exercise_audio_targets
+                    WHERE content_hash = :h AND duration_seconds IS NOT NULL
+                    LIMIT 1
+                ) src
+                WHERE t.content_hash = :h AND t.duration_seconds IS NULL
+                """
+            ),
+            {"h": source_hash},
+        )
+    return (
+        conn.execute(
+            text(
+                """
+                SELECT 1 FROM exercise_audio WHERE content_hash = :h AND duration_seconds IS NULL
+                UNION ALL
+                SELECT 1 FROM exercise_audio_targets WHERE content_hash = :h AND duration_seconds IS NULL
+                LIMIT 1
+                """
+            ),
+            {"h": source_hash},
+        ).first()
+        is not None
+    )
+
+
+def get_variant(db, source_hash: Optional[str], variant: str) -> Optional[dict]:
+    """Row shaped like the playback rows (audio_format, file_path, content_hash, audio_data)."""
+    if not source_hash or variant not in VARIANTS:
+        return None
+    row = db.execute(
+        text(
+            """
+            SELECT audio_format, file_path, content_hash, NULL AS audio_data
+            FROM audio_variants
+            WHERE source_hash = :h AND variant = :v
+            """
+        ),
+        {"h": source_hash, "v": variant},
+    ).mappings().first()
+    return dict(row) if row else None
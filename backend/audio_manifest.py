@@ -0,0 +1,124 @@
+"""
+backend/audio_manifest.py
+Precomputed per-lesson audio manifest.
+
+Every audio write (TTS generation, upload, recording, delete) rebuilds the
+manifest row for the affected lesson, so the client gets the list of available
+clips with a single-row lookup instead of probing /audio/... URLs one by one.
+"""
+import hashlib
+import json
+from typing import Optional
+from urllib.parse import quote
+
+from sqlalchemy import text
+
+from audio_store import url_version
+
+
+def rebuild_lesson_audio_manifest(db, lesson_id: int) -> dict:
+    """Recompute + store the manifest for one lesson. Returns {"lesson_id", "entries", "etag"}."""
+    rows = db.execute(
+        text(
+            """
+            SELECT e.id AS exercise_id, e."order" AS exercise_order,
+                   NULL::text AS target_key, a.voice_type AS voice,
+                   a.audio_format AS format, a.audio_size AS size, a.content_hash, a.updated_at
+            FROM exercises e
+            JOIN exercise_audio a ON a.exercise_id = e.id
+            WHERE e.lesson_id = :lid
+            UNION ALL
+            SELECT e.id, e."order",
+                   t.target_key, t.voice_type,
+                   t.audio_format, t.audio_size, t.content_hash, t.updated_at
+            FROM exercises e
+            JOIN exercise_audio_targets t ON t.exercise_id = e.id
+            WHERE e.lesson_id = :lid
+            ORDER BY exercise_order ASC, exercise_id ASC, target_key ASC NULLS FIRST, voice ASC
+            """
+        ),
+        {"lid": int(lesson_id)},
+    ).mappings().all()
+
+    entries = []
+    for r in rows:
+        entries.append(
+            {
+                "exercise_id": int(r["exercise_id"]),
+                "order": int(r["exercise_order"] or 0),
+                "target_key": r["target_key"],
+                "voice": r["voice"],
+                "format": r["format"],
+                "size": int(r["size"] or 0),
+                "hash": r["content_hash"],
+                "updated_at": r["updated_at"].isoformat() if r["updated_at"] else None,
+            }
+        )
+
+    raw = json.dumps(entries, sort_keys=True, separators=(",", ":"))
+    etag = hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    db.execute(
+        text(
+            """
+            INSERT INTO lesson_audio_manifest (lesson_id, entries, etag, built_at)
+            VALUES (:lid, CAST(:entries AS jsonb), :etag, NOW())
+            ON CONFLICT (lesson_id) DO UPDATE SET
+                entries = EXCLUDED.entries,
+                etag = EXCLUDED.etag,
+                packs = '{}'::jsonb,
+                built_at = NOW()
+            """
+        ),
+        {"lid": int(lesson_id), "entries": raw, "etag": etag},
+    )
+    return {"lesson_id": int(lesson_id), "entries": entries, "etag": etag}
+
+
+def rebuild_manifest_for_exercise(db, exercise_id: int) -> None:
+    """Rebuild the manifest of the lesson that owns exercise_id (no-op if it's gone)."""
+    lesson_id = db.execute(
+        text("SELECT lesson_id FROM exercises WHERE id = :id"),
+        {"id": int(exercise_id)},
+    ).scalar_one_or_none()
+    if lesson_id is not None:
+        rebuild_lesson_audio_manifest(db, int(lesson_id))
+
+
+def get_manifest_by_slug(db, slug: str) -> Optional[dict]:
+    """Return {"lesson_id", "entries", "etag"} for a lesson slug, building it on first use."""
+    row = db.execute(
+        text(
+            """
+            SELECT l.id AS lesson_id, m.entries, m.etag
+            FROM lessons l
+            LEFT JOIN lesson_audio_manifest m ON m.lesson_id = l.id
+            WHERE l.slug = :slug
+            """
+        ),
+        {"slug": slug},
+    ).mappings().first()
+    if not row:
+        return None
+
+    if row["entries"] is None:
+        return rebuild_lesson_audio_manifest(db, int(row["lesson_id"]))
+    return {"lesson_id": int(row["lesson_id"]), "entries": row["entries"], "etag": row["etag"]}
+
+
+def audio_url(entry: dict, versioned: bool = True) -> str:
+    """Playback URL for a manifest entry (same shape the client builds in tts.jsx).
+
+    Versioned URLs carry `v=<content hash prefix>` and are served as immutable;
+    replacing a recording changes the hash and therefore the URL.
+    """
+    # encodeURIComponent-compatible escaping so the preload matches the client's fetch URL
+    voice = quote(str(entry.get("voice") or "female"), safe="-_.!~*'()")
+    if entry.get("target_key"):
+        key = quote(str(entry["target_key"]), safe="-_.!~*'()")
+        url = f"/audio/target/{int(entry['exercise_id'])}?key={key}&voice={voice}"
+    else:
+        url = f"/audio/exercise/{int(entry['exercise_id'])}?voice={voice}"
+    if versioned and entry.get("hash"):
+        url += f"&v={url_version(entry['hash'])}"
+    return url
@@ -0,0 +1,298 @@
+"""
+backend/audio_pack.py
+Per-lesson audio packs: every clip of a lesson (one voice or all) concatenated
+into a single file with an offset index.
+
+A lesson plays ~40 short clips; fetching them one by one costs more in request
+overhead than the audio itself. The client downloads the pack once and slices
+clips locally.
+
+Pack layout (little-endian):
+    b"HYPK" | u16 version | u32 index length | index JSON | clip bytes...
+Offsets in the index are relative to the start of the clip bytes; the JSON
+index endpoint returns absolute offsets.
+
+Packs are content-addressed: the pack id hashes the list of clips (by content
+hash), so any audio change in the lesson yields a new id and the pack is
+rebuilt on the next request. Files are immutable once written and are read
+through mmap.
+
+The id of the pack built for the current manifest is kept on the manifest row
+(lesson_audio_manifest.packs), so later requests skip the clip query. It is
+cleared when the manifest is rebuilt or a clip of the lesson gets its
+PACK_VARIANT.
+"""
+import hashlib
+import json
+import mmap
+import os
+import re
+import shutil
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import text
+
+from audio_store import resolve, store_root
+
+
+PACK_MAGIC = b"HYPK"
+PACK_VERSION = 1
+PACK_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+# Packs prefer the processed playback variant when it exists (see audio_jobs.py).
+PACK_VARIANT = "normalized"
+MAX_OPEN_PACKS = 64
+
+
+def pack_clips(db, lesson_id: int, voice: Optional[str] = None) -> list[dict]:
+    """Stored clips of a lesson in manifest order, with the file each one is read from."""
+    rows = db.execute(
+        text(
+            """
+            SELECT c.exercise_id, c.target_key, c.voice,
+                   COALESCE(v.audio_format, c.audio_format) AS format,
+                   COALESCE(v.file_path, c.file_path) AS file_path,
+                   COALESCE(v.content_hash, c.content_hash) AS hash
+            FROM (
+                SELECT e.id AS exercise_id, e."order" AS exercise_order, NULL::text AS target_key,
+                       a.voice_type AS voice, a.audio_format, a.file_path, a.content_hash
+                FROM exercises e
+                JOIN exercise_audio a ON a.exercise_id = e.id
+                WHERE e.lesson_id = :lid
+                UNION ALL
+                SELECT e.id, e."order", t.target_key,
+                       t.voice_type, t.audio_format, t.file_path, t.content_hash
+                FROM exercises e
+                JOIN exercise_audio_targets t ON t.exercise_id = e.id
+                WHERE e.lesson_id = :lid
+            ) c
+            LEFT JOIN audio_variants v ON v.source_hash = c.content_hash AND v.variant = :variant
+            WHERE c.file_path IS NOT NULL
+              AND (CAST(:voice AS text) IS NULL OR c.voice = :voice)
+            ORDER BY c.exercise_order ASC, c.exercise_id ASC, c.target_key ASC NULLS FIRST, c.voice ASC
+            """
+        ),
+        {"lid": int(lesson_id), "voice": voice, "variant": PACK_VARIANT},
+    ).mappings().all()
+    return [dict(r) for r in rows]
+
+
+def pack_voice(voice_pref: Optional[str]) -> str:
+    """Pack voice for a learner's voice preference, as tts.jsx picks it ('' = both voices)."""
+    v = (voice_pref or "").strip().lower()
+    if v in ("male", "female"):
+        return v
+    if v in ("random", "both", "all"):
+        return ""
+    return "female"
+
+
+def preload_link_header(db, slug: str, voice: str) -> Optional[str]:
+    """`Link: rel=preload` for the pack the client will download, once one was built for the current manifest."""
+    pack_id = db.execute(
+        text(
+            """
+            SELECT m.packs ->> :voice
+            FROM lessons l
+            JOIN lesson_audio_manifest m ON m.lesson_id = l.id
+            WHERE l.slug = :slug
+            """
+        ),
+        {"slug": slug, "voice": voice},
+    ).scalar()
+    if not pack_id or open_pack(pack_id) is None:
+        return None
+    # same URL tts.jsx fetches after reading the pack index, so the preload is reused
+    return f"</audio/packs/{pack_id}>; rel=preload; as=fetch; crossorigin=anonymous"
+
+
+def stored_pack(db, lesson_id: int, voice: Optional[str]) -> tuple[Optional[str], Optional[tuple[str, dict]]]:
+    """(manifest etag, (pack_id, index) of the pack remembered for it, if still on disk)."""
+    row = db.execute(
+        text("SELECT etag, packs ->> :voice AS pack_id FROM lesson_audio_manifest WHERE lesson_id = :lid"),
+        {"lid": int(lesson_id), "voice": voice or ""},
+    ).mappings().first()
+    if row is None:
+        return None, None
+    index = read_index(row["pack_id"]) if row["pack_id"] else None
+    return row["etag"], ((row["pack_id"], index) if index is not None else None)
+
+
+def remember_pack(db, lesson_id: int, voice: Optional[str], etag: Optional[str], pack_id: str) -> None:
+    """Record pack_id for the manifest it was built from (no-op if the manifest changed since)."""
+    if etag is None:
+        return
+    db.execute(
+        text(
+            """
+            UPDATE lesson_audio_manifest
+            SET packs = packs || jsonb_build_object(CAST(:voice AS text), CAST(:pack_id AS text))
+            WHERE lesson_id = :lid AND etag = :etag
+            """
+        ),
+        {"lid": int(lesson_id), "voice": voice or "", "pack_id": pack_id, "etag": etag},
+    )
+
+
+def forget_packs_with(db, content_hash: str) -> None:
+    """Drop remembered packs of every lesson that plays content_hash (its variant just changed)."""
+    db.execute(
+        text(
+            """
+            UPDATE lesson_audio_manifest
+            SET packs = '{}'::jsonb
+            WHERE packs <> '{}'::jsonb
+              AND lesson_id IN (
+                SELECT e.lesson_id FROM exercises e
+                JOIN exercise_audio a ON a.exercise_id = e.id
+                WHERE a.content_hash = :h
+                UNION
+                SELECT e.lesson_id FROM exercises e
+                JOIN exercise_audio_targets t ON t.exercise_id = e.id
+                WHERE t.content_hash = :h
+              )
+            """
+        ),
+        {"h": content_hash},
+    )
+
+
+def pack_id_for(clips: list[dict]) -> str:
+    raw = json.dumps(
+        [[c["exercise_id"], c["target_key"], c["voice"], c["hash"]] for c in clips],
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(f"v{PACK_VERSION}:{raw}".encode("utf-8")).hexdigest()[:32]
+
+
+def pack_root() -> Path:
+    return store_root() / "packs"
+
+
+def pack_path(pack_id: str) -> Path:
+    return pack_root() / f"{pack_id}.pack"
+
+
+def build_pack(clips: list[dict]) -> tuple[str, dict]:
+    """Write the pack for `clips` unless it already exists. Returns (pack_id, index).
+
+    Clips whose file is missing from the store are left out.
+    """
+    pack_id = pack_id_for(clips)
+    dest = pack_path(pack_id)
+    if dest.exists():
+        index = read_index(pack_id)
+        if index is not None:
+            return pack_id, index
+
+    sources = []
+    entries = []
+    offset = 0
+    for c in clips:
+        src = resolve(c["file_path"])
+        if src is None:
+            continue
+        size = src.stat().st_size
+        entries.append(
+            {
+                "exercise_id": int(c["exercise_id"]),
+                "target_key": c["target_key"],
+                "voice": c["voice"],
+                "format": c["format"],
+                "hash": c["hash"],
+                "offset": offset,
+                "length": size,
+            }
+        )
+        sources.append((src, size))
+        offset += size
+
+    index = {"version": PACK_VERSION, "clips": entries}
+    raw = json.dumps(index, separators=(",", ":")).encode("utf-8")
+
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dest.parent, prefix=".pack-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(PACK_MAGIC + struct.pack("<HI", PACK_VERSION, len(raw)) + raw)
+            for src, size in sources:
+                with open(src, "rb") as f:
+                    # exact length recorded in the index, even if the file changed meanwhile
+                    shutil.copyfileobj(_Limited(f, size), out)
+        os.replace(tmp, dest)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    return pack_id, {**index, "data_offset": _header_size(raw)}
+
+
+class _Limited:
+    def __init__(self, f, limit: int):
+        self.f = f
+        self.left = limit
+
+    def read(self, n: int = -1) -> bytes:
+        if self.left <= 0:
+            return b""
+        n = self.left if n is None or n < 0 else min(n, self.left)
+        data = self.f.read(n)
+        if not data:
+            raise OSError("audio file shrank while packing")
+        self.left -= len(data)
+        return data
+
+
+def _header_size(raw_index: bytes) -> int:
+    return len(PACK_MAGIC) + struct.calcsize("<HI") + len(raw_index)
+
+
+# ------------------------------
+# Reading (mmap)
+# ------------------------------
+
+_maps: "OrderedDict[str, mmap.mmap]" = OrderedDict()
+_maps_lock = threading.Lock()
+
+
+def open_pack(pack_id: str) -> Optional[mmap.mmap]:
+    """Read-only mmap of a pack (kept open, LRU-bounded). None if it doesn't exist."""
+    if not PACK_ID_RE.match(pack_id or ""):
+        return None
+    with _maps_lock:
+        mm = _maps.get(pack_id)
+        if mm is not None:
+            _maps.move_to_end(pack_id)
+            return mm
+    try:
+        with open(pack_path(pack_id), "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    with _maps_lock:
+        _maps[pack_id] = mm
+        while len(_maps) > MAX_OPEN_PACKS:
+            # not closed explicitly: a response may still be streaming from it;
+            # the mapping goes away with the last reference
+            _maps.popitem(last=False)
+    return mm
+
+
+def read_index(pack_id: str) -> Optional[dict]:
+    mm = open_pack(pack_id)
+    head = struct.calcsize("<HI") + len(PACK_MAGIC)
+    if mm is None or len(mm) < head or mm[: len(PACK_MAGIC)] != PACK_MAGIC:
+        return None
+    version, length = struct.unpack("<HI", mm[len(PACK_MAGIC):head])
+    if version != PACK_VERSION:
+        return None
+    raw = mm[head:head + length]
+    index = json.loads(raw)
+    return {**index, "data_offset": head + length}
+
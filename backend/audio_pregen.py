@@ -0,0 +1,185 @@
+"""
+backend/audio_pregen.py
+Background TTS pre-generation for a lesson (job kind "lesson_tts_pregen").
+
+Publishing a lesson enqueues one job. The job walks the lesson's exercises,
+derives the same audio targets the CMS shows (prompt, letters, choices,
+tokens, ...) and synthesizes every (target, voice) pair that has no audio yet,
+so learners are served stored clips instead of waiting on ElevenLabs.
+
+Custom uploads and recordings are never replaced. A TTS clip whose text no
+longer matches the exercise (edited after generation) is regenerated.
+"""
+import asyncio
+import json
+from typing import Optional
+
+from sqlalchemy import text
+
+from database import engine
+from job_queue import enqueue_job, job_handler, set_job_progress
+from routes_audio import ELEVEN_API_KEY, _batch_generate_events
+
+
+PREGEN_JOB_KIND = "lesson_tts_pregen"
+PREGEN_VOICE_TYPES = ("female", "male")
+# progress is written every N items (and on the last one)
+PROGRESS_EVERY = 10
+
+
+def derive_audio_targets(kind: Optional[str], prompt: Optional[str], config) -> list[tuple[str, str]]:
+    """[(target_key, text)] for an exercise.
+
+    Mirrors deriveTargets() in src/cms/AudioTargetsManager.jsx; keep the keys in
+    sync, the learner player requests audio by these target keys.
+    """
+    if isinstance(config, str):
+        try:
+            config = json.loads(config)
+        except ValueError:
+            config = {}
+    c = config if isinstance(config, dict) else {}
+
+    targets: list[tuple[str, str]] = []
+
+    def add(key: str, value) -> None:
+        t = str(value if value is not None else "").strip()
+        if t:
+            targets.append((key, t))
+
+    def add_list(prefix: str, values) -> None:
+        for i, v in enumerate(values if isinstance(values, list) else []):
+            add(f"{prefix}_{i}", v)
+
+    add("prompt", prompt)
+
+    if kind == "char_intro":
+        add("letter", c.get("letter"))
+        add("word", c.get("word"))
+        add("example", c.get("example"))
+    elif kind == "char_mcq_sound":
+        add("question", c.get("letter"))
+        add_list("choice", c.get("options"))
+    elif kind in ("letter_recognition", "multi_select"):
+        add("question", c.get("question"))
+        add_list("choice", c.get("choices"))
+    elif kind == "char_build_word":
+        add("word", c.get("word"))
+        add_list("tile", c.get("tiles"))
+    elif kind == "letter_typing":
+        add("question", c.get("question"))
+        add("answer", c.get("answer"))
+    elif kind == "word_spelling":
+        add("word", c.get("word"))
+        add("hint", c.get("hint"))
+    elif kind == "fill_blank":
+        add("sentence", c.get("sentence"))
+        add("answer", c.get("answer"))
+    elif kind == "translate_mcq":
+        add("sentence", c.get("sentence"))
+        add_list("choice", c.get("choices"))
+    elif kind == "true_false":
+        add("statement", c.get("statement"))
+    elif kind == "sentence_order":
+        tokens = c.get("tokens") if isinstance(c.get("tokens"), list) else []
+        solution = str(c.get("solution") or "").strip()
+        add("sentence", solution or " ".join(str(t) for t in tokens))
+        add_list("token", tokens)
+    elif kind == "match_pairs":
+        for i, p in enumerate(c.get("pairs") if isinstance(c.get("pairs"), list) else []):
+            p = p if isinstance(p, dict) else {}
+            add(f"pair_{i}_a", p.get("a"))
+            add(f"pair_{i}_b", p.get("b"))
+    elif kind == "audio_choice_tts":
+        add("tts_text", c.get("ttsText"))
+        add_list("choice", c.get("choices"))
+    else:
+        for name in ("choices", "options", "tokens"):
+            add_list(name, c.get(name))
+
+    seen = set()
+    unique = []
+    for key, value in targets:
+        if key not in seen:
+            seen.add(key)
+            unique.append((key, value))
+    return unique
+
+
+def _missing_items(lesson_id: int, voice_types: list[str]) -> list[dict]:
+    """Work items for every (exercise, target, voice) without usable audio."""
+    with engine.connect() as conn:
+        exercises = conn.execute(
+            text('SELECT id, kind, prompt, config FROM exercises WHERE lesson_id = :l ORDER BY "order" ASC, id ASC'),
+            {"l": lesson_id},
+        ).mappings().all()
+        existing = {}
+        for r in conn.execute(
+            text(
+                """
+                SELECT exercise_id, NULL AS target_key, voice_type, source_type, tts_text
+                FROM exercise_audio
+                WHERE exercise_id IN (SELECT id FROM exercises WHERE lesson_id = :l)
+                UNION ALL
+                SELECT exercise_id, target_key, voice_type, source_type, tts_text
+                FROM exercise_audio_targets
+                WHERE exercise_id IN (SELECT id FROM exercises WHERE lesson_id = :l)
+                """
+            ),
+            {"l": lesson_id},
+        ).mappings():
+            existing[(r["exercise_id"], r["target_key"], r["voice_type"])] = r
+
+    items = []
+    for ex in exercises:
+        targets = derive_audio_targets(ex["kind"], ex["prompt"], ex["config"])
+        # exercise-level prompt audio too (played when no per-target clip is requested)
+        prompt = (ex["prompt"] or "").strip()
+        pairs = ([(None, prompt)] if prompt else []) + targets
+        for target_key, value in pairs:
+            for vt in voice_types:
+                row = existing.get((ex["id"], target_key, vt))
+                if row is not None and (row["source_type"] != "tts" or (row["tts_text"] or "").strip() == value):
+                    continue
+                items.append({"exercise_id": ex["id"], "target_key": target_key, "text": value, "voice_type": vt})
+    return items
+
+
+@job_handler(PREGEN_JOB_KIND)
+async def pregenerate_lesson_tts(job_id: int, payload: dict) -> dict:
+    lesson_id = int(payload["lesson_id"])
+    voice_types = payload.get("voice_types") or list(PREGEN_VOICE_TYPES)
+
+    items = await asyncio.to_thread(_missing_items, lesson_id, voice_types)
+    summary = {"lesson_id": lesson_id, "total": len(items), "done": 0, "generated": 0, "reused": 0, "errors": 0}
+    failures = []
+    await asyncio.to_thread(set_job_progress, job_id, summary)
+
+    async for event in _batch_generate_events(items):
+        summary["done"] = event["done"]
+        if event["status"] == "ok":
+            summary["generated"] += 1
+            summary["reused"] += int(bool(event.get("reused_asset")))
+        else:
+            summary["errors"] += 1
+            if len(failures) < 20:
+                failures.append(
+                    {k: event.get(k) for k in ("exercise_id", "target_key", "voice_type", "error")}
+                )
+        if event["done"] % PROGRESS_EVERY == 0 or event["done"] == event["total"]:
+            await asyncio.to_thread(set_job_progress, job_id, summary)
+
+    print(f"[audio_pregen] lesson {lesson_id}: {summary}")
+    return {**summary, "failures": failures}
+
+
+def enqueue_lesson_pregen(db, lesson_id: int) -> Optional[int]:
+    """Queue pre-generation for a lesson (no-op when TTS is not configured)."""
+    if not ELEVEN_API_KEY:
+        return None
+    return enqueue_job(
+        db,
+        PREGEN_JOB_KIND,
+        {"lesson_id": int(lesson_id)},
+        dedupe_key=f"{PREGEN_JOB_KIND}:{int(lesson_id)}",
+    )
@@ -0,0 +1,169 @@
+"""
+backend/audio_store.py
+Content-addressed file store for exercise audio.
+
+Audio bytes live on disk under their sha256 (ab/cd/<sha256>.<ext>); the DB rows in
+exercise_audio / exercise_audio_targets only keep metadata (file_path, content_hash,
+format, size). Playback streams the file with FileResponse (sendfile), so serving a
+clip no longer pulls a bytea blob through the connection pool.
+
+On Render this MUST point at a Persistent Disk (AUDIO_STORE_DIR), otherwise files
+disappear on redeploy.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+
+def _store_root() -> Path:
+    """Pick a writable root: AUDIO_STORE_DIR, AUDIO_DIR/store, the Render disk, then local."""
+
+    def _try_dir(p: Path) -> bool:
+        try:
+            p.mkdir(parents=True, exist_ok=True)
+        except OSError:
+            return False
+        return os.access(p, os.W_OK)
+
+    candidates: list[Path] = []
+    env = os.getenv("AUDIO_STORE_DIR")
+    if env:
+        candidates.append(Path(env))
+    if os.getenv("AUDIO_DIR"):
+        candidates.append(Path(os.getenv("AUDIO_DIR", "")) / "store")
+    # Common Render Persistent Disk mount path
+    candidates.append(Path("/var/data/uploads/audio_store"))
+    # Local dev fallback
+    candidates.append(Path(__file__).resolve().parent / "uploads" / "audio_store")
+
+    for p in candidates:
+        if _try_dir(p):
+            return p
+    return candidates[-1]
+
+
+_root: Optional[Path] = None
+_root_lock = threading.Lock()
+
+
+def store_root() -> Path:
+    """Store root, picked (and created) on first use instead of at import time."""
+    global _root
+    with _root_lock:
+        if _root is None:
+            _root = _store_root()
+        return _root
+
+CHUNK_SIZE = 64 * 1024
+
+
+class AudioTooLarge(Exception):
+    pass
+
+# Length of the `v=` cache-busting token in playback URLs.
+URL_VERSION_LEN = 12
+
+
+@dataclass
+class StoredAudio:
+    content_hash: str
+    file_path: str  # relative to store_root()
+    size: int
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def url_version(digest: str) -> str:
+    return (digest or "")[:URL_VERSION_LEN]
+
+
+def relative_path(digest: str, audio_format: str) -> str:
+    ext = (audio_format or "bin").strip(".").lower()
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{ext}"
+
+
+def absolute_path(rel_path: str) -> Path:
+    return store_root() / rel_path
+
+
+def write_atomic(dest: Path, data: bytes) -> None:
+    """Write to a temp file in the same directory, then rename (readers never see partial files)."""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dest.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, dest)
+    except Exception:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def put_bytes(data: bytes, audio_format: str) -> StoredAudio:
+    """Write bytes under their content hash (atomic; identical content is stored once)."""
+    digest = content_hash(data)
+    rel = relative_path(digest, audio_format)
+    dest = absolute_path(rel)
+    if not (dest.exists() and dest.stat().st_size == len(data)):
+        write_atomic(dest, data)
+    return StoredAudio(content_hash=digest, file_path=rel, size=len(data))
+
+
+def put_stream(src: BinaryIO, audio_format: str, max_bytes: int) -> Optional[StoredAudio]:
+    """Copy a file-like object into the store in chunks, hashing as we go.
+
+    Raises AudioTooLarge as soon as more than max_bytes have been read (the
+    partial temp file is removed). Returns None for an empty stream.
+    """
+    incoming = store_root() / ".incoming"
+    incoming.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=incoming, prefix=".tmp-")
+    h = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise AudioTooLarge(f"audio exceeds {max_bytes} bytes")
+                h.update(chunk)
+                f.write(chunk)
+        if size == 0:
+            os.unlink(tmp)
+            return None
+
+        digest = h.hexdigest()
+        rel = relative_path(digest, audio_format)
+        dest = absolute_path(rel)
+        if dest.exists() and dest.stat().st_size == size:
+            os.unlink(tmp)
+        else:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp, dest)
+        return StoredAudio(content_hash=digest, file_path=rel, size=size)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def resolve(rel_path: Optional[str]) -> Optional[Path]:
+    """Absolute path for a stored file, or None when it's missing on this disk."""
+    if not rel_path:
+        return None
+    p = absolute_path(rel_path)
+    return p if p.is_file() else None
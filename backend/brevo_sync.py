@@ -0,0 +1,313 @@
+"""
+backend/brevo_sync.py
+Bulk Brevo contact sync.
+
+Request handlers only mark the user (users.brevo_dirty_at = NOW()); events
+such as user_registered are queued as small "brevo_event" jobs that run
+BREVO_EVENT_WINDOW_SECONDS later, so a burst of the same event for one user
+(e.g. several profile saves) is sent once. The periodic
+"brevo_bulk_sync" job picks every user that changed since their last sync:
+
+  - marked dirty (profile/verification changes)
+  - never synced
+  - exercise attempts or completed lessons since the last sync
+  - synced on an earlier day with activity around then (streaks end without
+    any new activity)
+
+Their attributes (XP, lessons, exercise count, streak) are computed for a whole
+chunk in one query. Contacts whose email + attributes hash to the value stored
+at the last push (users.brevo_attrs_hash) are skipped; the rest go through
+Brevo's batch contact import.
+Each chunk is committed (brevo_synced_at) after the import returned, so a
+failed run resumes where it stopped. Only contacts Brevo accepted get their
+hash stored; rejected ones (4xx) are sent again on their next change.
+
+Runs every BREVO_SYNC_INTERVAL_SECONDS when Brevo is configured, or from backend/:
+    python brevo_sync.py [--chunk 500]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+from typing import Callable, Optional
+
+from sqlalchemy import text
+
+from database import engine
+from integrations.brevo import import_contacts, is_configured, track_event
+from job_queue import enqueue_job, job_handler, periodic_job, set_job_progress
+
+
+BREVO_BULK_SYNC_JOB = "brevo_bulk_sync"
+BREVO_EVENT_JOB = "brevo_event"
+BREVO_SYNC_INTERVAL_SECONDS = float(os.getenv("BREVO_SYNC_INTERVAL_SECONDS", "300"))
+BREVO_IMPORT_CHUNK = int(os.getenv("BREVO_IMPORT_CHUNK", "500"))
+BREVO_EVENT_WINDOW_SECONDS = float(os.getenv("BREVO_EVENT_WINDOW_SECONDS", "30"))
+
+Progress = Callable[[dict], None]
+
+
+def mark_brevo_dirty(db, user_id: int, event: Optional[str] = None, event_props: Optional[dict] = None) -> None:
+    """Request-path hook: flag the contact for the next bulk sync (+ queue the event, if any)."""
+    if not is_configured():
+        return
+    db.execute(text("UPDATE users SET brevo_dirty_at = NOW() WHERE id = :id"), {"id": int(user_id)})
+    if event:
+        enqueue_job(
+            db,
+            BREVO_EVENT_JOB,
+            {"user_id": int(user_id), "event": event, "event_props": event_props or {}},
+            dedupe_key=f"{BREVO_EVENT_JOB}:{int(user_id)}:{event}",
+            delay_seconds=BREVO_EVENT_WINDOW_SECONDS,
+        )
+
+
+# ------------------------------
+# Set-based queries
+# ------------------------------
+
+def _changed_user_ids(conn, after_id: int, limit: int) -> list[int]:
+    return [
+        int(r[0])
+        for r in conn.execute(
+            text(
+                """
+                SELECT u.id
+                FROM users u
+                WHERE u.id > :after
+                  AND COALESCE(u.email, '') <> ''
+                  AND (
+                    u.brevo_dirty_at IS NOT NULL
+                    OR u.brevo_synced_at IS NULL
+                    OR EXISTS (
+                      SELECT 1 FROM user_exercise_attempts a
+                      WHERE a.user_id = u.id AND a.created_at > u.brevo_synced_at
+                    )
+                    OR EXISTS (
+                      SELECT 1 FROM user_lesson_progress p
+                      WHERE p.user_id = u.id AND p.completed_at > u.brevo_synced_at
+                    )
+                    OR (
+                      u.brevo_synced_at < date_trunc('day', NOW())
+                      AND EXISTS (
+                        SELECT 1 FROM user_exercise_attempts a
+                        WHERE a.user_id = u.id AND a.created_at >= u.brevo_synced_at - INTERVAL '1 day'
+                      )
+                    )
+                  )
+                ORDER BY u.id
+                LIMIT :limit
+                """
+            ),
+            {"after": after_id, "limit": limit},
+        ).all()
+    ]
+
+
+def contact_rows(conn, user_ids: list[int]) -> list[dict]:
+    """Users with XP / lessons / exercises / streak, computed for all ids at once.
+
+    The streak matches routes._compute_streak_days: consecutive attempt days
+    (last 365) ending today (UTC), found as the run of days whose
+    `day - row_number` is constant and which contains today.
+    """
+    rows = conn.execute(
+        text(
+            """
+            WITH prog AS (
+              SELECT user_id,
+                     COALESCE(SUM(xp_earned), 0) AS total_xp,
+                     COUNT(DISTINCT lesson_id) FILTER (WHERE completed_at IS NOT NULL) AS lessons_completed
+              FROM user_lesson_progress
+              WHERE user_id = ANY(:ids)
+              GROUP BY user_id
+            ),
+            logs AS (
+              SELECT user_id, COUNT(*) AS exercises_done
+              FROM user_exercise_logs
+              WHERE user_id = ANY(:ids)
+              GROUP BY user_id
+            ),
+            days AS (
+              SELECT DISTINCT user_id, DATE(created_at) AS d
+              FROM user_exercise_attempts
+              WHERE user_id = ANY(:ids)
+                AND created_at >= NOW() - INTERVAL '365 days'
+            ),
+            runs AS (
+              SELECT user_id, d, d - CAST(ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY d) AS integer) AS grp
+              FROM days
+            ),
+            streaks AS (
+              SELECT user_id, COUNT(*) AS streak_days
+              FROM runs
+              GROUP BY user_id, grp
+              HAVING MAX(d) = CAST(NOW() AT TIME ZONE 'UTC' AS date)
+            )
+            SELECT u.id, u.email, u.username, u.display_name, u.first_name, u.last_name, u.bio,
+                   u.avatar_url, u.banner_url, u.friends_public, u.is_hidden, u.email_verified,
+                   u.brevo_attrs_hash,
+                   COALESCE(p.total_xp, 0) AS total_xp,
+                   COALESCE(p.lessons_completed, 0) AS lessons_completed,
+                   COALESCE(l.exercises_done, 0) AS exercises_done,
+                   COALESCE(s.streak_days, 0) AS streak_days
+            FROM users u
+            LEFT JOIN prog p ON p.user_id = u.id
+            LEFT JOIN logs l ON l.user_id = u.id
+            LEFT JOIN streaks s ON s.user_id = u.id
+            WHERE u.id = ANY(:ids)
+            ORDER BY u.id
+            """
+        ),
+        {"ids": [int(i) for i in user_ids]},
+    ).mappings().all()
+    return [dict(r) for r in rows]
+
+
+def contact_attributes(row: dict) -> dict:
+    # "As much data as possible" – send what we have today.
+    return {
+        "HAYLINGUA_USER_ID": int(row["id"]),
+        "USERNAME": row.get("username") or None,
+        "DISPLAY_NAME": row.get("display_name") or None,
+        "FIRST_NAME": row.get("first_name") or None,
+        "LAST_NAME": row.get("last_name") or None,
+        "BIO": row.get("bio") or None,
+        "AVATAR_URL": row.get("avatar_url") or None,
+        "BANNER_URL": row.get("banner_url") or None,
+        "FRIENDS_PUBLIC": bool(row.get("friends_public")),
+        "IS_HIDDEN": bool(row.get("is_hidden")),
+        "EMAIL_VERIFIED": bool(row.get("email_verified")),
+        "XP_TOTAL": int(row.get("total_xp") or 0),
+        "LESSONS_COMPLETED": int(row.get("lessons_completed") or 0),
+        "EXERCISES_COMPLETED": int(row.get("exercises_done") or 0),
+        "STREAK_DAYS": int(row.get("streak_days") or 0),
+        "LANGUAGE": "Armenian",
+    }
+
+
+def attributes_hash(email: str, attributes: dict) -> str:
+    """Hash of what Brevo would receive (None values are never sent)."""
+    sent = {k: v for k, v in attributes.items() if v is not None}
+    return hashlib.sha256(json.dumps([email.lower(), sent], sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# ------------------------------
+# Bulk sync
+# ------------------------------
+
+def run_bulk_sync(chunk: int = BREVO_IMPORT_CHUNK, progress: Optional[Progress] = None) -> dict:
+    report = {"users": 0, "sent": 0, "rejected": 0, "unchanged": 0, "chunks": 0}
+    if not is_configured():
+        report["skipped"] = "Brevo not configured"
+        return report
+
+    with engine.begin() as conn:
+        # changes after this instant stay dirty for the next run
+        started_at = conn.execute(text("SELECT NOW()")).scalar_one()
+
+    after_id = 0
+    while True:
+        with engine.begin() as conn:
+            ids = _changed_user_ids(conn, after_id, chunk)
+            rows = contact_rows(conn, ids) if ids else []
+        if not ids:
+            break
+
+        contacts, hashes, emails = [], {}, {}
+        for r in rows:
+            email = (r["email"] or "").strip()
+            if not email:
+                continue
+            attrs = contact_attributes(r)
+            h = attributes_hash(email, attrs)
+            if h == r.get("brevo_attrs_hash"):
+                continue
+            contacts.append({"email": email, "attributes": attrs})
+            hashes[int(r["id"])] = h
+            emails[int(r["id"])] = email
+        accepted = import_contacts(contacts)
+        hashes = {uid: h for uid, h in hashes.items() if emails[uid] in accepted}
+
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    """
+                    UPDATE users
+                    SET brevo_synced_at = :started_at,
+                        brevo_dirty_at = CASE WHEN brevo_dirty_at <= :started_at THEN NULL ELSE brevo_dirty_at END
+                    WHERE id = ANY(:ids)
+                    """
+                ),
+                {"ids": ids, "started_at": started_at},
+            )
+            if hashes:
+                conn.execute(
+                    text(
+                        """
+                        UPDATE users u
+                        SET brevo_attrs_hash = v.hash
+                        FROM unnest(CAST(:ids AS integer[]), CAST(:hashes AS text[])) AS v(id, hash)
+                        WHERE u.id = v.id
+                        """
+                    ),
+                    {"ids": list(hashes), "hashes": list(hashes.values())},
+                )
+        after_id = ids[-1]
+        report["users"] += len(ids)
+        report["sent"] += len(hashes)
+        report["rejected"] += len(contacts) - len(hashes)
+        report["unchanged"] += len(ids) - len(contacts)
+        report["chunks"] += 1
+        if progress is not None:
+            progress(report)
+    return report
+
+
+@job_handler(BREVO_BULK_SYNC_JOB)
+async def brevo_bulk_sync_job(job_id: int, payload: dict) -> dict:
+    def progress(report: dict) -> None:
+        set_job_progress(job_id, report)
+
+    return await asyncio.to_thread(run_bulk_sync, int(payload.get("chunk") or BREVO_IMPORT_CHUNK), progress)
+
+
+def _send_event(user_id: int, event: str, event_props: Optional[dict]) -> None:
+    with engine.begin() as conn:
+        rows = contact_rows(conn, [user_id])
+    if not rows or not (rows[0]["email"] or "").strip():
+        return
+    u = rows[0]
+    props = dict(event_props or {})
+    props.update(
+        {
+            "user_id": int(u["id"]),
+            "username": u.get("username") or None,
+            "total_xp": int(u["total_xp"]),
+            "streak_days": int(u["streak_days"]),
+        }
+    )
+    track_event(email=u["email"].strip(), event=event, properties=props)
+
+
+@job_handler(BREVO_EVENT_JOB)
+async def brevo_event_job(job_id: int, payload: dict) -> None:
+    await asyncio.to_thread(_send_event, int(payload["user_id"]), payload["event"], payload.get("event_props"))
+
+
+if is_configured():
+    periodic_job(BREVO_BULK_SYNC_JOB, BREVO_SYNC_INTERVAL_SECONDS)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Push changed users to Brevo in batches.")
+    parser.add_argument("--chunk", type=int, default=BREVO_IMPORT_CHUNK, help="contacts per import request")
+    args = parser.parse_args()
+
+    report = run_bulk_sync(chunk=max(1, args.chunk), progress=lambda r: print(f"[brevo_sync] {r['users']} users synced"))
+    print(f"[brevo_sync] done ✅ {report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+backend/circuit_breaker.py
+Circuit breakers for upstream services (ElevenLabs, Brevo).
+
+Each call runs under a latency budget. Outcomes are kept in a sliding window;
+when enough calls in the window failed or were slow, the breaker opens and
+calls fail fast with CircuitOpen instead of holding a worker for the whole
+upstream timeout. After `open_seconds` a limited number of probe calls are let
+through (half-open): a successful probe closes the breaker, a failed one opens
+it again.
+
+State is per process. Metrics for every breaker are exposed on
+GET /cms/circuits.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling the upstream while the breaker is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit open; retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+class CircuitBreaker:
+    """Error-rate + slow-call breaker with half-open probing (thread-safe)."""
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        latency_budget: float,
+        slow_call_seconds: float,
+        window_seconds: float = 60.0,
+        min_calls: int = 10,
+        failure_ratio: float = 0.5,
+        slow_ratio: float = 0.8,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 1,
+    ):
+        self.name = name
+        self.latency_budget = latency_budget
+        self.slow_call_seconds = slow_call_seconds
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_ratio = slow_ratio
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        # (finished_at, duration, failed)
+        self._window: deque[tuple[float, float, bool]] = deque()
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.failures = 0
+        self.slow_calls = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    # ---------- state machine ----------
+
+    def _prune(self, now: float) -> None:
+        while self._window and now - self._window[0][0] > self.window_seconds:
+            self._window.popleft()
+
+    def _open(self, now: float) -> None:
+        if self.state != OPEN:
+            self.times_opened += 1
+            print(f"[circuit_breaker] {self.name} opened")
+        self.state = OPEN
+        self._opened_at = now
+        self._probes = 0
+
+    def before_call(self) -> None:
+        """Reserve a call slot or raise CircuitOpen."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN:
+                remaining = self.open_seconds - (now - self._opened_at)
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpen(self.name, remaining)
+                self.state = HALF_OPEN
+                self._probes = 0
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    self.rejected += 1
+                    raise CircuitOpen(self.name, 1.0)
+                self._probes += 1
+
+    def release(self) -> None:
+        """Give back a slot reserved by before_call() without an outcome (cancelled call)."""
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record(self, duration: float, failed: bool) -> None:
+        slow = duration >= self.slow_call_seconds
+        with self._lock:
+            now = time.monotonic()
+            self.calls += 1
+            self.failures += int(failed)
+            self.slow_calls += int(slow)
+
+            if self.state == HALF_OPEN:
+                if failed or slow:
+                    self._open(now)
+                else:
+                    print(f"[circuit_breaker] {self.name} closed")
+                    self.state = CLOSED
+                    self._window.clear()
+                return
+            if self.state == OPEN:
+                # a call that started before the breaker opened
+                return
+
+            self._window.append((now, duration, failed))
+            self._prune(now)
+            n = len(self._window)
+            if n < self.min_calls:
+                return
+            failed_n = sum(1 for _, _, f in self._window if f)
+            slow_n = sum(1 for _, d, _ in self._window if d >= self.slow_call_seconds)
+            if failed_n / n >= self.failure_ratio or slow_n / n >= self.slow_ratio:
+                self._open(now)
+
+    # ---------- wrappers ----------
+
+    async def call(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        is_failure: Optional[Callable[[T], bool]] = None,
+        timeout: Optional[float] = None,
+    ) -> T:
+        """Await fn() under the latency budget, or `timeout` if shorter (TimeoutError counts as a failure)."""
+        budget = self.latency_budget if timeout is None else max(0.0, min(timeout, self.latency_budget))
+        self.before_call()
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(fn(), budget)
+        except asyncio.CancelledError:
+            self.release()
+            raise
+        except Exception:
+            self.record(time.monotonic() - start, failed=True)
+            raise
+        self.record(time.monotonic() - start, failed=bool(is_failure and is_failure(result)))
+        return result
+
+    def call_sync(self, fn: Callable[[], T], is_failure: Optional[Callable[[T], bool]] = None) -> T:
+        """Blocking variant; fn must enforce latency_budget itself (e.g. as its HTTP timeout)."""
+        self.before_call()
+        start = time.monotonic()
+        try:
+            result = fn()
+        except BaseException:
+            self.record(time.monotonic() - start, failed=True)
+            raise
+        self.record(time.monotonic() - start, failed=bool(is_failure and is_failure(result)))
+        return result
+
+    def metrics(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            durations = sorted(d for _, d, _ in self._window)
+            n = len(durations)
+            return {
+                "state": self.state,
+                "open_for_seconds": (
+                    round(max(0.0, self.open_seconds - (now - self._opened_at)), 1) if self.state == OPEN else 0.0
+                ),
+                "latency_budget": self.latency_budget,
+                "calls": self.calls,
+                "failures": self.failures,
+                "slow_calls": self.slow_calls,
+                "rejected": self.rejected,
+                "times_opened": self.times_opened,
+                "window": {
+                    "calls": n,
+                    "failures": sum(1 for _, _, f in self._window if f),
+                    "p50_seconds": round(durations[n // 2], 3) if n else None,
+                    "p95_seconds": round(durations[min(n - 1, int(n * 0.95))], 3) if n else None,
+                },
+            }
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str, *, latency_budget: float, slow_call_seconds: float) -> CircuitBreaker:
+    """Process-wide breaker for a dependency; env overrides, e.g. ELEVENLABS_LATENCY_BUDGET_SECONDS."""
+    if name not in _breakers:
+        prefix = name.upper()
+        _breakers[name] = CircuitBreaker(
+            name,
+            latency_budget=_env_float(f"{prefix}_LATENCY_BUDGET_SECONDS", latency_budget),
+            slow_call_seconds=_env_float(f"{prefix}_SLOW_CALL_SECONDS", slow_call_seconds),
+            window_seconds=_env_float(f"{prefix}_BREAKER_WINDOW_SECONDS", 60.0),
+            min_calls=int(_env_float(f"{prefix}_BREAKER_MIN_CALLS", 10)),
+            failure_ratio=_env_float(f"{prefix}_BREAKER_FAILURE_RATIO", 0.5),
+            open_seconds=_env_float(f"{prefix}_BREAKER_OPEN_SECONDS", 30.0),
+        )
+    return _breakers[name]
+
+
+def breaker_metrics() -> dict:
+    return {name: b.metrics() for name, b in _breakers.items()}
@@ -7,6 +7,94 @@ from sqlalchemy import text
 from database import engine
 
 
+def refresh_lesson_stats(conn, lesson_id: int) -> None:
+    """
+    Recompute the lesson_stats row (exercise count + XP total) for one lesson.
+
+    Call this after any write that adds/removes exercises or changes their xp.
+    """
+    conn.execute(
+        text(
+            """
+            INSERT INTO lesson_stats (lesson_id, exercises_total, xp_total, updated_at)
+            SELECT :lid, COUNT(e.id)::int, COALESCE(SUM(e.xp), 0)::int, NOW()
+            FROM exercises e
+            WHERE e.lesson_id = :lid
+            ON CONFLICT (lesson_id) DO UPDATE SET
+                exercises_total = EXCLUDED.exercises_total,
+                xp_total = EXCLUDED.xp_total,
+                updated_at = NOW()
+            """
+        ),
+        {"lid": int(lesson_id)},
+    )
+
+
+def bump_course_path_version(conn) -> None:
+    """
+    Invalidate every user's stored path frontier (user_path_state).
+
+    Frontiers are recomputed lazily the next time each user loads the dashboard.
+    """
+    conn.execute(
+        text(
+            """
+            INSERT INTO course_path (id, version, updated_at)
+            VALUES (1, 1, NOW())
+            ON CONFLICT (id) DO UPDATE SET
+                version = course_path.version + 1,
+                updated_at = NOW()
+            """
+        )
+    )
+
+
+def bump_lesson_content_version(conn) -> None:
+    """
+    Invalidate the learner lesson payloads cached by every API process.
+
+    Their cache keys include course_path.content_version, so the new version
+    takes effect when the caller's transaction commits.
+    """
+    conn.execute(
+        text(
+            """
+            INSERT INTO course_path (id, version, content_version, updated_at)
+            VALUES (1, 1, 1, NOW())
+            ON CONFLICT (id) DO UPDATE SET
+                content_version = course_path.content_version + 1,
+                updated_at = NOW()
+            """
+        )
+    )
+
+
+def reindex_course_path(conn, force_bump: bool = False) -> None:
+    """
+    Renumber lessons.path_index in path order (level, id).
+
+    Bumps the course path version when any lesson moved (or when force_bump is set,
+    e.g. after a delete), so stored user frontiers get recomputed.
+    """
+    moved = conn.execute(
+        text(
+            """
+            WITH ordered AS (
+              SELECT id, (ROW_NUMBER() OVER (ORDER BY level ASC, id ASC) - 1)::int AS idx
+              FROM lessons
+            )
+            UPDATE lessons l
+            SET path_index = o.idx
+            FROM ordered o
+            WHERE l.id = o.id AND l.path_index IS DISTINCT FROM o.idx
+            RETURNING l.id
+            """
+        )
+    ).fetchall()
+    if moved or force_bump:
+        bump_course_path_version(conn)
+
+
 def seed_alphabet_lessons() -> None:
     """
     Seed (or reseed) the two Alphabet lessons plus their exercises.
@@ -136,6 +224,10 @@ def seed_alphabet_lessons() -> None:
         print("[seed_alphabet_lessons] Creating exercises for Alphabet 1 & 2")
         _create_alphabet_1_exercises(conn, lesson1_id)
         _create_alphabet_2_exercises(conn, lesson2_id)
+        refresh_lesson_stats(conn, lesson1_id)
+        refresh_lesson_stats(conn, lesson2_id)
+        reindex_course_path(conn, force_bump=True)
+        bump_lesson_content_version(conn)
 
     print("[seed_alphabet_lessons] Done seeding.")
 
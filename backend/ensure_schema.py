@@ -177,6 +177,13 @@ def ensure_schema() -> None:
         fill_nulls("user_exercise_attempts", "is_correct", "FALSE")
         fill_nulls("user_exercise_attempts", "selected_indices", "'[]'::jsonb")
         fill_nulls("user_exercise_attempts", "xp_earned", "0")
+        # per-user activity lookups (streaks, Brevo bulk sync "changed since")
+        conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_user_exercise_attempts_user_created "
+                "ON user_exercise_attempts (user_id, created_at)"
+            )
+        )
 
         # If your old table had xp_earned NOT NULL without default -> crashes.
         # This ensures default exists and nulls are filled.
@@ -243,6 +250,28 @@ def ensure_schema() -> None:
         # Make sure recompute_lesson_progress upsert works
         ensure_unique_progress_constraint()
 
+        # ---------- audio_assets ----------
+        # Shared TTS audio keyed by hash(text, voice_id, model, settings): identical
+        # sentences across exercises/targets are synthesized and stored once.
+        ensure_table(
+            "audio_assets",
+            """
+            CREATE TABLE audio_assets (
+                id SERIAL PRIMARY KEY,
+                asset_key TEXT NOT NULL UNIQUE,
+                tts_text TEXT NOT NULL,
+                tts_voice_id TEXT NOT NULL,
+                model_id TEXT NOT NULL,
+                settings JSONB NOT NULL DEFAULT '{}'::jsonb,
+                audio_format TEXT NOT NULL DEFAULT 'mp3',
+                audio_size INTEGER NOT NULL DEFAULT 0,
+                file_path TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            );
+            """,
+        )
+
         # ---------- exercise_audio ----------
         # caches TTS/custom recordings (optionally on Render disk)
         ensure_table(
@@ -271,6 +300,13 @@ def ensure_schema() -> None:
         add_col_if_missing("exercise_audio", "file_path TEXT")
         add_col_if_missing("exercise_audio", "tts_text TEXT")
         add_col_if_missing("exercise_audio", "tts_voice_id TEXT")
+        # sha256 of the bytes in the content-addressed store (audio_store.py)
+        add_col_if_missing("exercise_audio", "content_hash TEXT")
+        add_col_if_missing("exercise_audio", "asset_id INTEGER REFERENCES audio_assets(id) ON DELETE SET NULL")
+        # filled in by the background audio jobs (audio_jobs.py)
+        add_col_if_missing("exercise_audio", "duration_seconds REAL")
+        add_col_if_missing("exercise_audio", "peak_db REAL")
+        add_col_if_missing("exercise_audio", "rms_db REAL")
 
         # ---------- exercise_audio_targets ----------
         # Per-exercise, per-target audio (e.g., sentence token, choice, whole sentence).
@@ -311,6 +347,105 @@ def ensure_schema() -> None:
         add_col_if_missing("exercise_audio_targets", "file_path TEXT")
         add_col_if_missing("exercise_audio_targets", "created_at TIMESTAMP NOT NULL DEFAULT NOW()")
         add_col_if_missing("exercise_audio_targets", "updated_at TIMESTAMP NOT NULL DEFAULT NOW()")
+        add_col_if_missing("exercise_audio_targets", "content_hash TEXT")
+        add_col_if_missing("exercise_audio_targets", "asset_id INTEGER REFERENCES audio_assets(id) ON DELETE SET NULL")
+        add_col_if_missing("exercise_audio_targets", "duration_seconds REAL")
+        add_col_if_missing("exercise_audio_targets", "peak_db REAL")
+        add_col_if_missing("exercise_audio_targets", "rms_db REAL")
+
+        # ---------- audio_variants ----------
+        # Processed delivery variants (normalized / opus / low-bitrate mp3) keyed by the source content hash.
+        ensure_table(
+            "audio_variants",
+            """
+            CREATE TABLE audio_variants (
+                source_hash TEXT NOT NULL,
+                variant TEXT NOT NULL,
+                audio_format TEXT NOT NULL,
+                audio_size INTEGER NOT NULL DEFAULT 0,
+                file_path TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (source_hash, variant)
+            );
+            """,
+        )
+
+        # ---------- lesson_audio_manifest ----------
+        # Precomputed list of available clips per lesson (rebuilt on every audio write).
+        # packs: voice ('' = all) -> audio pack id built for these entries (audio_pack.py).
+        ensure_table(
+            "lesson_audio_manifest",
+            """
+            CREATE TABLE lesson_audio_manifest (
+                lesson_id INTEGER PRIMARY KEY REFERENCES lessons(id) ON DELETE CASCADE,
+                entries JSONB NOT NULL DEFAULT '[]'::jsonb,
+                etag TEXT,
+                packs JSONB NOT NULL DEFAULT '{}'::jsonb,
+                built_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            );
+            """,
+        )
+        add_col_if_missing("lesson_audio_manifest", "packs JSONB NOT NULL DEFAULT '{}'::jsonb")
+
+        # ---------- jobs ----------
+        # Persisted background work (job_queue.py): outbound email, Brevo sync, TTS pre-generation, GC.
+        # status: queued -> running -> done | queued (retry with backoff) | dead (out of attempts).
+        # sensitive: payload holds secrets (email codes/invite links) and is cleared once done/dead.
+        ensure_table(
+            "jobs",
+            """
+            CREATE TABLE jobs (
+                id SERIAL PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+                dedupe_key TEXT,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL DEFAULT 5,
+                sensitive BOOLEAN NOT NULL DEFAULT FALSE,
+                progress JSONB,
+                result JSONB,
+                error TEXT,
+                run_after TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                started_at TIMESTAMPTZ,
+                finished_at TIMESTAMPTZ,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            );
+            """,
+        )
+        add_col_if_missing("jobs", "max_attempts INTEGER NOT NULL DEFAULT 5")
+        add_col_if_missing("jobs", "sensitive BOOLEAN NOT NULL DEFAULT FALSE")
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_jobs_queue ON jobs (status, run_after, id)"))
+        # At most one queued job per dedupe_key (enqueue_job's ON CONFLICT). This replaces a plain
+        # index; queued duplicates from before keep the oldest row's key.
+        conn.execute(text("DROP INDEX IF EXISTS ix_jobs_dedupe"))
+        conn.execute(
+            text(
+                """
+                DO $$
+                BEGIN
+                  IF NOT EXISTS (
+                    SELECT 1
+                    FROM pg_indexes
+                    WHERE schemaname='public'
+                      AND tablename='jobs'
+                      AND indexname='ux_jobs_dedupe_queued'
+                  ) THEN
+                    UPDATE jobs j SET dedupe_key = NULL
+                    WHERE j.status = 'queued'
+                      AND EXISTS (
+                        SELECT 1 FROM jobs o
+                        WHERE o.dedupe_key = j.dedupe_key AND o.status = 'queued' AND o.id < j.id
+                      );
+                    CREATE UNIQUE INDEX ux_jobs_dedupe_queued
+                      ON jobs (dedupe_key) WHERE status = 'queued';
+                  END IF;
+                END$$;
+                """
+            )
+        )
 
         # ---------- user_onboarding ----------
         # Stores post-verification onboarding answers so we can personalize the curriculum.
@@ -362,6 +497,93 @@ def ensure_schema() -> None:
         add_col_if_missing("lessons", "lesson_type TEXT NOT NULL DEFAULT 'standard'")
         add_col_if_missing("lessons", "config JSONB NOT NULL DEFAULT '{}'::jsonb")
 
+        # ---------- lesson_stats ----------
+        # Per-lesson exercise count + XP total, maintained by the CMS exercise writes
+        # so the dashboard doesn't aggregate the whole exercises table per request.
+        ensure_table(
+            "lesson_stats",
+            """
+            CREATE TABLE lesson_stats (
+              lesson_id        INTEGER PRIMARY KEY REFERENCES lessons(id) ON DELETE CASCADE,
+              exercises_total  INTEGER NOT NULL DEFAULT 0,
+              xp_total         INTEGER NOT NULL DEFAULT 0,
+              updated_at       TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            );
+            """,
+        )
+
+        # Backfill / resync (cheap, one GROUP BY at boot). Catches rows edited outside the CMS.
+        conn.execute(
+            text(
+                """
+                INSERT INTO lesson_stats (lesson_id, exercises_total, xp_total, updated_at)
+                SELECT l.id, COUNT(e.id)::int, COALESCE(SUM(e.xp), 0)::int, NOW()
+                FROM lessons l
+                LEFT JOIN exercises e ON e.lesson_id = l.id
+                GROUP BY l.id
+                ON CONFLICT (lesson_id) DO UPDATE SET
+                  exercises_total = EXCLUDED.exercises_total,
+                  xp_total = EXCLUDED.xp_total,
+                  updated_at = NOW()
+                WHERE lesson_stats.exercises_total IS DISTINCT FROM EXCLUDED.exercises_total
+                   OR lesson_stats.xp_total IS DISTINCT FROM EXCLUDED.xp_total
+                """
+            )
+        )
+
+        # ---------- course path (lesson order + per-user unlock frontier) ----------
+        # lessons.path_index is the lesson's position in the learning path (ORDER BY level, id).
+        # course_path.version is bumped whenever that order (or lesson completion rules) change;
+        # user_path_state rows recorded against an older version are recomputed lazily.
+        # course_path.content_version is bumped by every CMS lesson/exercise/option write; learner
+        # lesson payloads are cached per process under keys that include it.
+        add_col_if_missing("lessons", "path_index integer")
+        ensure_table(
+            "course_path",
+            """
+            CREATE TABLE course_path (
+              id          SMALLINT PRIMARY KEY,
+              version     INTEGER NOT NULL DEFAULT 1,
+              content_version INTEGER NOT NULL DEFAULT 1,
+              updated_at  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            );
+            """,
+        )
+        add_col_if_missing("course_path", "content_version INTEGER NOT NULL DEFAULT 1")
+        conn.execute(text("INSERT INTO course_path (id, version) VALUES (1, 1) ON CONFLICT (id) DO NOTHING"))
+
+        ensure_table(
+            "user_path_state",
+            """
+            CREATE TABLE user_path_state (
+              user_id         INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+              frontier_index  INTEGER NOT NULL DEFAULT 0,
+              path_version    INTEGER NOT NULL DEFAULT 0,
+              updated_at      TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            );
+            """,
+        )
+
+        # Renumber on boot; bump the version only if something actually moved.
+        moved = conn.execute(
+            text(
+                """
+                WITH ordered AS (
+                  SELECT id, (ROW_NUMBER() OVER (ORDER BY level ASC, id ASC) - 1)::int AS idx
+                  FROM lessons
+                )
+                UPDATE lessons l
+                SET path_index = o.idx
+                FROM ordered o
+                WHERE l.id = o.id AND l.path_index IS DISTINCT FROM o.idx
+                RETURNING l.id
+                """
+            )
+        ).fetchall()
+        if moved:
+            conn.execute(text("UPDATE course_path SET version = version + 1, updated_at = NOW() WHERE id = 1"))
+            print(f"[ensure_schema] reindexed course path ({len(moved)} lessons moved) ✅")
+
         # ---------- users (username support) ----------
         add_col_if_missing("users", "username TEXT")
         # Case-insensitive uniqueness for non-null usernames
@@ -387,6 +609,13 @@ def ensure_schema() -> None:
         add_col_if_missing("users", "is_hidden BOOLEAN NOT NULL DEFAULT FALSE")
         add_col_if_missing("users", "joined_at TIMESTAMPTZ NOT NULL DEFAULT NOW()")
 
+        # ---------- users (Brevo bulk sync) ----------
+        # brevo_dirty_at: set by request handlers; cleared by brevo_sync.py once pushed.
+        add_col_if_missing("users", "brevo_dirty_at TIMESTAMPTZ")
+        add_col_if_missing("users", "brevo_synced_at TIMESTAMPTZ")
+        # sha256 of the email + attributes last accepted by Brevo (unchanged contacts are skipped)
+        add_col_if_missing("users", "brevo_attrs_hash TEXT")
+
         # ---------- users (account security: 2FA) ----------
         # These fields are used for optional TOTP-based 2FA.
         add_col_if_missing("users", "totp_enabled BOOLEAN NOT NULL DEFAULT FALSE")
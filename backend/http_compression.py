@@ -0,0 +1,243 @@
+"""
+backend/http_compression.py
+Response compression (gzip + brotli) and a small cache of precompressed payloads.
+
+Two pieces:
+  - CompressionMiddleware: negotiates Accept-Encoding and compresses dynamic
+    JSON/text responses on the fly.
+  - PayloadCache: for cacheable documents (lesson JSON, leaderboard snapshots)
+    we serialize + compress ONCE and keep raw/gzip/br bytes side by side, so hot
+    requests only pick the right variant.
+
+Brotli is optional: if the `brotli` package is missing we silently fall back to gzip.
+"""
+import gzip
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli  # type: ignore
+except Exception:
+    brotli = None
+
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+MINIMUM_SIZE = 500
+
+# Audio/images are already compressed; re-compressing them only burns CPU.
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick 'br', 'gzip' or None from an Accept-Encoding header (honours q=0)."""
+    if not accept_encoding:
+        return None
+
+    accepted: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        bits = part.strip().split(";")
+        name = bits[0].strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for b in bits[1:]:
+            b = b.strip()
+            if b.startswith("q="):
+                try:
+                    q = float(b[2:])
+                except ValueError:
+                    q = 0.0
+        accepted[name] = q
+
+    def _ok(name: str) -> bool:
+        if name in accepted:
+            return accepted[name] > 0
+        return accepted.get("*", 0) > 0
+
+    if brotli is not None and _ok("br"):
+        return "br"
+    if _ok("gzip"):
+        return "gzip"
+    return None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def _is_compressible(content_type: str) -> bool:
+    ct = (content_type or "").lower()
+    return any(ct.startswith(t) for t in COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """ASGI middleware: br/gzip for compressible responses above MINIMUM_SIZE.
+
+    Responses that already carry Content-Encoding (precompressed cache hits),
+    partial/empty responses (206/204/304) and binary media pass through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[dict] = None
+        passthrough = False
+        chunks: list[bytes] = []
+
+        async def _send(message):
+            nonlocal start_message, passthrough
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message.get("headers") or [])
+                if (
+                    message.get("status") in (204, 206, 304)
+                    or "content-encoding" in headers
+                    or not _is_compressible(headers.get("content-type", ""))
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(chunks)
+            headers = MutableHeaders(raw=start_message["headers"])
+            if len(body) >= self.minimum_size:
+                body = compress(body, encoding)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, _send)
+
+
+class CompressedPayload:
+    """Raw JSON bytes plus their gzip/br encodings, computed once."""
+
+    __slots__ = ("raw", "gzip", "br", "etag", "created_at")
+
+    def __init__(self, raw: bytes):
+        self.raw = raw
+        self.gzip = compress(raw, "gzip")
+        self.br = compress(raw, "br") if brotli is not None else None
+        self.etag = '"' + hashlib.sha256(raw).hexdigest()[:32] + '"'
+        self.created_at = time.monotonic()
+
+    @classmethod
+    def from_obj(cls, obj: Any) -> "CompressedPayload":
+        raw = json.dumps(jsonable_encoder(obj), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return cls(raw)
+
+    def response(self, request, headers: Optional[dict] = None, cache_control: Optional[str] = None) -> Response:
+        """Build a Response with the best encoding the client accepts (+ 304 on ETag match)."""
+        h = dict(headers or {})
+        h["ETag"] = self.etag
+        h["Vary"] = "Accept-Encoding"
+        if cache_control:
+            h["Cache-Control"] = cache_control
+
+        inm = request.headers.get("if-none-match") if request is not None else None
+        if inm and self.etag in [t.strip() for t in inm.split(",")]:
+            return Response(status_code=304, headers=h)
+
+        encoding = negotiate_encoding(request.headers.get("accept-encoding") if request is not None else None)
+        body = self.raw
+        if encoding == "br" and self.br is not None:
+            body = self.br
+            h["Content-Encoding"] = "br"
+        elif encoding in ("br", "gzip"):
+            body = self.gzip
+            h["Content-Encoding"] = "gzip"
+        return Response(content=body, media_type="application/json", headers=h)
+
+
+class PayloadCache:
+    """Tiny TTL cache of CompressedPayload objects (per worker process).
+
+    Keys are plain strings such as "lesson:alphabet-1:v12". Callers either
+    invalidate()/invalidate_prefix() after writes (this process only; the TTL
+    bounds staleness elsewhere) or put a DB-side version in the key, which every
+    worker sees as soon as the write commits.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 512):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._items: dict[str, CompressedPayload] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CompressedPayload]:
+        with self._lock:
+            p = self._items.get(key)
+            if p is None:
+                return None
+            if time.monotonic() - p.created_at > self.ttl_seconds:
+                self._items.pop(key, None)
+                return None
+            return p
+
+    def put(self, key: str, payload: CompressedPayload) -> None:
+        with self._lock:
+            if len(self._items) >= self.max_entries and key not in self._items:
+                # Drop the oldest entry; good enough for a few hundred lessons.
+                oldest = min(self._items, key=lambda k: self._items[k].created_at)
+                self._items.pop(oldest, None)
+            self._items[key] = payload
+
+    def get_or_build(self, key: str, build: Callable[[], Any]) -> CompressedPayload:
+        p = self.get(key)
+        if p is None:
+            p = CompressedPayload.from_obj(build())
+            self.put(key, p)
+        return p
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def invalidate_prefix(self, prefix: str) -> None:
+        with self._lock:
+            for k in [k for k in self._items if k.startswith(prefix)]:
+                self._items.pop(k, None)
+
+
+# Shared caches used by routes.py
+lesson_payload_cache = PayloadCache(ttl_seconds=300)
+leaderboard_payload_cache = PayloadCache(ttl_seconds=30, max_entries=32)
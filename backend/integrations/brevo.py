@@ -1,12 +1,22 @@
 import os
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Set
 
 import httpx
 
+from circuit_breaker import CircuitOpen, get_breaker
+
 
 BREVO_API_BASE = os.getenv("BREVO_API_BASE", "https://api.brevo.com/v3")
 
+# Called from the "brevo_sync" job: fail fast while Brevo is failing and let
+# the job queue retry later with backoff.
+brevo_breaker = get_breaker("brevo", latency_budget=5.0, slow_call_seconds=2.0)
+
+
+class BrevoError(RuntimeError):
+    """Retryable Brevo failure (transport error, 429/5xx, or open circuit)."""
+
 
 def _enabled() -> bool:
     v = (os.getenv("BREVO_ENABLED") or "").strip().lower()
@@ -28,6 +38,10 @@ def _list_id() -> Optional[int]:
         return None
 
 
+def is_configured() -> bool:
+    return _enabled() and _api_key() is not None
+
+
 def _headers() -> Dict[str, str]:
     # Brevo uses `api-key` header for authentication.
     # https://developers.brevo.com/docs/api-key-authentication
@@ -38,6 +52,34 @@ def _headers() -> Dict[str, str]:
     }
 
 
+def _retryable(r: httpx.Response) -> bool:
+    return r.status_code == 429 or r.status_code >= 500
+
+
+def _post(url: str, payload: Dict[str, Any], timeout_s: Optional[float]) -> bool:
+    """True when Brevo accepted the request, False when it rejected it (4xx).
+
+    Raises BrevoError on retryable failures.
+    """
+    timeout = min(timeout_s or brevo_breaker.latency_budget, brevo_breaker.latency_budget)
+
+    def send() -> httpx.Response:
+        with httpx.Client(timeout=timeout) as client:
+            return client.post(url, headers=_headers(), json=payload)
+
+    try:
+        r = brevo_breaker.call_sync(send, _retryable)
+    except (CircuitOpen, httpx.HTTPError) as e:
+        raise BrevoError(str(e) or e.__class__.__name__) from e
+    if _retryable(r):
+        raise BrevoError(f"Brevo {r.status_code}: {r.text[:200]}")
+    if r.status_code >= 400:
+        # bad payload/contact: retrying won't help
+        print(f"[brevo] {url} -> {r.status_code}: {r.text[:200]}")
+        return False
+    return True
+
+
 def _iso(dt: Optional[datetime]) -> Optional[str]:
     if not dt:
         return None
@@ -51,17 +93,17 @@ def upsert_contact(
     email: str,
     attributes: Dict[str, Any],
     list_id: Optional[int] = None,
-    timeout_s: float = 4.0,
-    ) -> None:
-    """Create or update a Brevo contact.
+    timeout_s: Optional[float] = None,
+    ) -> bool:
+    """Create or update a Brevo contact; False if Brevo rejected it (or is off).
 
     Uses `updateEnabled=true` on create to behave like upsert.
-    We swallow errors upstream; this must never break the user flow.
+    Raises BrevoError on retryable failures (the caller is a background job).
     """
     if not _enabled():
-        return
+        return False
     if not _api_key():
-        return
+        return False
 
     payload: Dict[str, Any] = {
         "email": email,
@@ -74,10 +116,56 @@ def upsert_contact(
         payload["listIds"] = [int(list_id)]
 
     url = f"{BREVO_API_BASE}/contacts"
-    with httpx.Client(timeout=timeout_s) as client:
-        # Brevo returns 201 on create, 204/201 depending on upsert behavior.
-        # We don't need the body.
-        client.post(url, headers=_headers(), json=payload)
+    # Brevo returns 201 on create, 204/201 depending on upsert behavior.
+    # We don't need the body.
+    return _post(url, payload, timeout_s)
+
+
+def import_contacts(
+    contacts: List[Dict[str, Any]],
+    *,
+    list_id: Optional[int] = None,
+    timeout_s: Optional[float] = None,
+    ) -> Set[str]:
+    """Create or update many contacts ({email, attributes}) in one request.
+
+    Uses the batch import endpoint, which requires a list; without BREVO_LIST_ID
+    the contacts are upserted one by one instead. Returns the emails Brevo
+    accepted (none when it rejected the import). Raises BrevoError on
+    retryable failures.
+    """
+    if not _enabled():
+        return set()
+    if not _api_key():
+        return set()
+    if not contacts:
+        return set()
+
+    if list_id is None:
+        list_id = _list_id()
+    if list_id is None:
+        return {
+            c["email"]
+            for c in contacts
+            if upsert_contact(email=c["email"], attributes=c["attributes"], timeout_s=timeout_s)
+        }
+
+    payload: Dict[str, Any] = {
+        "jsonBody": [
+            {
+                "email": c["email"],
+                "attributes": {k: v for k, v in c["attributes"].items() if v is not None},
+            }
+            for c in contacts
+        ],
+        "listIds": [int(list_id)],
+        "updateExistingContacts": True,
+        "emptyContactsAttributes": False,
+    }
+    # Brevo answers 202 with a processId; the import itself runs on their side.
+    if not _post(f"{BREVO_API_BASE}/contacts/import", payload, timeout_s):
+        return set()
+    return {c["email"] for c in contacts}
 
 
 def track_event(
@@ -86,7 +174,7 @@ def track_event(
     event: str,
     properties: Optional[Dict[str, Any]] = None,
     event_time: Optional[datetime] = None,
-    timeout_s: float = 4.0,
+    timeout_s: Optional[float] = None,
     ) -> None:
     """Send a Brevo Events API event (for automation triggers)."""
     if not _enabled():
@@ -104,5 +192,4 @@ def track_event(
         payload["date"] = _iso(event_time)
 
     url = f"{BREVO_API_BASE}/events"
-    with httpx.Client(timeout=timeout_s) as client:
-        client.post(url, headers=_headers(), json=payload)
+    _post(url, payload, timeout_s)
@@ -0,0 +1,385 @@
+"""
+backend/job_queue.py
+Persisted background jobs (Postgres `jobs` table).
+
+Request handlers enqueue a row (inside their own transaction, so the job exists
+iff the request committed) and return immediately. Runner tasks claim queued
+jobs with FOR UPDATE SKIP LOCKED (so two processes never run the same job) and
+await the handler registered for the job's kind. Runners live in the API
+processes (JOBS_POLLER_ENABLED, default on) and/or in dedicated worker.py
+processes.
+
+A failed job is retried with exponential backoff until max_attempts, then
+dead-lettered (status 'dead'); dead jobs can be inspected and requeued from the
+CMS. Handlers raise PermanentJobError for failures a retry cannot fix.
+Handlers can report progress, which GET /cms/jobs/{id} exposes; a running job
+whose process died stops heartbeating and is requeued after JOB_STALE_SECONDS.
+Kinds registered with periodic_job() are enqueued on a schedule shared by all
+runner processes (at most one queued/running instance per kind).
+
+Payloads are never exposed by get_job()/list_jobs(). Jobs enqueued with
+sensitive=True (emails carrying codes or invite links) have their payload
+cleared once they are done or dead. Done jobs are deleted after
+JOB_RETENTION_DAYS, dead ones after JOB_DEAD_RETENTION_DAYS.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import text
+
+from database import engine
+
+
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "600"))
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "4"))
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "10"))
+JOB_RETRY_MAX_SECONDS = 3600.0
+JOBS_POLLER_ENABLED = os.getenv("JOBS_POLLER_ENABLED", "true").lower() == "true"
+JOB_SCHEDULE_SECONDS = 30.0
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "7"))
+JOB_DEAD_RETENTION_DAYS = int(os.getenv("JOB_DEAD_RETENTION_DAYS", "30"))
+JOB_PURGE_SECONDS = 3600.0
+
+JobHandler = Callable[[int, dict], Awaitable[Optional[dict]]]
+
+_handlers: dict[str, JobHandler] = {}
+_periodic: dict[str, float] = {}
+_runners: list[asyncio.Task] = []
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying cannot succeed (job goes straight to 'dead')."""
+
+
+def job_handler(kind: str):
+    """Register `async def handler(job_id, payload) -> result dict` for a job kind."""
+    def register(fn: JobHandler) -> JobHandler:
+        _handlers[kind] = fn
+        return fn
+    return register
+
+
+def periodic_job(kind: str, interval_seconds: float) -> None:
+    """Run `kind` (empty payload) every interval_seconds, e.g. bulk syncs."""
+    _periodic[kind] = max(1.0, float(interval_seconds))
+
+
+def enqueue_job(
+    db,
+    kind: str,
+    payload: dict,
+    dedupe_key: Optional[str] = None,
+    max_attempts: int = JOB_MAX_ATTEMPTS,
+    delay_seconds: float = 0.0,
+    sensitive: bool = False,
+) -> int:
+    """Insert a queued job in the caller's transaction and return its id.
+
+    With a dedupe_key, an identical job that is still queued is reused instead
+    (one that is already running gets a fresh follow-up job). Together with
+    delay_seconds this coalesces bursts into one run. A unique index allows one
+    queued job per key, so concurrent callers can't both insert one; requeued
+    retries give up their key. sensitive=True clears the payload when the job
+    finishes (it holds secrets such as verification codes).
+    """
+    params = {
+        "kind": kind,
+        "payload": json.dumps(payload),
+        "dedupe_key": dedupe_key,
+        "max_attempts": max(1, int(max_attempts)),
+        "delay": max(0.0, float(delay_seconds)),
+        "sensitive": bool(sensitive),
+    }
+    while True:
+        job_id = db.execute(
+            text(
+                """
+                INSERT INTO jobs (
+                    kind, payload, dedupe_key, status, max_attempts, sensitive, run_after, created_at, updated_at
+                )
+                VALUES (:kind, CAST(:payload AS jsonb), :dedupe_key, 'queued', :max_attempts, :sensitive,
+                        NOW() + make_interval(secs => :delay), NOW(), NOW())
+                ON CONFLICT (dedupe_key) WHERE status = 'queued' DO NOTHING
+                RETURNING id
+                """
+            ),
+            params,
+        ).scalar()
+        if job_id is not None:
+            return int(job_id)
+        existing = db.execute(
+            text("SELECT id FROM jobs WHERE dedupe_key = :dedupe_key AND status = 'queued'"),
+            params,
+        ).scalar()
+        if existing is not None:
+            return int(existing)
+        # the queued job was claimed in between: insert again
+
+
+# no payload: it can hold secrets (sensitive jobs) and is only for the handler
+_JOB_COLS = """
+    id, kind, status, attempts, max_attempts, progress, result, error,
+    run_after, created_at, started_at, finished_at, updated_at
+"""
+
+
+def get_job(db, job_id: int) -> Optional[dict]:
+    row = db.execute(
+        text(f"SELECT {_JOB_COLS} FROM jobs WHERE id = :id"),
+        {"id": job_id},
+    ).mappings().first()
+    return dict(row) if row else None
+
+
+def list_jobs(db, status: Optional[str] = None, kind: Optional[str] = None, limit: int = 50) -> list[dict]:
+    rows = db.execute(
+        text(
+            f"""
+            SELECT {_JOB_COLS} FROM jobs
+            WHERE (CAST(:status AS text) IS NULL OR status = :status)
+              AND (CAST(:kind AS text) IS NULL OR kind = :kind)
+            ORDER BY id DESC
+            LIMIT :limit
+            """
+        ),
+        {"status": status, "kind": kind, "limit": limit},
+    ).mappings().all()
+    return [dict(r) for r in rows]
+
+
+def retry_job(db, job_id: int) -> bool:
+    """Requeue a dead job with a fresh attempt budget.
+
+    Sensitive jobs can't be retried: their payload was cleared when they died.
+    """
+    return (
+        db.execute(
+            text(
+                """
+                UPDATE jobs
+                SET status = 'queued', attempts = 0, error = NULL, run_after = NOW(),
+                    dedupe_key = NULL, finished_at = NULL, updated_at = NOW()
+                WHERE id = :id AND status = 'dead' AND NOT sensitive
+                RETURNING id
+                """
+            ),
+            {"id": job_id},
+        ).scalar()
+        is not None
+    )
+
+
+def set_job_progress(job_id: int, progress: dict) -> None:
+    """Store progress and heartbeat (keeps the job from being treated as stale)."""
+    with engine.begin() as conn:
+        conn.execute(
+            text("UPDATE jobs SET progress = CAST(:progress AS jsonb), updated_at = NOW() WHERE id = :id"),
+            {"id": job_id, "progress": json.dumps(progress)},
+        )
+
+
+# ------------------------------
+# Runners
+# ------------------------------
+
+def _claim_job() -> Optional[dict]:
+    if not _handlers:
+        return None
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                """
+                UPDATE jobs
+                SET status = CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'queued' END,
+                    payload = CASE WHEN sensitive AND attempts >= max_attempts THEN CAST('{}' AS jsonb) ELSE payload END,
+                    dedupe_key = NULL,
+                    error = COALESCE(error, 'worker stopped while running'),
+                    updated_at = NOW()
+                WHERE status = 'running' AND updated_at < NOW() - make_interval(secs => :stale)
+                """
+            ),
+            {"stale": JOB_STALE_SECONDS},
+        )
+        row = conn.execute(
+            text(
+                """
+                UPDATE jobs
+                SET status = 'running', attempts = attempts + 1,
+                    started_at = NOW(), updated_at = NOW()
+                WHERE id = (
+                    SELECT id FROM jobs
+                    WHERE status = 'queued' AND run_after <= NOW() AND kind = ANY(:kinds)
+                    ORDER BY run_after, id
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+                )
+                RETURNING id, kind, payload, attempts, max_attempts
+                """
+            ),
+            {"kinds": list(_handlers)},
+        ).mappings().first()
+    return dict(row) if row else None
+
+
+def _enqueue_due_periodic() -> None:
+    with engine.begin() as conn:
+        for kind, interval in _periodic.items():
+            # serialize processes racing for the same kind
+            conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:kind))"), {"kind": kind})
+            conn.execute(
+                text(
+                    """
+                    INSERT INTO jobs (kind, payload, dedupe_key, status, max_attempts, run_after, created_at, updated_at)
+                    SELECT :kind, CAST('{}' AS jsonb), :kind, 'queued', :max_attempts, NOW(), NOW(), NOW()
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM jobs
+                        WHERE kind = :kind
+                          AND (status IN ('queued', 'running') OR created_at > NOW() - make_interval(secs => :interval))
+                    )
+                    ON CONFLICT (dedupe_key) WHERE status = 'queued' DO NOTHING
+                    """
+                ),
+                {"kind": kind, "interval": interval, "max_attempts": JOB_MAX_ATTEMPTS},
+            )
+
+
+def purge_finished_jobs() -> int:
+    """Delete done/dead jobs past their retention (in batches); returns the count."""
+    deleted = 0
+    while True:
+        with engine.begin() as conn:
+            n = conn.execute(
+                text(
+                    """
+                    DELETE FROM jobs
+                    WHERE id IN (
+                        SELECT id FROM jobs
+                        WHERE (status = 'done' AND finished_at < NOW() - make_interval(days => :done_days))
+                           OR (status = 'dead' AND finished_at < NOW() - make_interval(days => :dead_days))
+                        LIMIT 5000
+                    )
+                    """
+                ),
+                {"done_days": JOB_RETENTION_DAYS, "dead_days": JOB_DEAD_RETENTION_DAYS},
+            ).rowcount
+        deleted += n
+        if n < 5000:
+            return deleted
+
+
+def _retry_delay(attempts: int) -> float:
+    delay = JOB_RETRY_BASE_SECONDS * (2 ** max(0, attempts - 1))
+    return min(delay, JOB_RETRY_MAX_SECONDS) * (0.75 + random.random() / 2)
+
+
+def _finish_job(job: dict, result: Optional[dict], error: Optional[str], permanent: bool = False) -> None:
+    if error is None:
+        status, delay = "done", 0.0
+    elif permanent or job["attempts"] >= job["max_attempts"]:
+        status, delay = "dead", 0.0
+    else:
+        status, delay = "queued", _retry_delay(job["attempts"])
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                """
+                UPDATE jobs
+                SET status = :status, result = CAST(:result AS jsonb), error = :error,
+                    payload = CASE WHEN sensitive AND :status <> 'queued' THEN CAST('{}' AS jsonb) ELSE payload END,
+                    -- a newer queued job may hold the key by now (unique while queued)
+                    dedupe_key = CASE WHEN :status = 'queued' THEN NULL ELSE dedupe_key END,
+                    run_after = NOW() + make_interval(secs => :delay),
+                    finished_at = CASE WHEN :status = 'queued' THEN NULL ELSE NOW() END,
+                    updated_at = NOW()
+                WHERE id = :id
+                """
+            ),
+            {
+                "id": job["id"],
+                "status": status,
+                "result": json.dumps(result) if result is not None else None,
+                "error": error,
+                "delay": delay,
+            },
+        )
+    if status == "dead":
+        print(f"[job_queue] job {job['id']} ({job['kind']}) dead after {job['attempts']} attempt(s): {error}")
+
+
+async def run_next_job() -> bool:
+    """Claim and run one job. False when the queue had nothing for us."""
+    job = await asyncio.to_thread(_claim_job)
+    if job is None:
+        return False
+    result, error, permanent = None, None, False
+    try:
+        result = await _handlers[job["kind"]](job["id"], job["payload"] or {})
+    except Exception as e:
+        error = str(e) or e.__class__.__name__
+        permanent = isinstance(e, PermanentJobError)
+        print(f"[job_queue] job {job['id']} ({job['kind']}) attempt {job['attempts']} failed: {error}")
+    await asyncio.to_thread(_finish_job, job, result, error, permanent)
+    return True
+
+
+async def _run_forever() -> None:
+    while True:
+        try:
+            if await run_next_job():
+                continue
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[job_queue] runner error: {e}")
+        await asyncio.sleep(JOB_POLL_SECONDS * (0.5 + random.random()))
+
+
+async def _schedule_forever() -> None:
+    last_purge = 0.0
+    while True:
+        try:
+            if _periodic:
+                await asyncio.to_thread(_enqueue_due_periodic)
+            if time.monotonic() - last_purge >= JOB_PURGE_SECONDS:
+                last_purge = time.monotonic()
+                deleted = await asyncio.to_thread(purge_finished_jobs)
+                if deleted:
+                    print(f"[job_queue] purged {deleted} finished job(s)")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[job_queue] scheduler error: {e}")
+        await asyncio.sleep(JOB_SCHEDULE_SECONDS)
+
+
+def start_job_runners(concurrency: int = JOB_CONCURRENCY) -> None:
+    """Start `concurrency` runner tasks on the running loop (a slow job doesn't block the rest)."""
+    if _runners:
+        return
+    loop = asyncio.get_running_loop()
+    for _ in range(max(1, concurrency)):
+        _runners.append(loop.create_task(_run_forever()))
+    _runners.append(loop.create_task(_schedule_forever()))
+
+
+def start_job_poller() -> None:
+    """API-process entry point (disabled with JOBS_POLLER_ENABLED=false when worker.py runs)."""
+    if JOBS_POLLER_ENABLED:
+        start_job_runners()
+
+
+async def stop_job_poller() -> None:
+    for task in _runners:
+        task.cancel()
+    for task in _runners:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    _runners.clear()
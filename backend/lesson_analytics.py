@@ -8,6 +8,7 @@ from sqlalchemy.engine import Connection
 
 from database import get_db
 from jose import jwt, JWTError
+from routes import _update_path_frontier
 import os
 
 
@@ -397,4 +398,7 @@ def lesson_reset(
         {"u": user_id, "l": lesson_id},
     )
 
+    # the lesson no longer counts as completed: pull the unlock frontier back to it
+    _update_path_frontier(db, user_id, lesson_id, False)
+
     return {"ok": True}
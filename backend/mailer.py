@@ -0,0 +1,179 @@
+"""
+backend/mailer.py
+Outbound email through the job queue.
+
+Endpoints call queue_email() inside their transaction and return right away;
+the "send_email" job (API runner or worker.py) does the SMTP round trip, with
+retries and dead-lettering from job_queue.py.
+
+Messages go out over the process-wide SMTPPool (smtp_sender.py), so a burst
+of jobs reuses a few authenticated sessions instead of one per email;
+queue_email_batch() sends a whole campaign from a handful of jobs.
+
+Without SMTP configuration nothing is queued: the message is printed and
+queue_email() returns False, so the dev-mode flows (verification code in the
+response) keep working.
+"""
+import asyncio
+import os
+import smtplib
+import threading
+from email.message import EmailMessage
+from typing import Optional
+
+from database import engine
+from job_queue import PermanentJobError, enqueue_job, job_handler
+from smtp_sender import SMTPPool
+
+
+SEND_EMAIL_JOB = "send_email"
+SEND_EMAIL_BATCH_JOB = "send_email_batch"
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "200"))
+
+_pool: Optional[SMTPPool] = None
+_pool_lock = threading.Lock()
+
+
+def smtp_settings() -> Optional[dict]:
+    host = os.getenv("SMTP_HOST")
+    user = os.getenv("SMTP_USER")
+    password = os.getenv("SMTP_PASS")
+    if not (host and user and password):
+        return None
+    return {
+        "host": host,
+        "port": int(os.getenv("SMTP_PORT", "587")),
+        "user": user,
+        "password": password,
+        "from": os.getenv("EMAIL_FROM", user),
+        "starttls": os.getenv("SMTP_STARTTLS", "true").lower() == "true",
+    }
+
+
+def smtp_pool() -> Optional[SMTPPool]:
+    """Process-wide pool (None without SMTP configuration)."""
+    global _pool
+    cfg = smtp_settings()
+    if cfg is None:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = SMTPPool(cfg)
+        return _pool
+
+
+def close_smtp_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+
+def _print_email(to_email: str, subject: str, body: str, label: str = "dev mode") -> None:
+    print(f"\n--- EMAIL ({label}) ---")
+    print("To:", to_email)
+    print("Subject:", subject)
+    print(body)
+    print("--- END EMAIL ---\n")
+
+
+def build_message(from_addr: str, to_email: str, subject: str, body: str, html_body: Optional[str] = None) -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = from_addr
+    msg["To"] = to_email
+    msg["Subject"] = subject
+    msg.set_content(body)
+    if html_body:
+        msg.add_alternative(html_body, subtype="html")
+    return msg
+
+
+def queue_email(db, to_email: str, subject: str, body: str, html_body: Optional[str] = None) -> bool:
+    """Queue an email in the caller's transaction.
+
+    Returns True when it will be sent, False when SMTP is not configured (dev
+    mode: the message is only printed).
+    """
+    if smtp_settings() is None:
+        _print_email(to_email, subject, body)
+        return False
+    # the body can carry a verification code or invite link: cleared once sent
+    enqueue_job(
+        db,
+        SEND_EMAIL_JOB,
+        {"to": to_email, "subject": subject, "body": body, "html_body": html_body},
+        sensitive=True,
+    )
+    return True
+
+
+def queue_email_batch(db, messages: list[dict]) -> int:
+    """Queue many emails ({to, subject, body, html_body?}) as batch jobs; returns the number of jobs.
+
+    Without SMTP configuration nothing is queued (dev mode).
+    """
+    if smtp_settings() is None:
+        print(f"[mailer] SMTP not configured; {len(messages)} email(s) not queued")
+        return 0
+    jobs = 0
+    for i in range(0, len(messages), EMAIL_BATCH_SIZE):
+        enqueue_job(db, SEND_EMAIL_BATCH_JOB, {"messages": messages[i:i + EMAIL_BATCH_SIZE]})
+        jobs += 1
+    return jobs
+
+
+def send_email_now(to_email: str, subject: str, body: str, html_body: Optional[str] = None) -> None:
+    """Blocking send over the pool; raises on failure so the job is retried."""
+    pool = smtp_pool()
+    if pool is None:
+        _print_email(to_email, subject, body)
+        return
+    pool.send(build_message(pool.cfg["from"], to_email, subject, body, html_body))
+
+
+@job_handler(SEND_EMAIL_JOB)
+async def send_email_job(job_id: int, payload: dict) -> dict:
+    try:
+        await asyncio.to_thread(
+            send_email_now, payload["to"], payload["subject"], payload["body"], payload.get("html_body")
+        )
+    except smtplib.SMTPRecipientsRefused as e:
+        # bad address: retrying won't help
+        raise PermanentJobError(f"recipient refused: {e.recipients}") from e
+    print(f"✅ Email sent successfully to {payload['to']}")
+    return {"to": payload["to"]}
+
+
+def _requeue_batch(messages: list[dict]) -> None:
+    with engine.begin() as conn:
+        enqueue_job(conn, SEND_EMAIL_BATCH_JOB, {"messages": messages})
+
+
+@job_handler(SEND_EMAIL_BATCH_JOB)
+async def send_email_batch_job(job_id: int, payload: dict) -> dict:
+    """Send a batch over all pooled sessions.
+
+    Refused recipients are dropped; messages that failed for any other reason
+    are queued again as a smaller batch (so a retry never re-sends the ones
+    that went out).
+    """
+    pool = smtp_pool()
+    messages = payload.get("messages") or []
+    if pool is None:
+        for m in messages:
+            _print_email(m["to"], m["subject"], m["body"])
+        return {"sent": 0, "refused": 0, "requeued": 0}
+
+    built = [build_message(pool.cfg["from"], m["to"], m["subject"], m["body"], m.get("html_body")) for m in messages]
+    errors = await asyncio.to_thread(pool.send_many, built)
+    refused = [m["to"] for m, e in zip(messages, errors) if isinstance(e, smtplib.SMTPRecipientsRefused)]
+    failed = [(m, e) for m, e in zip(messages, errors) if e is not None and not isinstance(e, smtplib.SMTPRecipientsRefused)]
+    sent = len(messages) - len(refused) - len(failed)
+    if failed:
+        if sent == 0:
+            # nothing went out (server down?): let the queue back off and retry this job
+            raise RuntimeError(f"batch failed: {failed[0][1]}")
+        await asyncio.to_thread(_requeue_batch, [m for m, _ in failed])
+    print(f"[mailer] batch job {job_id}: {sent} sent, {len(refused)} refused, {len(failed)} requeued")
+    return {"sent": sent, "refused": len(refused), "requeued": len(failed), "refused_to": refused[:50]}
@@ -1,10 +1,19 @@
 # backend/main.py
+import asyncio
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
+from http_compression import CompressionMiddleware
+from tts_client import open_tts_client, close_tts_client
+from tts_cache import tts_disk_cache
+from audio_jobs import shutdown_audio_jobs
+from job_queue import start_job_poller, stop_job_poller
+from mailer import close_smtp_pool
+from audio_store import store_root
+
 from routes import router as api_router
-from routes_audio import router as audio_router  # NEW: Audio management
+from routes_audio import router as audio_router, AudioUploadLimitMiddleware  # NEW: Audio management
 from db_utils import seed_alphabet_lessons
 import os
 from ensure_schema import ensure_schema
@@ -88,6 +97,10 @@ origins = [
     "https://cms.haylingua.am"
 ]
 
+# Cap CMS audio upload bodies while they are read (before multipart spooling finishes).
+# Added before CORS so a 413 still carries CORS headers.
+app.add_middleware(AudioUploadLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -97,6 +110,8 @@ app.add_middleware(
     allow_headers=["*"],  # ✅ needed for Authorization header preflight
 )
 
+# gzip/brotli for JSON responses (audio + precompressed cache hits pass through)
+app.add_middleware(CompressionMiddleware)
 
 @app.on_event("startup")
 def on_startup():
@@ -104,6 +119,43 @@ def on_startup():
         seed_alphabet_lessons()
 
 
+@app.on_event("startup")
+def open_audio_store():
+    # pick (and create) the audio store directory once, before the first upload
+    store_root()
+
+
+@app.on_event("startup")
+async def start_tts_client():
+    # pooled keep-alive client for ElevenLabs (closed on shutdown)
+    await open_tts_client()
+
+
+@app.on_event("startup")
+async def load_tts_cache_index():
+    # LRU index of the /tts disk cache (also moves pre-sharding flat files)
+    await tts_disk_cache.load_index()
+
+
+@app.on_event("startup")
+async def start_background_jobs():
+    # persisted jobs (emails, Brevo sync, TTS pre-generation); handlers register on import.
+    # Off with JOBS_POLLER_ENABLED=false when worker.py runs them instead.
+    start_job_poller()
+
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    await stop_job_poller()
+    await asyncio.to_thread(close_smtp_pool)
+
+
+@app.on_event("shutdown")
+async def stop_tts_client():
+    await close_tts_client()
+    shutdown_audio_jobs()
+
+
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
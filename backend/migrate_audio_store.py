@@ -0,0 +1,94 @@
+"""
+backend/migrate_audio_store.py
+One-off migration: move audio bytea blobs into the content-addressed file store.
+
+Rows in exercise_audio / exercise_audio_targets that still carry audio_data (and no
+file_path) are written to audio_store and updated to point at the file. Each batch
+runs in its own transaction, so the tool can be interrupted and re-run safely.
+
+Usage (from backend/):
+    python migrate_audio_store.py [--batch 200] [--dry-run] [--keep-blobs]
+"""
+import argparse
+
+from sqlalchemy import text
+
+from audio_store import put_bytes, store_root
+from database import engine
+
+
+TABLES = ("exercise_audio", "exercise_audio_targets")
+
+
+def migrate_table(table: str, batch: int, dry_run: bool, keep_blobs: bool) -> tuple[int, int]:
+    """Returns (rows migrated, bytes written)."""
+    moved = 0
+    total_bytes = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text(
+                    f"""
+                    SELECT id, audio_data, audio_format
+                    FROM {table}
+                    WHERE file_path IS NULL AND audio_data IS NOT NULL AND id > :last_id
+                    ORDER BY id ASC
+                    LIMIT :batch
+                    """
+                ),
+                {"last_id": last_id, "batch": batch},
+            ).mappings().all()
+            if not rows:
+                break
+
+            for r in rows:
+                last_id = int(r["id"])
+                data = bytes(r["audio_data"])
+                total_bytes += len(data)
+                moved += 1
+                if dry_run:
+                    continue
+                stored = put_bytes(data, r["audio_format"] or "mp3")
+                conn.execute(
+                    text(
+                        f"""
+                        UPDATE {table}
+                        SET file_path = :file_path,
+                            content_hash = :content_hash,
+                            audio_size = :audio_size,
+                            audio_data = CASE WHEN :keep THEN audio_data ELSE NULL END
+                        WHERE id = :id
+                        """
+                    ),
+                    {
+                        "id": r["id"],
+                        "file_path": stored.file_path,
+                        "content_hash": stored.content_hash,
+                        "audio_size": stored.size,
+                        "keep": keep_blobs,
+                    },
+                )
+        print(f"[migrate_audio_store] {table}: {moved} rows, {total_bytes / 1024 / 1024:.1f} MB")
+    return moved, total_bytes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Move audio blobs from Postgres into the file store.")
+    parser.add_argument("--batch", type=int, default=200, help="rows per transaction")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be moved")
+    parser.add_argument("--keep-blobs", action="store_true", help="write files but keep audio_data in the DB")
+    args = parser.parse_args()
+
+    print(f"[migrate_audio_store] store root: {store_root()}")
+    for table in TABLES:
+        migrate_table(table, max(1, args.batch), args.dry_run, args.keep_blobs)
+
+    if not args.dry_run and not args.keep_blobs:
+        print("[migrate_audio_store] done; run VACUUM FULL on the audio tables to reclaim space ✅")
+    else:
+        print("[migrate_audio_store] done ✅")
+
+
+if __name__ == "__main__":
+    main()
@@ -27,18 +27,25 @@ from auth import (
 # JWT decode (for Bearer auth on /complete)
 from jose import jwt, JWTError
 
-# Brevo (Sendinblue) integration (contacts + events)
-try:
-    from integrations.brevo import upsert_contact as _brevo_upsert_contact
-    from integrations.brevo import track_event as _brevo_track_event
-except Exception:
-    _brevo_upsert_contact = None
-    _brevo_track_event = None
+# Brevo (Sendinblue) integration (contacts + events), synced in bulk by brevo_sync.py
+from brevo_sync import mark_brevo_dirty
 
 
 
 import math
 
+from http_compression import lesson_payload_cache, leaderboard_payload_cache
+from db_utils import bump_course_path_version, bump_lesson_content_version, refresh_lesson_stats, reindex_course_path
+from audio_manifest import audio_url, get_manifest_by_slug, rebuild_lesson_audio_manifest
+from tts_client import eleven_breaker, eleven_failed, get_tts_client
+from circuit_breaker import CircuitOpen, breaker_metrics
+from tts_cache import TTS_DEFAULT_VOICE_ID, tts_cache_key, tts_disk_cache, tts_flight
+from audio_pregen import enqueue_lesson_pregen
+from audio_pack import build_pack, pack_clips, pack_voice, preload_link_header, remember_pack, stored_pack
+from job_queue import get_job, list_jobs, retry_job
+from storage_gc import enqueue_storage_gc
+from mailer import queue_email
+
 
 #CMS
 from fastapi import APIRouter, Depends, HTTPException, Request, Header
@@ -53,8 +60,6 @@ router = APIRouter()
 
 import hashlib
 import random
-import smtplib
-from email.message import EmailMessage
 
 EMAIL_CODE_PEPPER = os.getenv("EMAIL_CODE_PEPPER", "change_me")
 
@@ -157,52 +162,13 @@ def _render_verification_email_html(name: str, code: str) -> str:
 </html>"""
 
 
-def _send_email(to_email: str, subject: str, body: str, html_body: Optional[str] = None) -> bool:
-    """Send email via SMTP if configured; otherwise log to server console.
-    
+def _send_email(db: Connection, to_email: str, subject: str, body: str, html_body: Optional[str] = None) -> bool:
+    """Queue an email (sent by the "send_email" job) if SMTP is configured; otherwise log to server console.
+
     Returns:
-        bool: True if email was sent via SMTP, False if only logged to console
+        bool: True if the email was queued for SMTP delivery, False if only logged to console
     """
-    smtp_host = os.getenv("SMTP_HOST")
-    smtp_port = int(os.getenv("SMTP_PORT", "587"))
-    smtp_user = os.getenv("SMTP_USER")
-    smtp_pass = os.getenv("SMTP_PASS")
-    email_from = os.getenv("EMAIL_FROM", smtp_user or "no-reply@haylingua.local")
-
-    if not (smtp_host and smtp_user and smtp_pass):
-        # Dev-safe fallback
-        print("\n--- EMAIL (dev mode) ---")
-        print("To:", to_email)
-        print("Subject:", subject)
-        print(body)
-        print("--- END EMAIL ---\n")
-        return False  # Email not sent, only logged
-
-    try:
-        msg = EmailMessage()
-        msg["From"] = email_from
-        msg["To"] = to_email
-        msg["Subject"] = subject
-        msg.set_content(body)
-        if html_body:
-            msg.add_alternative(html_body, subtype="html")
-
-        with smtplib.SMTP(smtp_host, smtp_port) as s:
-            s.starttls()
-            s.login(smtp_user, smtp_pass)
-            s.send_message(msg)
-        
-        print(f"✅ Email sent successfully to {to_email}")
-        return True  # Email sent successfully
-    except Exception as e:
-        print(f"❌ Email sending failed: {e}")
-        # Still log to console in case of failure
-        print("\n--- EMAIL (fallback after error) ---")
-        print("To:", to_email)
-        print("Subject:", subject)
-        print(body)
-        print("--- END EMAIL ---\n")
-        return False
+    return queue_email(db, to_email, subject, body, html_body)
 
 def _require_verified(db: Connection, user_id: int):
     row = db.execute(
@@ -525,110 +491,29 @@ def _compute_streak_days(db: Connection, user_id: int) -> int:
 
 
 def _brevo_sync_user(db: Connection, user_id: int, *, event: str | None = None, event_props: dict | None = None) -> None:
-    """Best-effort sync to Brevo.
+    """Best-effort Brevo sync (contact attributes + optional event).
 
-    This must NEVER break the API flow.
+    Only marks the user dirty (the periodic bulk sync pushes attributes) and
+    queues the event. This must NEVER break the API flow.
     """
-    if _brevo_upsert_contact is None:
-        return
     # NOTE: this function is called inside request transactions.
-    # Any SQL error would abort the whole transaction unless we isolate it.
-    # Use a SAVEPOINT so failures here never roll back signup/verify flows.
+    # Use a SAVEPOINT so a failed update never rolls back signup/verify flows.
     try:
-        sp_name = "brevo_sync"
-        try:
-            db.execute(text(f"SAVEPOINT {sp_name}"))
-        except Exception:
-            sp_name = None
-
-        u = db.execute(
-            text(
-                """
-                SELECT id, email, username, display_name, first_name, last_name, bio,
-                       avatar_url, banner_url, friends_public, is_hidden, email_verified
-                FROM users
-                WHERE id = :id
-                """
-            ),
-            {"id": int(user_id)},
-        ).mappings().first()
-        if not u:
-            return
-
-        # Stats tables/columns have evolved; use the canonical table used elsewhere in this project.
-        # user_lesson_progress columns: xp_earned, completed_at, lesson_id
-        stats = db.execute(
-            text(
-                """
-                SELECT
-                  COALESCE(SUM(ulp.xp_earned), 0) AS total_xp,
-                  COUNT(DISTINCT ulp.lesson_id) FILTER (WHERE ulp.completed_at IS NOT NULL) AS lessons_completed,
-                  (SELECT COUNT(*) FROM user_exercise_logs l WHERE l.user_id = :u) AS exercises_done
-                FROM user_lesson_progress ulp
-                WHERE ulp.user_id = :u
-                """
-            ),
-            {"u": int(user_id)},
-        ).mappings().first() or {}
-
-        streak = _compute_streak_days(db, int(user_id))
-
-        # "As much data as possible" – send what we have today.
-        attrs = {
-            "HAYLINGUA_USER_ID": int(u.get("id")),
-            "USERNAME": (u.get("username") or "") or None,
-            "DISPLAY_NAME": (u.get("display_name") or "") or None,
-            "FIRST_NAME": (u.get("first_name") or "") or None,
-            "LAST_NAME": (u.get("last_name") or "") or None,
-            "BIO": (u.get("bio") or "") or None,
-            "AVATAR_URL": (u.get("avatar_url") or "") or None,
-            "BANNER_URL": (u.get("banner_url") or "") or None,
-            "FRIENDS_PUBLIC": bool(u.get("friends_public")),
-            "IS_HIDDEN": bool(u.get("is_hidden")),
-            "EMAIL_VERIFIED": bool(u.get("email_verified")),
-            "XP_TOTAL": int(stats.get("total_xp") or 0),
-            "LESSONS_COMPLETED": int(stats.get("lessons_completed") or 0),
-            "EXERCISES_COMPLETED": int(stats.get("exercises_done") or 0),
-            "STREAK_DAYS": int(streak),
-            "LANGUAGE": "Armenian",
-        }
-
-        email = (u.get("email") or "").strip()
-        if not email:
-            return
-
-        _brevo_upsert_contact(email=email, attributes=attrs)
-
-        if event and _brevo_track_event is not None:
-            props = dict(event_props or {})
-            props.update(
-                {
-                    "user_id": int(u.get("id")),
-                    "username": (u.get("username") or "") or None,
-                    "total_xp": int(stats.get("total_xp") or 0),
-                    "streak_days": int(streak),
-                }
-            )
-            _brevo_track_event(email=email, event=event, properties=props)
-
-        if sp_name:
-            try:
-                db.execute(text(f"RELEASE SAVEPOINT {sp_name}"))
-            except Exception:
-                pass
+        db.execute(text("SAVEPOINT brevo_sync"))
+    except Exception:
+        return
+    try:
+        mark_brevo_dirty(db, int(user_id), event=event, event_props=event_props)
+        db.execute(text("RELEASE SAVEPOINT brevo_sync"))
     except Exception:
-        # If we created a savepoint and something failed, rollback to it so the
-        # outer request transaction isn't aborted.
         try:
             db.execute(text("ROLLBACK TO SAVEPOINT brevo_sync"))
             db.execute(text("RELEASE SAVEPOINT brevo_sync"))
         except Exception:
             pass
         # Never raise; just log server-side.
-        try:
-            traceback.print_exc()
-        except Exception:
-            pass
+        traceback.print_exc()
+
 
 # ---------- Friends schemas + API ----------
 class FriendOut(BaseModel):
@@ -1056,7 +941,7 @@ ELEVEN_API_KEY = (
     or os.getenv("ELEVEN_LABS_API_KEY")
     or os.getenv("eleven_labs.io")
 )
-DEFAULT_VOICE_ID = "JBFqnCBsd6RMkjVDRZzb"
+DEFAULT_VOICE_ID = TTS_DEFAULT_VOICE_ID
 
 
 class TTSPayload(BaseModel):
@@ -1459,6 +1344,7 @@ def signup(user: UserCreate, db: Connection = Depends(get_db)):
         "If you didn't request this, you can ignore this email."
     )
     email_sent = _send_email(
+        db,
         to_email=email,
         subject=subject,
         body=plain,
@@ -1667,6 +1553,7 @@ def resend_verification(
         "If you didn't request this, you can ignore this email."
     )
     email_sent = _send_email(
+        db,
         to_email=user_row["email"],
         subject=subject,
         body=plain,
@@ -1684,29 +1571,88 @@ def resend_verification(
         return response_data_dict
 
     return response_data
+
+
+MAX_PAGE_SIZE = 100
+
+
+def _clamp_page(limit: Optional[int], offset: int) -> tuple[Optional[int], int]:
+    if limit is not None:
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    return limit, max(0, int(offset or 0))
+
+
 @router.get("/lessons", response_model=List[LessonOut])
-def list_lessons(db: Connection = Depends(get_db)):
+def list_lessons(
+    level: Optional[int] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    db: Connection = Depends(get_db),
+):
+    # `level` filters to one unit; `limit`/`offset` paginate (no limit = full list, as before).
+    limit, offset = _clamp_page(limit, offset)
     rows = db.execute(
         text(
             """
             SELECT id, slug, title, description, level, xp, COALESCE(lesson_type, 'standard') as lesson_type, COALESCE(config, '{}'::jsonb) as config
             FROM lessons
             WHERE is_published = true
+              AND (CAST(:level AS integer) IS NULL OR level = :level)
             ORDER BY level ASC, id ASC
+            LIMIT :limit OFFSET :offset
             """
-        )
+        ),
+        {"level": level, "limit": limit, "offset": offset},
     ).mappings().all()
 
     return [LessonOut(**dict(row)) for row in rows]
 
 
-@router.get("/lessons/{slug}", response_model=LessonWithExercisesOut)
-def get_lesson(slug: str, db: Connection = Depends(get_db)):
+class UnitOut(BaseModel):
+    level: int
+    title: str
+    lessons_total: int
+    xp_total: int
+
+
+@router.get("/lessons/units", response_model=List[UnitOut])
+def list_units(db: Connection = Depends(get_db)):
+    """Published lessons grouped by level (unit), without the lesson bodies."""
+    rows = db.execute(
+        text(
+            """
+            SELECT l.level,
+                   COUNT(*)::int AS lessons_total,
+                   COALESCE(SUM(ls.xp_total), 0)::int AS xp_total
+            FROM lessons l
+            LEFT JOIN lesson_stats ls ON ls.lesson_id = l.id
+            WHERE l.is_published = true
+            GROUP BY l.level
+            ORDER BY l.level ASC
+            """
+        )
+    ).mappings().all()
+    return [
+        UnitOut(
+            level=int(r["level"] or 1),
+            title=f"Unit {int(r['level'] or 1)}",
+            lessons_total=int(r["lessons_total"] or 0),
+            xp_total=int(r["xp_total"] or 0),
+        )
+        for r in rows
+    ]
+
+
+def _load_lesson_with_exercises(db: Connection, slug: str) -> dict:
+    # xp = sum of exercise XP, precomputed in lesson_stats
     lesson_row = db.execute(
         text("""
-            SELECT id, slug, title, description, level, xp, COALESCE(lesson_type, 'standard') as lesson_type, COALESCE(config, '{}'::jsonb) as config
-            FROM lessons
-            WHERE slug = :slug
+            SELECT l.id, l.slug, l.title, l.description, l.level,
+                   COALESCE(ls.xp_total, 0) AS xp,
+                   COALESCE(l.lesson_type, 'standard') as lesson_type, COALESCE(l.config, '{}'::jsonb) as config
+            FROM lessons l
+            LEFT JOIN lesson_stats ls ON ls.lesson_id = l.id
+            WHERE l.slug = :slug
         """),
         {"slug": slug},
     ).mappings().first()
@@ -1735,8 +1681,7 @@ def get_lesson(slug: str, db: Connection = Depends(get_db)):
     ex_ids = [int(r["id"]) for r in exercises_rows]
     options_by_ex: dict[int, list[dict]] = {eid: [] for eid in ex_ids}
     lesson_dict: Dict[str, Any] = dict(lesson_row)
-    lesson_dict["xp"] = sum(int(r.get("xp") or 0) for r in exercises_rows)
-    
+
     if ex_ids:
         opt_rows = db.execute(
             text("""
@@ -1759,7 +1704,134 @@ def get_lesson(slug: str, db: Connection = Depends(get_db)):
         exercises_out.append(d)
 
     lesson_dict["exercises"] = [ExerciseOut(**e) for e in exercises_out]
-    return LessonWithExercisesOut(**lesson_dict)
+    return LessonWithExercisesOut(**lesson_dict).model_dump()
+
+
+def _lesson_content_version(db: Connection) -> int:
+    """course_path.content_version: bumped by CMS writes, part of every lesson payload cache key.
+
+    Read before the lesson rows, so a concurrent edit can at worst put fresh
+    rows under the old key, never old rows under the new one.
+    """
+    return int(db.execute(text("SELECT content_version FROM course_path WHERE id = 1")).scalar() or 0)
+
+
+def _lesson_pack_voice(db: Connection, voice: Optional[str], authorization: Optional[str]) -> Optional[str]:
+    """Pack voice the client will load: ?voice=..., else the user's onboarding voice_pref (None if unknown)."""
+    if voice:
+        return pack_voice(voice)
+    try:
+        user_id = _get_user_id_from_bearer(authorization)
+    except HTTPException:
+        return None
+    if user_id is None:
+        return None
+    pref = db.execute(
+        text("SELECT voice_pref FROM user_onboarding WHERE user_id = :u"),
+        {"u": int(user_id)},
+    ).scalar()
+    return pack_voice(pref)
+
+
+@router.get("/lessons/{slug}", response_model=LessonWithExercisesOut)
+def get_lesson(
+    slug: str,
+    request: Request,
+    voice: Optional[str] = None,
+    authorization: Optional[str] = Header(default=None),
+    db: Connection = Depends(get_db),
+):
+    # Serialized + gzip/br compressed once per lesson (and content version), then served from memory.
+    version = _lesson_content_version(db)
+    payload = lesson_payload_cache.get_or_build(
+        f"lesson:{slug}:v{version}", lambda: _load_lesson_with_exercises(db, slug)
+    )
+
+    # Let the browser start downloading the lesson's audio pack while it parses the JSON.
+    # (CDNs in front of us turn these Link headers into 103 Early Hints.)
+    headers = {}
+    voice_key = _lesson_pack_voice(db, voice, authorization)
+    if voice_key is not None:
+        link = preload_link_header(db, slug, voice_key)
+        if link:
+            headers["Link"] = link
+    return payload.response(request, headers=headers, cache_control="no-cache")
+
+
+@router.get("/lessons/{slug}/audio-manifest")
+def get_lesson_audio_manifest(slug: str, request: Request, db: Connection = Depends(get_db)):
+    """Every stored clip of a lesson in one response, so the client stops probing /audio/... URLs.
+
+    `exercise_ids` lists all exercises of the lesson: an exercise listed there
+    without items has no stored audio (go straight to /tts).
+    """
+    version = _lesson_content_version(db)
+    manifest = get_manifest_by_slug(db, slug)
+    if not manifest:
+        raise HTTPException(status_code=404, detail="Lesson not found")
+
+    exercise_ids = db.execute(
+        text('SELECT id FROM exercises WHERE lesson_id = :lid ORDER BY "order" ASC, id ASC'),
+        {"lid": manifest["lesson_id"]},
+    ).scalars().all()
+
+    def build():
+        return {
+            "lesson_id": manifest["lesson_id"],
+            "slug": slug,
+            "exercise_ids": exercise_ids,
+            "items": [
+                {
+                    "exercise_id": e["exercise_id"],
+                    "target_key": e.get("target_key"),
+                    "voice": e.get("voice"),
+                    "format": e.get("format"),
+                    "size": e.get("size"),
+                    "hash": e.get("hash"),
+                    "url": audio_url(e),
+                }
+                for e in manifest["entries"]
+            ],
+        }
+
+    # Keyed by the manifest etag (audio writes rebuild it) and the content version (CMS edits).
+    payload = lesson_payload_cache.get_or_build(
+        f"lesson:audio-manifest:{slug}:v{version}:{manifest['etag']}", build
+    )
+    return payload.response(request, cache_control="no-cache")
+
+
+@router.get("/lessons/{slug}/audio-pack")
+def get_lesson_audio_pack(slug: str, voice: Optional[str] = None, db: Connection = Depends(get_db)):
+    """Index of the lesson's audio pack: every stored clip in one file.
+
+    The client downloads `url` once and slices clips at `offset`/`length`
+    (absolute byte positions in the pack). `voice` limits the pack to one
+    voice; without it all voices are included.
+    """
+    lesson_id = db.execute(text("SELECT id FROM lessons WHERE slug = :slug"), {"slug": slug}).scalar()
+    if lesson_id is None:
+        raise HTTPException(status_code=404, detail="Lesson not found")
+    voice = voice if voice in ("male", "female") else None
+
+    # the pack built for the current manifest, if any; otherwise build (or find) it and remember it
+    etag, stored = stored_pack(db, int(lesson_id), voice)
+    if stored is not None:
+        pack_id, index = stored
+    else:
+        pack_id, index = build_pack(pack_clips(db, int(lesson_id), voice))
+        remember_pack(db, int(lesson_id), voice, etag, pack_id)
+    base = index["data_offset"]
+    clips = [{**c, "offset": base + c["offset"]} for c in index["clips"]]
+    return {
+        "lesson_id": int(lesson_id),
+        "slug": slug,
+        "voice": voice,
+        "pack_id": pack_id,
+        "url": f"/audio/packs/{pack_id}",
+        "size": base + sum(c["length"] for c in clips),
+        "clips": clips,
+    }
 
 
 # --------- "Done" button: complete lesson & earn XP ---------
@@ -1936,53 +2008,159 @@ class LessonProgressOut(BaseModel):
     status: str  # completed | current | locked
 
 
-@router.get("/me/lessons/progress", response_model=list[LessonProgressOut])
-def me_lessons_progress(
-    authorization: Optional[str] = Header(default=None),
-    db: Connection = Depends(get_db),
-):
-    """Dashboard helper: lessons joined with per-user progress and unlock state."""
-    user_id = _get_user_id_from_bearer(authorization)
-    if user_id is None:
-        raise HTTPException(status_code=401, detail="Missing Bearer token")
+# A lesson counts as "completed" for unlocking once it was marked complete or
+# reached 70% of its exercises (same rule the dashboard always used).
+_LESSON_DONE_SQL = """
+    (
+      ulp.completed_at IS NOT NULL
+      OR (
+        COALESCE(ls.exercises_total, 0) > 0
+        AND ROUND(COALESCE(ulp.exercises_completed, 0)::numeric * 100 / ls.exercises_total, 2) >= 70
+      )
+    )
+"""
+
+
+def _compute_path_frontier(db: Connection, user_id: int, start_index: int = 0) -> int:
+    """Index of the first not-completed published lesson at/after start_index (or #lessons if all done)."""
+    row = db.execute(
+        text(
+            f"""
+            SELECT
+              (SELECT MIN(l.path_index)
+               FROM lessons l
+               LEFT JOIN lesson_stats ls ON ls.lesson_id = l.id
+               LEFT JOIN user_lesson_progress ulp
+                 ON ulp.lesson_id = l.id
+                AND ulp.user_id = :u
+               WHERE l.path_index >= :start
+                 AND l.is_published = true
+                 AND NOT {_LESSON_DONE_SQL}) AS first_open,
+              (SELECT COUNT(*) FROM lessons)::int AS lessons_total
+            """
+        ),
+        {"u": int(user_id), "start": int(start_index)},
+    ).mappings().first()
+    if row["first_open"] is None:
+        return int(row["lessons_total"] or 0)
+    return int(row["first_open"])
+
+
+def _store_path_frontier(db: Connection, user_id: int, frontier: int, version: int) -> None:
+    db.execute(
+        text(
+            """
+            INSERT INTO user_path_state (user_id, frontier_index, path_version, updated_at)
+            VALUES (:u, :f, :v, NOW())
+            ON CONFLICT (user_id) DO UPDATE SET
+              frontier_index = EXCLUDED.frontier_index,
+              path_version = EXCLUDED.path_version,
+              updated_at = NOW()
+            """
+        ),
+        {"u": int(user_id), "f": int(frontier), "v": int(version)},
+    )
+
+
+def _get_path_frontier(db: Connection, user_id: int) -> int:
+    """Stored path frontier for the user; recomputed once after the CMS changes the path."""
+    row = db.execute(
+        text(
+            """
+            SELECT cp.version, ups.frontier_index, ups.path_version
+            FROM course_path cp
+            LEFT JOIN user_path_state ups ON ups.user_id = :u
+            WHERE cp.id = 1
+            """
+        ),
+        {"u": int(user_id)},
+    ).mappings().first()
+
+    version = int(row["version"]) if row else 0
+    if row and row["path_version"] is not None and int(row["path_version"]) == version:
+        return int(row["frontier_index"])
+
+    frontier = _compute_path_frontier(db, user_id)
+    _store_path_frontier(db, user_id, frontier, version)
+    return frontier
 
+
+def _update_path_frontier(db: Connection, user_id: int, lesson_id: int, is_completed: bool) -> None:
+    """Move the user's frontier after a lesson's completion state was recomputed."""
+    frontier = _get_path_frontier(db, user_id)
+    row = db.execute(
+        text(
+            """
+            SELECT l.path_index, cp.version
+            FROM lessons l
+            LEFT JOIN course_path cp ON cp.id = 1
+            WHERE l.id = :l
+            """
+        ),
+        {"l": int(lesson_id)},
+    ).mappings().first()
+    if not row or row["path_index"] is None:
+        return
+
+    idx = int(row["path_index"])
+    if is_completed and idx == frontier:
+        # Crossed 70% on the current lesson -> skip past any already-completed ones after it.
+        new_frontier = _compute_path_frontier(db, user_id, start_index=idx + 1)
+    elif not is_completed and idx < frontier:
+        # Lesson fell back below the threshold (e.g. exercises were added).
+        new_frontier = idx
+    else:
+        return
+
+    _store_path_frontier(db, user_id, new_frontier, int(row["version"] or 0))
+
+
+def _lesson_progress_rows(
+    db: Connection,
+    user_id: int,
+    *,
+    level: Optional[int] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> list[LessonProgressOut]:
+    """Published lessons (optionally one unit / one page) merged with the user's progress + unlock state."""
     rows = db.execute(
         text(
             """
-            WITH ex AS (
-              SELECT lesson_id,
-                     COUNT(*)::int AS exercises_total,
-                     COALESCE(SUM(xp), 0)::int AS xp_total
-              FROM exercises
-              GROUP BY lesson_id
-            )
             SELECT
               l.id,
               l.slug,
               l.title,
               l.description,
               l.level,
-              COALESCE(ex.xp_total, COALESCE(l.xp, 0))::int AS xp_total,
-              COALESCE(ex.exercises_total, 0)::int AS exercises_total,
+              l.path_index,
+              CASE WHEN COALESCE(ls.exercises_total, 0) > 0
+                   THEN ls.xp_total
+                   ELSE COALESCE(l.xp, 0)
+              END::int AS xp_total,
+              COALESCE(ls.exercises_total, 0)::int AS exercises_total,
               COALESCE(ulp.exercises_completed, 0)::int AS exercises_completed,
               COALESCE(ulp.xp_earned, 0)::int AS xp_earned,
               ulp.completed_at
             FROM lessons l
-            LEFT JOIN ex ON ex.lesson_id = l.id
+            LEFT JOIN lesson_stats ls ON ls.lesson_id = l.id
             LEFT JOIN user_lesson_progress ulp
               ON ulp.lesson_id = l.id
              AND ulp.user_id = :u
-            ORDER BY l.level ASC, l.id ASC
+            WHERE l.is_published = true
+              AND (CAST(:level AS integer) IS NULL OR l.level = :level)
+            ORDER BY l.path_index ASC NULLS LAST, l.level ASC, l.id ASC
+            LIMIT :limit OFFSET :offset
             """
         ),
-        {"u": int(user_id)},
+        {"u": int(user_id), "level": level, "limit": limit, "offset": int(offset)},
     ).mappings().all()
 
-    out: list[LessonProgressOut] = []
+    # Lessons before the frontier are completed, the frontier lesson is current,
+    # everything after it stays locked (first lesson is always unlocked).
+    frontier = _get_path_frontier(db, int(user_id))
 
-    # Compute status: first is unlocked; next unlocks when previous is completed (>=70%).
-    prev_completed = True  # allow first
-    current_set = False
+    out: list[LessonProgressOut] = []
     for r in rows:
         exercises_total = int(r["exercises_total"] or 0)
         exercises_completed = int(r["exercises_completed"] or 0)
@@ -1993,22 +2171,13 @@ def me_lessons_progress(
         if exercises_total > 0:
             pct = round((exercises_completed / exercises_total) * 100.0, 2)
 
-        is_completed = (pct >= 70.0) or (r.get("completed_at") is not None)
-
-        if not prev_completed:
+        idx = r.get("path_index")
+        if idx is None or idx > frontier:
             status = "locked"
+        elif idx < frontier:
+            status = "completed"
         else:
-            if is_completed:
-                status = "completed"
-            else:
-                if not current_set:
-                    status = "current"
-                    current_set = True
-                else:
-                    status = "locked"  # keep later ones locked until you finish the current
-
-        # Unlock chaining uses "completed" only
-        prev_completed = is_completed
+            status = "current"
 
         out.append(
             LessonProgressOut(
@@ -2028,6 +2197,133 @@ def me_lessons_progress(
 
     return out
 
+
+@router.get("/me/lessons/progress", response_model=list[LessonProgressOut])
+def me_lessons_progress(
+    limit: Optional[int] = None,
+    offset: int = 0,
+    authorization: Optional[str] = Header(default=None),
+    db: Connection = Depends(get_db),
+):
+    """Dashboard helper: lessons joined with per-user progress and unlock state.
+
+    Without `limit` this returns the whole path (old behaviour); new clients should
+    use /me/units + /me/units/{level}/lessons instead.
+    """
+    user_id = _get_user_id_from_bearer(authorization)
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Missing Bearer token")
+
+    limit, offset = _clamp_page(limit, offset)
+    return _lesson_progress_rows(db, int(user_id), limit=limit, offset=offset)
+
+
+# ---------- Units (lessons grouped by lessons.level) ----------
+
+class UnitSummaryOut(BaseModel):
+    level: int
+    title: str
+    lessons_total: int
+    lessons_completed: int
+    xp_total: int
+    xp_earned: int
+    status: str  # completed | current | locked
+
+
+class UnitLessonsPageOut(BaseModel):
+    level: int
+    total: int
+    offset: int
+    limit: int
+    lessons: list[LessonProgressOut]
+
+
+@router.get("/me/units", response_model=list[UnitSummaryOut])
+def me_units(
+    authorization: Optional[str] = Header(default=None),
+    db: Connection = Depends(get_db),
+):
+    """One summary row per unit; lesson lists are fetched per unit on demand."""
+    user_id = _get_user_id_from_bearer(authorization)
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Missing Bearer token")
+
+    frontier = _get_path_frontier(db, int(user_id))
+
+    rows = db.execute(
+        text(
+            """
+            SELECT
+              l.level,
+              COUNT(*)::int AS lessons_total,
+              COUNT(*) FILTER (WHERE l.path_index < :frontier)::int AS lessons_completed,
+              COALESCE(SUM(
+                CASE WHEN COALESCE(ls.exercises_total, 0) > 0 THEN ls.xp_total ELSE COALESCE(l.xp, 0) END
+              ), 0)::int AS xp_total,
+              COALESCE(SUM(ulp.xp_earned), 0)::int AS xp_earned,
+              MIN(l.path_index) AS first_index,
+              MAX(l.path_index) AS last_index
+            FROM lessons l
+            LEFT JOIN lesson_stats ls ON ls.lesson_id = l.id
+            LEFT JOIN user_lesson_progress ulp
+              ON ulp.lesson_id = l.id
+             AND ulp.user_id = :u
+            WHERE l.is_published = true
+            GROUP BY l.level
+            ORDER BY l.level ASC
+            """
+        ),
+        {"u": int(user_id), "frontier": int(frontier)},
+    ).mappings().all()
+
+    out: list[UnitSummaryOut] = []
+    for r in rows:
+        first_idx = r.get("first_index")
+        last_idx = r.get("last_index")
+        if last_idx is not None and last_idx < frontier:
+            status = "completed"
+        elif first_idx is not None and first_idx <= frontier:
+            status = "current"
+        else:
+            status = "locked"
+
+        level = int(r["level"] or 1)
+        out.append(
+            UnitSummaryOut(
+                level=level,
+                title=f"Unit {level}",
+                lessons_total=int(r["lessons_total"] or 0),
+                lessons_completed=int(r["lessons_completed"] or 0),
+                xp_total=int(r["xp_total"] or 0),
+                xp_earned=int(r["xp_earned"] or 0),
+                status=status,
+            )
+        )
+    return out
+
+
+@router.get("/me/units/{level}/lessons", response_model=UnitLessonsPageOut)
+def me_unit_lessons(
+    level: int,
+    limit: int = 20,
+    offset: int = 0,
+    authorization: Optional[str] = Header(default=None),
+    db: Connection = Depends(get_db),
+):
+    """Paginated lesson progress for one unit."""
+    user_id = _get_user_id_from_bearer(authorization)
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Missing Bearer token")
+
+    limit, offset = _clamp_page(limit, offset)
+    total = db.execute(
+        text("SELECT COUNT(*) FROM lessons WHERE level = :level AND is_published = true"),
+        {"level": int(level)},
+    ).scalar_one()
+
+    lessons = _lesson_progress_rows(db, int(user_id), level=int(level), limit=limit, offset=offset)
+    return UnitLessonsPageOut(level=int(level), total=int(total or 0), offset=offset, limit=limit, lessons=lessons)
+
 @router.post("/me/exercises/{exercise_id}/attempt", response_model=AttemptOut)
 def record_exercise_attempt(
     exercise_id: int,
@@ -2648,7 +2944,7 @@ def me_change_email_start(
     # Send to the NEW email
     subject = "Confirm your new Haylingua email"
     plain = f"Your Haylingua email change code is: {code}. It expires in 20 minutes."
-    email_sent = _send_email(to_email=new_email, subject=subject, body=plain, html_body=None)
+    email_sent = _send_email(db, to_email=new_email, subject=subject, body=plain, html_body=None)
 
     resp = {"ok": True, "email_sent": bool(email_sent)}
     # Dev fallback (same as signup verify): include code when email didn't send.
@@ -3145,12 +3441,20 @@ def me_next_exercise(
     return rec
     
 @router.get("/leaderboard", response_model=List[LeaderboardEntryOut])
-def get_leaderboard(limit: int = 50, db: Connection = Depends(get_db)):
+def get_leaderboard(request: Request, limit: int = 50, db: Connection = Depends(get_db)):
     if limit < 1:
         limit = 1
     if limit > 200:
         limit = 200
 
+    # Snapshot is shared by every viewer; rebuild at most every ~30s per worker.
+    payload = leaderboard_payload_cache.get_or_build(
+        f"leaderboard:{limit}", lambda: _build_leaderboard(db, limit)
+    )
+    return payload.response(request, cache_control="public, max-age=30")
+
+
+def _build_leaderboard(db: Connection, limit: int) -> list[dict]:
     # Real XP from lesson_progress
     rows = db.execute(
         text(
@@ -3170,7 +3474,7 @@ def get_leaderboard(limit: int = 50, db: Connection = Depends(get_db)):
         {"limit": limit},
     ).mappings().all()
 
-    out: List[LeaderboardEntryOut] = []
+    out: list[dict] = []
     for i, r in enumerate(rows, start=1):
         email = r["email"] or ""
         # Show username when present; otherwise keep the old display format.
@@ -3196,7 +3500,7 @@ def get_leaderboard(limit: int = 50, db: Connection = Depends(get_db)):
                 streak=streak,
                 level=level,
                 rank=i,
-            )
+            ).model_dump()
         )
 
     return out
@@ -3322,36 +3626,16 @@ def require_cms_temp(authorization: Optional[str] = Header(None), db=Depends(get
         raise HTTPException(status_code=403, detail="CMS user disabled or missing")
     return dict(row)
 
-def _send_invite_email(email: str, invite_url: str):
+def _send_invite_email(db, email: str, invite_url: str):
     """
-    Best-effort. If SMTP not configured, prints link to logs.
+    Best-effort, queued with the invite row. If SMTP not configured, prints the email (and link) to logs.
     """
-    host = os.getenv("SMTP_HOST")
-    port = int(os.getenv("SMTP_PORT") or "587")
-    user = os.getenv("SMTP_USER")
-    password = os.getenv("SMTP_PASS")
-    from_addr = os.getenv("EMAIL_FROM") or user or "no-reply@haylingua.am"
-
-    if not host or not user or not password:
-        print(f"[cms_invite] Invite for {email}: {invite_url}")
-        return
-
-    import smtplib
-    from email.mime.text import MIMEText
-
-    msg = MIMEText(
+    queue_email(
+        db,
+        email,
+        "Haylingua CMS invitation",
         f"You were invited to Haylingua CMS.\n\nOpen this link to set your password and enable 2FA:\n{invite_url}\n\nThis link expires soon.",
-        "plain",
-        "utf-8",
     )
-    msg["Subject"] = "Haylingua CMS invitation"
-    msg["From"] = from_addr
-    msg["To"] = email
-
-    with smtplib.SMTP(host, port) as s:
-        s.starttls()
-        s.login(user, password)
-        s.sendmail(from_addr, [email], msg.as_string())
 
 def _bootstrap_invite_if_needed(db):
     """
@@ -3392,7 +3676,7 @@ def _bootstrap_invite_if_needed(db):
         {"email": CMS_BOOTSTRAP_EMAIL, "token_hash": token_hash, "expires_at": expires_at},
     )
     invite_url = f"{CMS_INVITE_BASE_URL}/cms/invite?token={raw}"
-    _send_invite_email(CMS_BOOTSTRAP_EMAIL, invite_url)
+    _send_invite_email(db, CMS_BOOTSTRAP_EMAIL, invite_url)
 
 # ---------- Public user pages ----------
 class PublicUserOut(BaseModel):
@@ -3874,7 +4158,7 @@ def cms_bootstrap_invite(request: Request, db=Depends(get_db)):
         {"email": email, "token_hash": token_hash, "expires_at": expires_at},
     )
     invite_url = f"{CMS_INVITE_BASE_URL}/cms/invite?token={raw}"
-    _send_invite_email(email, invite_url)
+    _send_invite_email(db, email, invite_url)
     return {"ok": True}
 
 @router.get("/cms/invites/verify")
@@ -4107,12 +4391,19 @@ def cms_team_invite(payload: Dict[str, Any] = Body(...), me: dict = Depends(requ
         {"email": email, "h": token_hash, "by": int(me["id"]), "exp": expires_at},
     )
     invite_url = f"{CMS_INVITE_BASE_URL}/cms/invite?token={raw}"
-    _send_invite_email(email, invite_url)
+    _send_invite_email(db, email, invite_url)
     return {"ok": True}
 
 # Backward-compatible legacy tokens (can be removed later)
 CMS_TOKENS = set()
 
+
+def _invalidate_lesson_payloads(db: Connection) -> None:
+    # Learner lesson JSON is cached precompressed (http_compression) under keys that include
+    # course_path.content_version; bumping it in the CMS transaction retires the cached copies
+    # in every worker once the edit commits.
+    bump_lesson_content_version(db)
+
 # -------------------- LESSONS --------------------
 
 @router.get("/cms/lessons")
@@ -4169,6 +4460,8 @@ async def cms_create_lesson(request: Request, db=Depends(get_db)):
         },
     ).scalar_one()
 
+    reindex_course_path(db)
+    _invalidate_lesson_payloads(db)
     return {"id": int(new_id)}
 
 @router.put("/cms/lessons/{lesson_id}")
@@ -4199,6 +4492,10 @@ async def cms_update_lesson(lesson_id: int, request: Request, db=Depends(get_db)
 
     q = text(f"UPDATE lessons SET {', '.join(set_parts)} WHERE id = :id")
     db.execute(q, params)
+    if "level" in updates or "is_published" in updates:
+        # Reordering the path or (un)publishing a lesson invalidates stored unlock frontiers.
+        reindex_course_path(db, force_bump="is_published" in updates)
+    _invalidate_lesson_payloads(db)
     return {"ok": True}
 
 @router.delete("/cms/lessons/{lesson_id}")
@@ -4208,6 +4505,8 @@ def cms_delete_lesson(lesson_id: int, request: Request, db=Depends(get_db)):
     db.execute(text("DELETE FROM exercise_options WHERE exercise_id IN (SELECT id FROM exercises WHERE lesson_id = :id)"), {"id": lesson_id})
     db.execute(text("DELETE FROM exercises WHERE lesson_id = :id"), {"id": lesson_id})
     db.execute(text("DELETE FROM lessons WHERE id = :id"), {"id": lesson_id})
+    reindex_course_path(db, force_bump=True)
+    _invalidate_lesson_payloads(db)
     return {"ok": True}
     
 @router.post("/cms/lessons/{lesson_id}/publish")
@@ -4217,7 +4516,53 @@ def cms_publish_lesson(lesson_id: int, request: Request, db=Depends(get_db)):
         text("UPDATE lessons SET is_published = true WHERE id = :id"),
         {"id": lesson_id},
     )
-    return {"ok": True, "is_published": True}
+    # only published lessons can hold the unlock frontier
+    bump_course_path_version(db)
+    _invalidate_lesson_payloads(db)
+    # synthesize missing audio in the background so learners never wait on TTS
+    job_id = enqueue_lesson_pregen(db, lesson_id)
+    return {"ok": True, "is_published": True, "tts_job_id": job_id}
+
+@router.get("/cms/jobs")
+def cms_list_jobs(
+    request: Request,
+    status: Optional[str] = None,
+    kind: Optional[str] = None,
+    limit: int = 50,
+    db=Depends(get_db),
+):
+    """Recent background jobs, newest first (status=dead lists the dead-letter queue)."""
+    require_cms(request, db)
+    return list_jobs(db, status=status, kind=kind, limit=max(1, min(limit, 500)))
+
+@router.post("/cms/jobs/{job_id}/retry")
+def cms_retry_job(job_id: int, request: Request, db=Depends(get_db)):
+    """Requeue a dead job (e.g. a Brevo event that failed while Brevo was down).
+
+    Emails can't be retried (their payload is cleared); the user requests a new code/invite.
+    """
+    require_cms(request, db)
+    if not retry_job(db, job_id):
+        raise HTTPException(status_code=409, detail="Only dead non-email jobs can be retried")
+    return {"ok": True, "job_id": job_id}
+
+@router.get("/cms/jobs/{job_id}")
+def cms_get_job(job_id: int, request: Request, db=Depends(get_db)):
+    """Status/progress of a background job (e.g. the tts_job_id returned by publish)."""
+    require_cms(request, db)
+    job = get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/cms/storage/gc")
+def cms_storage_gc(request: Request, dry_run: bool = True, batch: int = 500, db=Depends(get_db)):
+    """Queue orphaned-audio GC. Dry run (the default) only reports bytes per category.
+
+    Poll GET /cms/jobs/{job_id} for the report.
+    """
+    require_cms(request, db)
+    return {"job_id": enqueue_storage_gc(db, dry_run=dry_run, batch=max(1, min(batch, 5000)))}
 
 @router.post("/cms/lessons/{lesson_id}/unpublish")
 def cms_unpublish_lesson(lesson_id: int, request: Request, db=Depends(get_db)):
@@ -4226,7 +4571,16 @@ def cms_unpublish_lesson(lesson_id: int, request: Request, db=Depends(get_db)):
         text("UPDATE lessons SET is_published = false WHERE id = :id"),
         {"id": lesson_id},
     )
+    bump_course_path_version(db)
+    _invalidate_lesson_payloads(db)
     return {"ok": True, "is_published": False}
+@router.post("/cms/path/reindex")
+def cms_reindex_path(request: Request, db=Depends(get_db)):
+    """Renumber the learning path and force every user's unlock frontier to be recomputed."""
+    require_cms(request, db)
+    reindex_course_path(db, force_bump=True)
+    return {"ok": True}
+
 # -------------------- EXERCISES --------------------
 
 @router.get("/cms/lessons/{lesson_id}/exercises")
@@ -4311,6 +4665,10 @@ async def cms_create_exercise(request: Request, db=Depends(get_db)):
     }
 
     new_id = db.execute(q, params).scalar_one()
+    refresh_lesson_stats(db, lesson_id)
+    # More exercises can drop a lesson below 70% -> recompute unlock frontiers.
+    bump_course_path_version(db)
+    _invalidate_lesson_payloads(db)
     return {"id": new_id}
 
 @router.put("/cms/exercises/{exercise_id}")
@@ -4368,16 +4726,28 @@ async def cms_update_exercise(exercise_id: int, request: Request, db=Depends(get
             set_parts.append(f"{k} = :{k}")
             params[k] = v
 
-    q = text(f"UPDATE exercises SET {', '.join(set_parts)} WHERE id = :id")
-    db.execute(q, params)
+    q = text(f"UPDATE exercises SET {', '.join(set_parts)} WHERE id = :id RETURNING lesson_id")
+    lesson_id = db.execute(q, params).scalar_one_or_none()
+    if lesson_id is not None and "xp" in updates:
+        refresh_lesson_stats(db, int(lesson_id))
 
+    _invalidate_lesson_payloads(db)
     return {"ok": True}
 
 @router.delete("/cms/exercises/{exercise_id}")
 def cms_delete_exercise(exercise_id: int, request: Request, db=Depends(get_db)):
     require_cms(request, db)
     db.execute(text("DELETE FROM exercise_options WHERE exercise_id = :id"), {"id": exercise_id})
-    db.execute(text("DELETE FROM exercises WHERE id = :id"), {"id": exercise_id})
+    lesson_id = db.execute(
+        text("DELETE FROM exercises WHERE id = :id RETURNING lesson_id"),
+        {"id": exercise_id},
+    ).scalar_one_or_none()
+    if lesson_id is not None:
+        refresh_lesson_stats(db, int(lesson_id))
+        rebuild_lesson_audio_manifest(db, int(lesson_id))
+        # Fewer exercises can push a lesson over 70% -> recompute unlock frontiers.
+        bump_course_path_version(db)
+    _invalidate_lesson_payloads(db)
     return {"ok": True}
 
 
@@ -4462,6 +4832,9 @@ def recompute_lesson_progress(db, user_id: int, lesson_id: int):
         },
     )
 
+    # 6) keep the stored path frontier (unlock state) in sync
+    _update_path_frontier(db, user_id, lesson_id, is_completed)
+
     return {
         "total_exercises": total_ex,
         "correct_exercises": correct_ex,
@@ -4504,6 +4877,7 @@ async def cms_create_option(request: Request, db=Depends(get_db)):
         "exercise_id": exercise_id, "text": text_val,
         "is_correct": is_correct, "side": side, "match_key": match_key
     }).scalar_one()
+    _invalidate_lesson_payloads(db)
     return {"id": new_id}
 
 @router.put("/cms/options/{option_id}")
@@ -4527,12 +4901,14 @@ async def cms_update_option(option_id: int, request: Request, db=Depends(get_db)
         params[k] = v
 
     db.execute(text(f"UPDATE exercise_options SET {', '.join(set_parts)} WHERE id = :id"), params)
+    _invalidate_lesson_payloads(db)
     return {"ok": True}
 
 @router.delete("/cms/options/{option_id}")
 def cms_delete_option(option_id: int, request: Request, db=Depends(get_db)):
     require_cms(request, db)
     db.execute(text("DELETE FROM exercise_options WHERE id = :id"), {"id": option_id})
+    _invalidate_lesson_payloads(db)
     return {"ok": True}
     
 # --------- ElevenLabs TTS ----------
@@ -4544,35 +4920,17 @@ def cms_delete_option(option_id: int, request: Request, db=Depends(get_db)):
 Reading mode and some older exercise kinds still call /tts directly.
 We keep it, but:
   - default to Eleven v3 model (configurable via ELEVEN_MODEL_ID)
-  - cache generated MP3 on disk so repeated requests are instant
+  - cache generated MP3 on disk so repeated requests are instant (tts_cache.py)
 
 ElevenLabs "Create speech" API: POST /v1/text-to-speech/{voice_id}
 """
 
 import hashlib
-from pathlib import Path
 
 
 ELEVEN_MODEL_ID = os.getenv("ELEVEN_MODEL_ID", "eleven_v3")
 
 
-def _tts_cache_dir() -> Path:
-    base = os.getenv("AUDIO_DIR", "")
-    if base:
-        return Path(base) / "tts_cache"
-    return Path(__file__).resolve().parent / "uploads" / "tts_cache"
-
-
-def _tts_cache_key(text_value: str, voice_id: str, model_id: str) -> str:
-    h = hashlib.sha256()
-    h.update(model_id.encode("utf-8"))
-    h.update(b"\n")
-    h.update(voice_id.encode("utf-8"))
-    h.update(b"\n")
-    h.update(text_value.encode("utf-8"))
-    return h.hexdigest()
-
-
 @router.post("/tts", response_class=Response)
 async def tts_speak(payload: TTSPayload):
     if not ELEVEN_API_KEY:
@@ -4585,35 +4943,65 @@ async def tts_speak(payload: TTSPayload):
     voice_id = payload.voice_id or DEFAULT_VOICE_ID
     model_id = getattr(payload, "model_id", None) or ELEVEN_MODEL_ID
 
-    cache_dir = _tts_cache_dir()
-    cache_dir.mkdir(parents=True, exist_ok=True)
-    key = _tts_cache_key(text_value, voice_id, model_id)
-    mp3_path = cache_dir / f"{key}.mp3"
+    key = tts_cache_key(text_value, voice_id, model_id)
 
-    if mp3_path.exists() and mp3_path.stat().st_size > 0:
-        return Response(content=mp3_path.read_bytes(), media_type="audio/mpeg")
+    cached = await tts_disk_cache.get(key)
+    if cached is not None:
+        return Response(content=cached, media_type="audio/mpeg")
 
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
-    params = {"output_format": "mp3_44100_128"}
-    headers = {"xi-api-key": ELEVEN_API_KEY, "Content-Type": "application/json"}
-    body = {"text": text_value, "model_id": model_id}
+    async def _synthesize() -> bytes:
+        # A previous flight for this key may have finished between our check and now.
+        cached = await tts_disk_cache.get(key)
+        if cached is not None:
+            return cached
 
-    try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            r = await client.post(url, params=params, headers=headers, json=body)
-        if r.status_code != 200:
-            err = (r.text or "").strip()
-            if len(err) > 600:
-                err = err[:600] + "…"
-            print("ElevenLabs error:", r.status_code, err)
-            raise HTTPException(status_code=502, detail=f"ElevenLabs error ({r.status_code})")
-        audio_bytes = r.content
-    except httpx.RequestError as e:
-        raise HTTPException(status_code=502, detail=f"TTS request failed: {e}") from e
+        url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
+        params = {"output_format": "mp3_44100_128"}
+        headers = {"xi-api-key": ELEVEN_API_KEY, "Content-Type": "application/json"}
+        body = {"text": text_value, "model_id": model_id}
 
-    try:
-        mp3_path.write_bytes(audio_bytes)
-    except Exception:
-        pass
+        try:
+            r = await eleven_breaker.call(
+                lambda: get_tts_client().post(url, params=params, headers=headers, json=body, timeout=30.0),
+                eleven_failed,
+            )
+            if r.status_code != 200:
+                err = (r.text or "").strip()
+                if len(err) > 600:
+                    err = err[:600] + "…"
+                print("ElevenLabs error:", r.status_code, err)
+                raise HTTPException(status_code=502, detail=f"ElevenLabs error ({r.status_code})")
+            audio_bytes = r.content
+        except CircuitOpen as e:
+            # fail fast while ElevenLabs is down or slow
+            raise HTTPException(
+                status_code=503,
+                detail="TTS temporarily unavailable",
+                headers={"Retry-After": str(int(e.retry_after) + 1)},
+            ) from e
+        except (httpx.RequestError, TimeoutError) as e:
+            raise HTTPException(status_code=502, detail=f"TTS request failed: {e or 'timeout'}") from e
+
+        try:
+            await tts_disk_cache.put(key, audio_bytes)
+        except Exception:
+            pass
+        return audio_bytes
 
+    # Concurrent misses for the same text/voice/model share one ElevenLabs call.
+    audio_bytes = await tts_flight.do(key, _synthesize)
     return Response(content=audio_bytes, media_type="audio/mpeg")
+
+
+@router.get("/cms/circuits")
+def cms_circuits(request: Request, db=Depends(get_db)):
+    """State and latency/error metrics of the upstream circuit breakers (this worker)."""
+    require_cms(request, db)
+    return breaker_metrics()
+
+
+@router.get("/cms/tts/cache/stats")
+def tts_cache_stats(request: Request, db=Depends(get_db)):
+    """Hits/misses/bytes/evictions of this worker's /tts disk cache."""
+    require_cms(request, db)
+    return tts_disk_cache.stats()
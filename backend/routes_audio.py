@@ -2,17 +2,33 @@
 backend/routes_audio.py
 Audio management for exercises - supports TTS generation, custom uploads, and browser recordings
 """
+import asyncio
+import hashlib
+import json
 import os
+import random
+import time
 from typing import Optional, Literal
 
 import httpx
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from fastapi.responses import Response
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File, Form
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
+from starlette.datastructures import Headers
 from sqlalchemy import text
 from sqlalchemy.engine import Connection
 
-from database import get_db
+from database import engine, get_db
+from audio_cache import AudioKey, CachedAudio, audio_bytes_cache
+from tts_client import ELEVEN_API_URL, eleven_breaker, eleven_failed, get_tts_client, get_voices
+from circuit_breaker import OPEN, CircuitOpen
+from audio_jobs import VARIANTS, enqueue_audio_processing, get_variant, schedule_audio_processing
+from tts_cache import SingleFlight
+from audio_manifest import audio_url, rebuild_manifest_for_exercise
+from audio_pack import open_pack
+from audio_store import (
+    AudioTooLarge, StoredAudio, content_hash, put_bytes, put_stream, resolve as resolve_stored, url_version,
+)
 
 router = APIRouter()
 
@@ -37,7 +53,6 @@ ELEVEN_API_KEY = (
     or os.getenv("eleven_labs.io")
     or ""
 )
-ELEVEN_API_URL = "https://api.elevenlabs.io/v1"
 
 # ElevenLabs TTS defaults (override via Render env vars)
 # Model IDs are defined by ElevenLabs; as of Feb 2026, Eleven v3 uses `eleven_v3`.
@@ -83,55 +98,121 @@ class GenerateTargetTTSRequest(BaseModel):
     voice_type: Literal["male", "female"]
 
 
-async def generate_elevenlabs_tts(text: str, voice_id: str) -> bytes:
+# Retry policy for ElevenLabs calls (rate limits and transient upstream errors).
+# TTS runs on synchronous CMS requests, so attempts and backoff together share one
+# deadline (by default a single call's latency budget).
+TTS_MAX_RETRIES = int(_env_float("TTS_MAX_RETRIES", 4))
+TTS_RETRY_BASE_SECONDS = _env_float("TTS_RETRY_BASE_SECONDS", 1.0)
+TTS_RETRY_DEADLINE_SECONDS = _env_float("TTS_RETRY_DEADLINE_SECONDS", eleven_breaker.latency_budget)
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def _retry_delay(attempt: int, response: Optional[httpx.Response] = None) -> float:
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), 30.0)
+            except ValueError:
+                pass
+    # exponential backoff with jitter so parallel workers don't retry in lockstep
+    return TTS_RETRY_BASE_SECONDS * (2 ** attempt) * (0.5 + random.random())
+
+
+def _can_retry(attempt: int, delay: float, deadline: float) -> bool:
+    """Another attempt needs retries left, a closed breaker and time left after the backoff."""
+    if attempt >= TTS_MAX_RETRIES or eleven_breaker.state == OPEN:
+        return False
+    return time.monotonic() + delay < deadline
+
+
+async def _post_with_retry(client: httpx.AsyncClient, url: str, headers: dict, payload: dict) -> httpx.Response:
+    """POST with backoff under one deadline; every attempt goes through the breaker and
+    retrying stops as soon as it opens."""
+    deadline = time.monotonic() + TTS_RETRY_DEADLINE_SECONDS
+    attempt = 0
+    while True:
+        try:
+            response = await eleven_breaker.call(
+                lambda: client.post(url, headers=headers, json=payload),
+                eleven_failed,
+                timeout=deadline - time.monotonic(),
+            )
+        except (httpx.TransportError, TimeoutError):
+            delay = _retry_delay(attempt)
+            if not _can_retry(attempt, delay, deadline):
+                raise
+        else:
+            if response.status_code not in RETRYABLE_STATUS:
+                return response
+            delay = _retry_delay(attempt, response)
+            if not _can_retry(attempt, delay, deadline):
+                return response
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+def _voice_settings() -> dict:
+    return {
+        "stability": ELEVEN_STABILITY,
+        "similarity_boost": ELEVEN_SIMILARITY_BOOST,
+        "style": ELEVEN_STYLE,
+        "use_speaker_boost": ELEVEN_USE_SPEAKER_BOOST,
+    }
+
+
+async def generate_elevenlabs_tts(text: str, voice_id: str, client: Optional[httpx.AsyncClient] = None) -> bytes:
+    """Synthesize `text` on the shared pooled client (or an explicit `client`)."""
     if not ELEVEN_API_KEY:
         raise HTTPException(status_code=400, detail="ElevenLabs API key not configured")
-    
+
+    try:
+        return await _elevenlabs_tts(client or get_tts_client(), text, voice_id)
+    except CircuitOpen as e:
+        raise HTTPException(
+            503, "TTS temporarily unavailable", headers={"Retry-After": str(int(e.retry_after) + 1)}
+        ) from e
+    except (httpx.TransportError, TimeoutError) as e:
+        raise HTTPException(502, f"TTS request failed: {e or 'timeout'}") from e
+
+
+async def _elevenlabs_tts(client: httpx.AsyncClient, text: str, voice_id: str) -> bytes:
     url = f"{ELEVEN_API_URL}/text-to-speech/{voice_id}"
     headers = {"xi-api-key": ELEVEN_API_KEY, "Content-Type": "application/json"}
     payload = {
         "text": text,
         "model_id": ELEVEN_MODEL_ID,
-        "voice_settings": {
-            "stability": ELEVEN_STABILITY,
-            "similarity_boost": ELEVEN_SIMILARITY_BOOST,
-            "style": ELEVEN_STYLE,
-            "use_speaker_boost": ELEVEN_USE_SPEAKER_BOOST,
-        },
+        "voice_settings": _voice_settings(),
     }
-    
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        response = await client.post(url, headers=headers, json=payload)
 
-        # If the API key belongs to a different workspace/account, a hard-coded voice_id
-        # can become invalid -> ElevenLabs responds 404 (voice not found).
-        # We try to recover by selecting the first available voice for that API key.
-        if response.status_code == 404:
-            try:
-                voices_resp = await client.get(f"{ELEVEN_API_URL}/voices", headers=headers)
-                if voices_resp.status_code == 200:
-                    voices_data = voices_resp.json() or {}
-                    voices = voices_data.get("voices") or []
-                    if voices:
-                        fallback_voice_id = voices[0].get("voice_id") or voices[0].get("id")
-                        if fallback_voice_id and fallback_voice_id != voice_id:
-                            url2 = f"{ELEVEN_API_URL}/text-to-speech/{fallback_voice_id}"
-                            response = await client.post(url2, headers=headers, json=payload)
-            except Exception:
-                # If recovery fails, we'll return the original error below.
-                pass
-
-        if response.status_code != 200:
-            # keep it short, but useful (Eleven can return HTML on errors sometimes)
-            body = (response.text or "").strip()
-            if len(body) > 600:
-                body = body[:600] + "…"
-            raise HTTPException(
-                response.status_code,
-                f"ElevenLabs error ({response.status_code}). voice_id={voice_id}. body={body}",
-            )
-
-        return response.content
+    response = await _post_with_retry(client, url, headers, payload)
+
+    # If the API key belongs to a different workspace/account, a hard-coded voice_id
+    # can become invalid -> ElevenLabs responds 404 (voice not found).
+    # We try to recover by selecting the first available voice for that API key.
+    if response.status_code == 404:
+        try:
+            voices = await get_voices(headers)
+            if voices:
+                fallback_voice_id = voices[0].get("voice_id") or voices[0].get("id")
+                if fallback_voice_id and fallback_voice_id != voice_id:
+                    url2 = f"{ELEVEN_API_URL}/text-to-speech/{fallback_voice_id}"
+                    response = await _post_with_retry(client, url2, headers, payload)
+        except Exception:
+            # If recovery fails, we'll return the original error below.
+            pass
+
+    if response.status_code != 200:
+        # keep it short, but useful (Eleven can return HTML on errors sometimes)
+        body = (response.text or "").strip()
+        if len(body) > 600:
+            body = body[:600] + "…"
+        raise HTTPException(
+            response.status_code,
+            f"ElevenLabs error ({response.status_code}). voice_id={voice_id}. body={body}",
+        )
+
+    return response.content
 
 
 @router.get("/cms/exercises/{exercise_id}/audio")
@@ -139,14 +220,19 @@ def get_exercise_audio_list(exercise_id: int, db: Connection = Depends(get_db)):
     rows = db.execute(
         text("""
             SELECT id, voice_type, source_type, audio_format, audio_size,
-                   duration_seconds, tts_text IS NOT NULL as has_tts_text, created_at
+                   duration_seconds, tts_text IS NOT NULL as has_tts_text, content_hash, created_at
             FROM exercise_audio WHERE exercise_id = :exercise_id
             ORDER BY voice_type, source_type
         """),
         {"exercise_id": exercise_id}
     ).mappings().all()
     
-    return {"audio_recordings": [dict(r) for r in rows]}
+    return {
+        "audio_recordings": [
+            {**r, "url": audio_url({"exercise_id": exercise_id, "voice": r["voice_type"], "hash": r["content_hash"]})}
+            for r in rows
+        ]
+    }
 
 
 # ------------------------------
@@ -165,7 +251,7 @@ def cms_list_audio_targets(
         text(
             """
             SELECT id, exercise_id, target_key, voice_type, source_type,
-                   audio_format, audio_size, file_path,
+                   audio_format, audio_size, file_path, content_hash,
                    created_at, updated_at
             FROM exercise_audio_targets
             WHERE exercise_id = :exercise_id
@@ -175,46 +261,217 @@ def cms_list_audio_targets(
         ),
         {"exercise_id": exercise_id, "target_key": target_key},
     ).mappings().all()
-    return {"targets": [dict(r) for r in rows]}
+    return {
+        "targets": [
+            {
+                **r,
+                "url": audio_url(
+                    {"exercise_id": exercise_id, "target_key": r["target_key"], "voice": r["voice_type"], "hash": r["content_hash"]}
+                ),
+            }
+            for r in rows
+        ]
+    }
 
 
-@router.post("/cms/audio/targets/generate-tts")
-async def cms_generate_target_tts(payload: GenerateTargetTTSRequest, db: Connection = Depends(get_db)):
-    exercise_id = int(payload.exercise_id or 0)
-    target_key = (payload.target_key or "").strip()
-    text_value = (payload.text or "").strip()
-    voice_type = (payload.voice_type or "").strip().lower()
+# ------------------------------
+# Storage helpers
+# ------------------------------
+# Bytes go to the content-addressed store (audio_store); rows keep metadata only.
 
-    if not exercise_id or not target_key or not text_value:
-        raise HTTPException(status_code=400, detail="exercise_id, target_key and text are required")
-    if voice_type not in ("male", "female"):
-        raise HTTPException(status_code=400, detail="voice_type must be male or female")
+CONTENT_TYPES = {'mp3': 'audio/mpeg', 'wav': 'audio/wav', 'ogg': 'audio/ogg', 'webm': 'audio/webm'}
 
-    voice_id = MALE_VOICE_ID if voice_type == "male" else FEMALE_VOICE_ID
-    audio_data = await generate_elevenlabs_tts(text_value, voice_id)
 
+# ------------------------------
+# Shared TTS assets
+# ------------------------------
+# The same sentence/letter spoken with the same voice + model + settings is
+# synthesized once and referenced by every exercise / target that needs it.
+
+tts_asset_flight = SingleFlight()
+
+
+def tts_asset_key(text_value: str, voice_id: str) -> str:
+    raw = json.dumps(
+        {"text": text_value, "voice_id": voice_id, "model_id": ELEVEN_MODEL_ID, "settings": _voice_settings()},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _find_tts_asset(db: Optional[Connection], key: str) -> Optional[dict]:
+    query = text("SELECT id, content_hash, file_path, audio_size FROM audio_assets WHERE asset_key = :k")
+    if db is not None:
+        row = db.execute(query, {"k": key}).mappings().first()
+    else:
+        with engine.connect() as conn:
+            row = conn.execute(query, {"k": key}).mappings().first()
+    if row and resolve_stored(row["file_path"]) is not None:
+        return dict(row)
+    return None
+
+
+async def _tts_asset_audio(
+    text_value: str, voice_id: str, db: Optional[Connection] = None
+) -> tuple[Optional[int], StoredAudio]:
+    """(asset_id, stored audio) for an existing asset, or (None, fresh synthesis).
+
+    Concurrent requests for the same key share one upstream call. The caller
+    persists new audio with _save_tts_asset() in its own transaction. The
+    lookup uses the request's connection when given (batch items run
+    concurrently and pass none, so each takes a short one); DB and file work
+    run in threads, off the event loop.
+    """
+    key = tts_asset_key(text_value, voice_id)
+    asset = await asyncio.to_thread(_find_tts_asset, db, key)
+    if asset is not None:
+        return asset["id"], StoredAudio(
+            content_hash=asset["content_hash"], file_path=asset["file_path"], size=asset["audio_size"]
+        )
+
+    async def synth() -> StoredAudio:
+        audio = await generate_elevenlabs_tts(text_value, voice_id)
+        return await asyncio.to_thread(put_bytes, audio, "mp3")
+
+    return None, await tts_asset_flight.do(key, synth)
+
+
+def _save_tts_asset(db: Connection, text_value: str, voice_id: str, stored: StoredAudio) -> int:
+    return db.execute(
+        text(
+            """
+            INSERT INTO audio_assets (
+                asset_key, tts_text, tts_voice_id, model_id, settings,
+                audio_format, audio_size, file_path, content_hash, created_at
+            ) VALUES (
+                :k, :tts_text, :voice_id, :model_id, CAST(:settings AS jsonb),
+                'mp3', :audio_size, :file_path, :content_hash, NOW()
+            )
+            ON CONFLICT (asset_key) DO UPDATE SET
+                audio_size = EXCLUDED.audio_size,
+                file_path = EXCLUDED.file_path,
+                content_hash = EXCLUDED.content_hash
+            RETURNING id
+            """
+        ),
+        {
+            "k": tts_asset_key(text_value, voice_id),
+            "tts_text": text_value,
+            "voice_id": voice_id,
+            "model_id": ELEVEN_MODEL_ID,
+            "settings": json.dumps(_voice_settings()),
+            "audio_size": stored.size,
+            "file_path": stored.file_path,
+            "content_hash": stored.content_hash,
+        },
+    ).scalar_one()
+
+
+async def _tts_for(db: Connection, text_value: str, voice_id: str) -> tuple[int, StoredAudio, bool]:
+    """Resolve (asset_id, stored, reused) for one endpoint call."""
+    asset_id, stored = await _tts_asset_audio(text_value, voice_id, db)
+    reused = asset_id is not None
+    if asset_id is None:
+        asset_id = _save_tts_asset(db, text_value, voice_id, stored)
+    return asset_id, stored, reused
+
+
+def _audio_changed(db: Connection, exercise_id: int) -> None:
+    """Keep derived state in sync after any audio write/delete for an exercise."""
+    rebuild_manifest_for_exercise(db, exercise_id)
+    audio_bytes_cache.invalidate_exercise(exercise_id)
+
+
+def _upsert_exercise_audio(
+    db: Connection,
+    *,
+    exercise_id: int,
+    voice_type: str,
+    source_type: str,
+    audio_format: str,
+    audio_data: Optional[bytes] = None,
+    stored: Optional[StoredAudio] = None,
+    asset_id: Optional[int] = None,
+    tts_text: Optional[str] = None,
+    tts_voice_id: Optional[str] = None,
+):
+    # Either raw bytes (uploads) or audio already in the store (shared TTS assets)
+    if stored is None:
+        stored = put_bytes(audio_data, audio_format)
+    result = db.execute(
+        text("""
+            INSERT INTO exercise_audio (
+                exercise_id, voice_type, source_type, tts_text, tts_voice_id,
+                audio_data, audio_format, audio_size, file_path, content_hash, asset_id,
+                created_at, updated_at
+            ) VALUES (
+                :exercise_id, :voice_type, :source_type, :tts_text, :voice_id,
+                NULL, :audio_format, :audio_size, :file_path, :content_hash, :asset_id,
+                NOW(), NOW()
+            )
+            ON CONFLICT (exercise_id, voice_type) DO UPDATE SET
+                source_type=EXCLUDED.source_type, tts_text=EXCLUDED.tts_text, tts_voice_id=EXCLUDED.tts_voice_id,
+                audio_data=NULL, audio_format=EXCLUDED.audio_format, audio_size=EXCLUDED.audio_size,
+                file_path=EXCLUDED.file_path, content_hash=EXCLUDED.content_hash,
+                asset_id=EXCLUDED.asset_id, updated_at=NOW()
+            RETURNING id, audio_size
+        """),
+        {
+            "exercise_id": exercise_id, "voice_type": voice_type, "source_type": source_type,
+            "tts_text": tts_text, "voice_id": tts_voice_id,
+            "audio_format": audio_format, "audio_size": stored.size,
+            "file_path": stored.file_path, "content_hash": stored.content_hash,
+            "asset_id": asset_id,
+        }
+    ).mappings().first()
+    _audio_changed(db, exercise_id)
+    # runs after this transaction commits, so the job sees the row
+    enqueue_audio_processing(db, stored.content_hash, stored.file_path)
+    return result
+
+
+def _upsert_target_audio(
+    db: Connection,
+    *,
+    exercise_id: int,
+    target_key: str,
+    voice_type: str,
+    source_type: str,
+    audio_format: str,
+    audio_data: Optional[bytes] = None,
+    stored: Optional[StoredAudio] = None,
+    asset_id: Optional[int] = None,
+    tts_text: Optional[str] = None,
+    tts_voice_id: Optional[str] = None,
+):
+    # Either raw bytes (uploads) or audio already in the store (shared TTS assets)
+    if stored is None:
+        stored = put_bytes(audio_data, audio_format)
     result = db.execute(
         text(
             """
             INSERT INTO exercise_audio_targets (
                 exercise_id, target_key, voice_type, source_type,
                 tts_text, tts_voice_id,
-                audio_data, audio_format, audio_size,
+                audio_data, audio_format, audio_size, file_path, content_hash, asset_id,
                 created_at, updated_at
             ) VALUES (
-                :exercise_id, :target_key, :voice_type, 'tts',
+                :exercise_id, :target_key, :voice_type, :source_type,
                 :tts_text, :voice_id,
-                :audio_data, 'mp3', :audio_size,
+                NULL, :audio_format, :audio_size, :file_path, :content_hash, :asset_id,
                 NOW(), NOW()
             )
             ON CONFLICT (exercise_id, target_key, voice_type) DO UPDATE SET
-                source_type='tts',
+                source_type=EXCLUDED.source_type,
                 tts_text=EXCLUDED.tts_text,
                 tts_voice_id=EXCLUDED.tts_voice_id,
-                audio_data=EXCLUDED.audio_data,
+                audio_data=NULL,
                 audio_format=EXCLUDED.audio_format,
                 audio_size=EXCLUDED.audio_size,
-                file_path=NULL,
+                file_path=EXCLUDED.file_path,
+                content_hash=EXCLUDED.content_hash,
+                asset_id=EXCLUDED.asset_id,
                 updated_at=NOW()
             RETURNING id, audio_size;
             """
@@ -223,53 +480,242 @@ async def cms_generate_target_tts(payload: GenerateTargetTTSRequest, db: Connect
             "exercise_id": exercise_id,
             "target_key": target_key,
             "voice_type": voice_type,
-            "tts_text": text_value,
-            "voice_id": voice_id,
-            "audio_data": audio_data,
-            "audio_size": len(audio_data),
+            "source_type": source_type,
+            "tts_text": tts_text,
+            "voice_id": tts_voice_id,
+            "audio_format": audio_format,
+            "audio_size": stored.size,
+            "file_path": stored.file_path,
+            "content_hash": stored.content_hash,
+            "asset_id": asset_id,
         },
     ).mappings().first()
+    _audio_changed(db, exercise_id)
+    # runs after this transaction commits, so the job sees the row
+    enqueue_audio_processing(db, stored.content_hash, stored.file_path)
+    return result
+
+
+# Versioned URLs (?v=<hash prefix>) never change content; unversioned ones can
+# when an editor replaces a clip, so they are revalidated with the ETag.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, max-age=300, must-revalidate"
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return any(t == etag or t == f"W/{etag}" for t in tags)
+
+
+def _parse_range(range_header: str, size: int) -> Optional[tuple[int, int]]:
+    """Parse a single `bytes=` range into inclusive (start, end).
+
+    Returns None for headers we don't handle (multi-range, other units) so the
+    caller falls back to a full 200, which RFC 9110 allows.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start_s, _, end_s = spec.strip().partition("-")
+    try:
+        if start_s == "":
+            # suffix range: last N bytes
+            length = int(end_s)
+            if length <= 0:
+                raise ValueError
+            start, end = max(0, size - length), size - 1
+        else:
+            start = int(start_s)
+            end = int(end_s) if end_s else size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise HTTPException(416, "Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, min(end, size - 1)
+
+
+def _bytes_response(request: Request, data: bytes, media_type: str, headers: dict) -> Response:
+    """In-memory equivalent of FileResponse's Range handling (legacy bytea rows)."""
+    headers = {**headers, "Accept-Ranges": "bytes"}
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == headers.get("ETag")):
+        span = _parse_range(range_header, len(data))
+        if span is not None:
+            start, end = span
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+            return Response(content=data[start:end + 1], status_code=206, media_type=media_type, headers=headers)
+    return Response(content=data, media_type=media_type, headers=headers)
+
+
+def _audio_response(request: Request, row, version: Optional[str] = None, cache: bool = True) -> Response:
+    """Serve a stored clip with a strong ETag, 304s and byte ranges.
+
+    Files in the store go out via FileResponse (sendfile, Range handled by Starlette);
+    unmigrated rows fall back to the bytea column.
+    """
+    media_type = CONTENT_TYPES.get(row["audio_format"], 'audio/mpeg')
+    digest = row.get("content_hash")
+    if not digest and row.get("audio_data") is not None:
+        digest = content_hash(bytes(row["audio_data"]))
+
+    headers = {}
+    if digest:
+        headers["ETag"] = f'"{digest}"'
+    if cache:
+        # `v` identifies the original upload; transcoded variants share its version.
+        # An original standing in for a missing variant must not be pinned under that URL.
+        source = row.get("source_hash") or digest
+        immutable = bool(version and source and version == url_version(source)) and not row.get("fallback")
+        headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+        # the variant can depend on Accept
+        headers["Vary"] = "Accept"
+
+    if digest and _etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    path = resolve_stored(row.get("file_path"))
+    if path is not None:
+        return FileResponse(path, media_type=media_type, headers=headers)
+    if row.get("audio_data") is not None:
+        return _bytes_response(request, bytes(row["audio_data"]), media_type, headers)
+    raise HTTPException(404, "Audio file missing")
+
+
+@router.post("/cms/audio/targets/generate-tts")
+async def cms_generate_target_tts(payload: GenerateTargetTTSRequest, db: Connection = Depends(get_db)):
+    exercise_id = int(payload.exercise_id or 0)
+    target_key = (payload.target_key or "").strip()
+    text_value = (payload.text or "").strip()
+    voice_type = (payload.voice_type or "").strip().lower()
+
+    if not exercise_id or not target_key or not text_value:
+        raise HTTPException(status_code=400, detail="exercise_id, target_key and text are required")
+    if voice_type not in ("male", "female"):
+        raise HTTPException(status_code=400, detail="voice_type must be male or female")
+
+    voice_id = MALE_VOICE_ID if voice_type == "male" else FEMALE_VOICE_ID
+    asset_id, stored, reused = await _tts_for(db, text_value, voice_id)
+
+    result = _upsert_target_audio(
+        db,
+        exercise_id=exercise_id,
+        target_key=target_key,
+        voice_type=voice_type,
+        source_type="tts",
+        stored=stored,
+        asset_id=asset_id,
+        audio_format="mp3",
+        tts_text=text_value,
+        tts_voice_id=voice_id,
+    )
     return {
         "success": True,
         "audio_id": result["id"],
         "voice_type": voice_type,
         "audio_size": result["audio_size"],
         "target_key": target_key,
+        "reused_asset": reused,
     }
 
 
 @router.post("/cms/audio/generate-tts")
 async def generate_tts_audio(payload: GenerateTTSRequest, db: Connection = Depends(get_db)):
     voice_id = MALE_VOICE_ID if payload.voice_type == "male" else FEMALE_VOICE_ID
-    audio_data = await generate_elevenlabs_tts(payload.text, voice_id)
+    asset_id, stored, reused = await _tts_for(db, payload.text, voice_id)
     
-    result = db.execute(
-        text("""
-            INSERT INTO exercise_audio (
-                exercise_id, voice_type, source_type, tts_text, tts_voice_id,
-                audio_data, audio_format, audio_size, created_at, updated_at
-            ) VALUES (
-                :exercise_id, :voice_type, 'tts', :tts_text, :voice_id,
-                :audio_data, 'mp3', :audio_size, NOW(), NOW()
-            )
-            ON CONFLICT (exercise_id, voice_type) DO UPDATE SET
-                source_type='tts', tts_text=EXCLUDED.tts_text, tts_voice_id=EXCLUDED.tts_voice_id,
-                audio_data=EXCLUDED.audio_data, audio_size=EXCLUDED.audio_size, updated_at=NOW()
-            RETURNING id, audio_size
-        """),
-        {
-            "exercise_id": payload.exercise_id, "voice_type": payload.voice_type,
-            "tts_text": payload.text, "voice_id": voice_id,
-            "audio_data": audio_data, "audio_size": len(audio_data)
-        }
-    ).mappings().first()
+    result = _upsert_exercise_audio(
+        db,
+        exercise_id=payload.exercise_id,
+        voice_type=payload.voice_type,
+        source_type="tts",
+        stored=stored,
+        asset_id=asset_id,
+        audio_format="mp3",
+        tts_text=payload.text,
+        tts_voice_id=voice_id,
+    )
     
     return {
         "success": True, "audio_id": result["id"],
-        "voice_type": payload.voice_type, "audio_size": result["audio_size"]
+        "voice_type": payload.voice_type, "audio_size": result["audio_size"],
+        "reused_asset": reused,
     }
 
 
+# ------------------------------
+# Uploads
+# ------------------------------
+# Starlette has already spooled the multipart body (in memory up to 1 MB, then a
+# temp file) by the time the endpoint runs; AudioUploadLimitMiddleware caps that
+# read, and _store_upload copies the spooled file into the store in 64 KB chunks
+# instead of materializing it with audio_file.read().
+
+UPLOAD_PATHS = (
+    "/cms/audio/upload",
+    "/cms/audio/save-recording",
+    "/cms/audio/targets/upload",
+    "/cms/audio/targets/save-recording",
+)
+# multipart framing + the small form fields on top of the file itself
+UPLOAD_OVERHEAD = 64 * 1024
+
+
+class UploadTooLarge(HTTPException):
+    def __init__(self):
+        super().__init__(413, f"File too large. Max: {MAX_AUDIO_SIZE/1024/1024}MB")
+
+
+class AudioUploadLimitMiddleware:
+    """Reject oversized audio uploads from Content-Length, or mid-stream for chunked bodies."""
+
+    def __init__(self, app, max_body: int = MAX_AUDIO_SIZE + UPLOAD_OVERHEAD):
+        self.app = app
+        self.max_body = max_body
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].endswith(UPLOAD_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_body:
+            error = UploadTooLarge()
+            await JSONResponse({"detail": error.detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    # HTTPException subclass: FastAPI re-raises it from body parsing as-is
+                    raise UploadTooLarge()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def _store_upload(audio_file: UploadFile, audio_format: str, empty_detail: str) -> StoredAudio:
+    if audio_file.size is not None and audio_file.size > MAX_AUDIO_SIZE:
+        raise UploadTooLarge()
+    await audio_file.seek(0)
+    try:
+        stored = await asyncio.to_thread(put_stream, audio_file.file, audio_format, MAX_AUDIO_SIZE)
+    except AudioTooLarge:
+        raise UploadTooLarge()
+    if stored is None:
+        raise HTTPException(400, empty_detail)
+    return stored
+
+
 @router.post("/cms/audio/upload")
 async def upload_custom_audio(
     exercise_id: int = Form(...),
@@ -277,34 +723,19 @@ async def upload_custom_audio(
     audio_file: UploadFile = File(...),
     db: Connection = Depends(get_db)
 ):
-    audio_data = await audio_file.read()
-    
-    if len(audio_data) > MAX_AUDIO_SIZE:
-        raise HTTPException(400, f"File too large. Max: {MAX_AUDIO_SIZE/1024/1024}MB")
-    
     format_map = {'audio/mpeg': 'mp3', 'audio/mp3': 'mp3', 'audio/wav': 'wav', 
                   'audio/ogg': 'ogg', 'audio/webm': 'webm'}
     audio_format = format_map.get(audio_file.content_type, 'mp3')
+    stored = await _store_upload(audio_file, audio_format, "Empty file")
     
-    result = db.execute(
-        text("""
-            INSERT INTO exercise_audio (
-                exercise_id, voice_type, source_type, audio_data, audio_format, audio_size,
-                created_at, updated_at
-            ) VALUES (
-                :exercise_id, :voice_type, 'custom', :audio_data, :audio_format, :audio_size,
-                NOW(), NOW()
-            )
-            ON CONFLICT (exercise_id, voice_type) DO UPDATE SET
-                source_type='custom', audio_data=EXCLUDED.audio_data,
-                audio_format=EXCLUDED.audio_format, audio_size=EXCLUDED.audio_size, updated_at=NOW()
-            RETURNING id
-        """),
-        {
-            "exercise_id": exercise_id, "voice_type": voice_type,
-            "audio_data": audio_data, "audio_format": audio_format, "audio_size": len(audio_data)
-        }
-    ).mappings().first()
+    result = _upsert_exercise_audio(
+        db,
+        exercise_id=exercise_id,
+        voice_type=voice_type,
+        source_type="custom",
+        stored=stored,
+        audio_format=audio_format,
+    )
     
     return {"success": True, "audio_id": result["id"], "voice_type": voice_type}
 
@@ -316,30 +747,18 @@ async def save_browser_recording(
     audio_file: UploadFile = File(...),
     db: Connection = Depends(get_db)
 ):
-    audio_data = await audio_file.read()
-    
     format_map = {'audio/webm': 'webm', 'audio/ogg': 'ogg', 'audio/wav': 'wav'}
     audio_format = format_map.get(audio_file.content_type, 'webm')
+    stored = await _store_upload(audio_file, audio_format, "Empty recording")
     
-    result = db.execute(
-        text("""
-            INSERT INTO exercise_audio (
-                exercise_id, voice_type, source_type, audio_data, audio_format, audio_size,
-                created_at, updated_at
-            ) VALUES (
-                :exercise_id, :voice_type, 'recording', :audio_data, :audio_format, :audio_size,
-                NOW(), NOW()
-            )
-            ON CONFLICT (exercise_id, voice_type) DO UPDATE SET
-                source_type='recording', audio_data=EXCLUDED.audio_data,
-                audio_format=EXCLUDED.audio_format, audio_size=EXCLUDED.audio_size, updated_at=NOW()
-            RETURNING id
-        """),
-        {
-            "exercise_id": exercise_id, "voice_type": voice_type,
-            "audio_data": audio_data, "audio_format": audio_format, "audio_size": len(audio_data)
-        }
-    ).mappings().first()
+    result = _upsert_exercise_audio(
+        db,
+        exercise_id=exercise_id,
+        voice_type=voice_type,
+        source_type="recording",
+        stored=stored,
+        audio_format=audio_format,
+    )
     
     return {"success": True, "audio_id": result["id"]}
 
@@ -359,53 +778,22 @@ async def upload_target_audio(
     if voice_type not in ("male", "female"):
         raise HTTPException(400, "voice_type must be male or female")
 
-    audio_data = await audio_file.read()
-    if not audio_data:
-        raise HTTPException(400, "Empty file")
-    if len(audio_data) > MAX_AUDIO_SIZE:
-        raise HTTPException(400, f"File too large. Max: {MAX_AUDIO_SIZE/1024/1024}MB")
-
     format_map = {
         'audio/mpeg': 'mp3', 'audio/mp3': 'mp3', 'audio/wav': 'wav',
         'audio/ogg': 'ogg', 'audio/webm': 'webm'
     }
     audio_format = format_map.get(audio_file.content_type, 'mp3')
-
-    result = db.execute(
-        text(
-            """
-            INSERT INTO exercise_audio_targets (
-                exercise_id, target_key, voice_type, source_type,
-                audio_data, audio_format, audio_size,
-                tts_text, tts_voice_id,
-                created_at, updated_at
-            ) VALUES (
-                :exercise_id, :target_key, :voice_type, 'recording',
-                :audio_data, :audio_format, :audio_size,
-                NULL, NULL,
-                NOW(), NOW()
-            )
-            ON CONFLICT (exercise_id, target_key, voice_type) DO UPDATE SET
-                source_type='recording',
-                audio_data=EXCLUDED.audio_data,
-                audio_format=EXCLUDED.audio_format,
-                audio_size=EXCLUDED.audio_size,
-                tts_text=NULL,
-                tts_voice_id=NULL,
-                file_path=NULL,
-                updated_at=NOW()
-            RETURNING id
-            """
-        ),
-        {
-            "exercise_id": exercise_id,
-            "target_key": target_key,
-            "voice_type": voice_type,
-            "audio_data": audio_data,
-            "audio_format": audio_format,
-            "audio_size": len(audio_data),
-        },
-    ).mappings().first()
+    stored = await _store_upload(audio_file, audio_format, "Empty file")
+
+    result = _upsert_target_audio(
+        db,
+        exercise_id=exercise_id,
+        target_key=target_key,
+        voice_type=voice_type,
+        source_type="recording",
+        stored=stored,
+        audio_format=audio_format,
+    )
 
     return {"success": True, "audio_id": result["id"], "voice_type": voice_type, "target_key": target_key}
 
@@ -420,135 +808,178 @@ async def save_target_recording(
 ):
     # Same as upload, but keeps browser format mapping defaulting to webm.
     format_map = {'audio/webm': 'webm', 'audio/ogg': 'ogg', 'audio/wav': 'wav', 'audio/mpeg': 'mp3', 'audio/mp3': 'mp3'}
-    audio_data = await audio_file.read()
-    if not audio_data:
-        raise HTTPException(400, "Empty recording")
     audio_format = format_map.get(audio_file.content_type, 'webm')
-    # Reuse upload logic by creating a fake UploadFile isn't worth it; upsert directly.
     target_key = (target_key or "").strip()
     voice_type = (voice_type or "").strip().lower()
     if not target_key:
         raise HTTPException(400, "target_key is required")
     if voice_type not in ("male", "female"):
         raise HTTPException(400, "voice_type must be male or female")
-
-    result = db.execute(
-        text(
-            """
-            INSERT INTO exercise_audio_targets (
-                exercise_id, target_key, voice_type, source_type,
-                audio_data, audio_format, audio_size,
-                created_at, updated_at
-            ) VALUES (
-                :exercise_id, :target_key, :voice_type, 'recording',
-                :audio_data, :audio_format, :audio_size,
-                NOW(), NOW()
-            )
-            ON CONFLICT (exercise_id, target_key, voice_type) DO UPDATE SET
-                source_type='recording',
-                audio_data=EXCLUDED.audio_data,
-                audio_format=EXCLUDED.audio_format,
-                audio_size=EXCLUDED.audio_size,
-                tts_text=NULL,
-                tts_voice_id=NULL,
-                file_path=NULL,
-                updated_at=NOW()
-            RETURNING id
-            """
-        ),
-        {
-            "exercise_id": exercise_id,
-            "target_key": target_key,
-            "voice_type": voice_type,
-            "audio_data": audio_data,
-            "audio_format": audio_format,
-            "audio_size": len(audio_data),
-        },
-    ).mappings().first()
+    stored = await _store_upload(audio_file, audio_format, "Empty recording")
+
+    result = _upsert_target_audio(
+        db,
+        exercise_id=exercise_id,
+        target_key=target_key,
+        voice_type=voice_type,
+        source_type="recording",
+        stored=stored,
+        audio_format=audio_format,
+    )
     return {"success": True, "audio_id": result["id"], "target_key": target_key}
 
 
 @router.delete("/cms/audio/targets/{audio_id}")
 def delete_target_audio(audio_id: int, db: Connection = Depends(get_db)):
-    db.execute(text("DELETE FROM exercise_audio_targets WHERE id = :id"), {"id": audio_id})
+    exercise_id = db.execute(
+        text("DELETE FROM exercise_audio_targets WHERE id = :id RETURNING exercise_id"),
+        {"id": audio_id},
+    ).scalar_one_or_none()
+    if exercise_id is not None:
+        _audio_changed(db, exercise_id)
     return {"success": True}
 
 
+# Only pull the bytea when the row hasn't been moved to the file store yet.
+_AUDIO_COLS = "audio_format, file_path, content_hash, CASE WHEN file_path IS NULL THEN audio_data END AS audio_data"
+
+
 @router.get("/cms/audio/targets/{audio_id}/preview")
-def preview_target_audio(audio_id: int, db: Connection = Depends(get_db)):
+def preview_target_audio(audio_id: int, request: Request, db: Connection = Depends(get_db)):
     row = db.execute(
-        text("SELECT audio_data, audio_format FROM exercise_audio_targets WHERE id = :id"),
+        text(f"SELECT {_AUDIO_COLS} FROM exercise_audio_targets WHERE id = :id"),
         {"id": audio_id},
     ).mappings().first()
     if not row:
         raise HTTPException(404, "Audio not found")
-    content_types = {'mp3': 'audio/mpeg', 'wav': 'audio/wav', 'ogg': 'audio/ogg', 'webm': 'audio/webm'}
-    content_type = content_types.get(row["audio_format"], 'audio/mpeg')
-    return Response(content=bytes(row["audio_data"]), media_type=content_type)
+    return _audio_response(request, row, cache=False)
 
 
 @router.get("/cms/audio/{audio_id}/preview")
-def preview_audio(audio_id: int, db: Connection = Depends(get_db)):
+def preview_audio(audio_id: int, request: Request, db: Connection = Depends(get_db)):
     row = db.execute(
-        text("SELECT audio_data, audio_format FROM exercise_audio WHERE id = :id"),
+        text(f"SELECT {_AUDIO_COLS} FROM exercise_audio WHERE id = :id"),
         {"id": audio_id}
     ).mappings().first()
     
     if not row:
         raise HTTPException(404, "Audio not found")
     
-    content_types = {'mp3': 'audio/mpeg', 'wav': 'audio/wav', 'ogg': 'audio/ogg', 'webm': 'audio/webm'}
-    content_type = content_types.get(row["audio_format"], 'audio/mpeg')
-    
-    return Response(content=bytes(row["audio_data"]), media_type=content_type)
+    return _audio_response(request, row, cache=False)
 
 
 @router.delete("/cms/audio/{audio_id}")
 def delete_audio(audio_id: int, db: Connection = Depends(get_db)):
     result = db.execute(
-        text("DELETE FROM exercise_audio WHERE id = :id RETURNING id"),
+        text("DELETE FROM exercise_audio WHERE id = :id RETURNING id, exercise_id"),
         {"id": audio_id}
     ).mappings().first()
     
     if not result:
         raise HTTPException(404, "Audio not found")
+    _audio_changed(db, result["exercise_id"])
     
     return {"success": True}
 
 
+def _pick_variant(request: Request, quality: Optional[str]) -> str:
+    """'normalized' / 'opus' / 'low' / 'original' from ?quality=..., else from the Accept header.
+
+    The default is the trimmed, loudness-normalized MP3; 'original' is the upload as-is.
+    """
+    q = (quality or "").strip().lower()
+    if q in VARIANTS or q == "original":
+        return q
+    accept = (request.headers.get("accept") or "").lower()
+    if "audio/ogg" in accept or "audio/opus" in accept or "codecs=opus" in accept:
+        return "opus"
+    return "normalized"
+
+
+def _load_playback(key: AudioKey, query: str, params: dict):
+    """Cache-first lookup for playback. A DB connection is only taken on a miss."""
+    hit = audio_bytes_cache.get(key)
+    if hit is not None:
+        return hit.as_row()
+
+    variant = key[3]
+    served_variant = "original"
+    processing = False
+    with engine.connect() as conn:
+        row = conn.execute(text(query), params).mappings().first()
+        if not row:
+            return None
+        row = dict(row)
+        row["source_hash"] = row["content_hash"]
+        if variant != "original":
+            variant_row = get_variant(conn, row["content_hash"], variant)
+            if variant_row is not None and resolve_stored(variant_row["file_path"]) is not None:
+                row = {**variant_row, "source_hash": row["content_hash"]}
+                served_variant = variant
+            else:
+                # not processed yet (older rows / ffmpeg added later): backfill lazily
+                processing = schedule_audio_processing(row["content_hash"], row["file_path"])
+
+    row["fallback"] = served_variant != variant
+    if row["fallback"] and processing:
+        # don't pin the fallback in the cache; the variant should appear shortly
+        return row
+
+    if row["audio_data"] is not None:
+        data = bytes(row["audio_data"])
+    else:
+        path = resolve_stored(row["file_path"])
+        if path is None or path.stat().st_size > audio_bytes_cache.max_item_bytes:
+            return row
+        data = path.read_bytes()
+
+    item = CachedAudio(
+        audio_format=row["audio_format"],
+        content_hash=row["content_hash"] or content_hash(data),
+        data=data,
+        source_hash=row["source_hash"],
+        fallback=row["fallback"],
+    )
+    return item.as_row() if audio_bytes_cache.put(key, item) else row
+
+
 @router.get("/audio/exercise/{exercise_id}")
 def get_exercise_audio_for_playback(
     exercise_id: int,
+    request: Request,
     voice: str = "female",
-    db: Connection = Depends(get_db)
+    v: Optional[str] = None,
+    quality: Optional[str] = None,
 ):
-    row = db.execute(
-        text("""
-            SELECT audio_data, audio_format FROM exercise_audio
+    row = _load_playback(
+        (exercise_id, None, voice, _pick_variant(request, quality)),
+        f"""
+            SELECT {_AUDIO_COLS} FROM exercise_audio
             WHERE exercise_id = :exercise_id AND voice_type = :voice LIMIT 1
-        """),
-        {"exercise_id": exercise_id, "voice": voice}
-    ).mappings().first()
+        """,
+        {"exercise_id": exercise_id, "voice": voice},
+    )
     
     if not row:
         raise HTTPException(404, f"No {voice} audio found")
     
-    content_types = {'mp3': 'audio/mpeg', 'wav': 'audio/wav', 'ogg': 'audio/ogg', 'webm': 'audio/webm'}
-    return Response(
-        content=bytes(row["audio_data"]),
-        media_type=content_types.get(row["audio_format"], 'audio/mpeg'),
-        headers={"Cache-Control": "public, max-age=31536000"}
-    )
+    return _audio_response(request, row, version=v)
 
 
 @router.get("/audio/target/{exercise_id}")
 def get_target_audio_for_playback(
     exercise_id: int,
     key: str,
+    request: Request,
     voice: str = "female",
-    db: Connection = Depends(get_db),
+    v: Optional[str] = None,
+    quality: Optional[str] = None,
 ):
-    """Serve stored per-target audio. Returns 404 when missing."""
+    """Serve stored per-target audio. Returns 404 when missing.
+
+    ?quality=normalized|opus|low|original (or an Accept header listing audio/ogg)
+    picks a processed variant when one exists.
+    """
     key = (key or "").strip()
     voice = (voice or "").strip().lower()
     if not key:
@@ -556,36 +987,157 @@ def get_target_audio_for_playback(
     if voice not in ("male", "female"):
         voice = "female"
 
-    row = db.execute(
-        text(
-            """
-            SELECT audio_data, audio_format
+    row = _load_playback(
+        (exercise_id, key, voice, _pick_variant(request, quality)),
+        f"""
+            SELECT {_AUDIO_COLS}
             FROM exercise_audio_targets
             WHERE exercise_id = :exercise_id
               AND target_key = :target_key
               AND voice_type = :voice
             LIMIT 1
-            """
-        ),
+        """,
         {"exercise_id": exercise_id, "target_key": key, "voice": voice},
-    ).mappings().first()
+    )
     if not row:
         raise HTTPException(404, "No audio found")
 
-    content_types = {'mp3': 'audio/mpeg', 'wav': 'audio/wav', 'ogg': 'audio/ogg', 'webm': 'audio/webm'}
-    return Response(
-        content=bytes(row["audio_data"]),
-        media_type=content_types.get(row["audio_format"], 'audio/mpeg'),
-        headers={"Cache-Control": "public, max-age=31536000"},
-    )
+    return _audio_response(request, row, version=v)
+
+
+PACK_CHUNK_SIZE = 256 * 1024
+
+
+@router.get("/audio/packs/{pack_id}")
+def get_audio_pack(pack_id: str, request: Request):
+    """A lesson audio pack (see audio_pack.py), read through mmap.
+
+    Pack ids are content hashes, so responses are immutable; byte ranges let
+    the client resume a download or fetch single clips.
+    """
+    mm = open_pack(pack_id)
+    if mm is None:
+        raise HTTPException(404, "Audio pack not found")
+
+    size = len(mm)
+    headers = {"ETag": f'"{pack_id}"', "Cache-Control": IMMUTABLE_CACHE_CONTROL, "Accept-Ranges": "bytes"}
+    if _etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == headers["ETag"]):
+        span = _parse_range(range_header, size)
+        if span is not None:
+            start, end = span
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            return Response(
+                content=mm[start:end + 1], status_code=206, media_type="application/octet-stream", headers=headers
+            )
+
+    def body():
+        for pos in range(0, size, PACK_CHUNK_SIZE):
+            yield mm[pos:pos + PACK_CHUNK_SIZE]
+
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(body(), media_type="application/octet-stream", headers=headers)
+
+
+@router.get("/cms/audio/cache/stats")
+def audio_cache_stats():
+    """Hit rate and memory use of this worker's playback cache."""
+    return audio_bytes_cache.stats()
+
+
+# Parallel ElevenLabs requests per batch (their concurrency limit depends on the plan)
+TTS_BATCH_CONCURRENCY = max(1, int(_env_float("TTS_BATCH_CONCURRENCY", 4)))
+
+
+async def _batch_generate_events(items: list[dict]):
+    """Synthesize TTS for every item with bounded parallelism.
+
+    Items are {exercise_id, target_key, text, voice_type}; target_key None means
+    the exercise-level prompt audio. Yields one progress event per item as it
+    finishes. HTTP calls run concurrently on the shared TTS client; DB writes
+    happen here, one at a time, each in its own transaction so finished items
+    survive a later failure.
+    """
+    total = len(items)
+    sem = asyncio.Semaphore(TTS_BATCH_CONCURRENCY)
+
+    async def synth(item: dict):
+        if item["voice_type"] not in ("male", "female"):
+            raise HTTPException(400, "voice_type must be male or female")
+        voice_id = MALE_VOICE_ID if item["voice_type"] == "male" else FEMALE_VOICE_ID
+        async with sem:
+            asset_id, stored = await _tts_asset_audio(item["text"], voice_id)
+        return voice_id, asset_id, stored
+
+    async def run(item: dict):
+        try:
+            return item, await synth(item), None
+        except Exception as e:
+            return item, None, e
+
+    tasks = [asyncio.ensure_future(run(item)) for item in items]
+    try:
+        done = 0
+        for fut in asyncio.as_completed(tasks):
+            item, result, error = await fut
+            done += 1
+            event = {
+                "exercise_id": item["exercise_id"],
+                "target_key": item.get("target_key"),
+                "voice_type": item["voice_type"],
+                "done": done,
+                "total": total,
+            }
+            if error is None:
+                voice_id, asset_id, stored = result
+                event["reused_asset"] = asset_id is not None
+                try:
+                    with engine.begin() as conn:
+                        if asset_id is None:
+                            asset_id = _save_tts_asset(conn, item["text"], voice_id, stored)
+                        common = dict(
+                            exercise_id=item["exercise_id"],
+                            voice_type=item["voice_type"],
+                            source_type="tts",
+                            stored=stored,
+                            asset_id=asset_id,
+                            audio_format="mp3",
+                            tts_text=item["text"],
+                            tts_voice_id=voice_id,
+                        )
+                        if item.get("target_key"):
+                            _upsert_target_audio(conn, target_key=item["target_key"], **common)
+                        else:
+                            _upsert_exercise_audio(conn, **common)
+                except Exception as e:
+                    error = e
+            if error is None:
+                event["status"] = "ok"
+            else:
+                event["status"] = "error"
+                event["error"] = error.detail if isinstance(error, HTTPException) else str(error)
+            yield event
+    finally:
+        for t in tasks:
+            t.cancel()
 
 
 @router.post("/cms/audio/batch-generate")
 async def batch_generate_tts(
     lesson_id: int,
     voice_types: list[str],
+    stream: bool = False,
     db: Connection = Depends(get_db)
 ):
+    """Generate prompt TTS for every exercise of a lesson.
+
+    With ?stream=true the response is NDJSON: one progress line per item, then
+    a final {"summary": ...} line.
+    """
     exercises = db.execute(
         text("""
             SELECT id, prompt FROM exercises
@@ -594,22 +1146,31 @@ async def batch_generate_tts(
         """),
         {"lesson_id": lesson_id}
     ).mappings().all()
-    
+    voice_types = [(vt or "").strip().lower() for vt in voice_types]
+    items = [
+        {"exercise_id": ex["id"], "target_key": None, "text": ex["prompt"], "voice_type": vt}
+        for ex in exercises
+        for vt in voice_types
+    ]
+
+    if stream:
+        async def ndjson():
+            generated, errors = 0, 0
+            async for event in _batch_generate_events(items):
+                if event["status"] == "ok":
+                    generated += 1
+                else:
+                    errors += 1
+                yield json.dumps(event) + "\n"
+            yield json.dumps({"summary": {"success": True, "generated": generated, "errors": errors}}) + "\n"
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
     generated, errors = [], []
-    
-    for exercise in exercises:
-        for voice_type in voice_types:
-            try:
-                result = await generate_tts_audio(
-                    GenerateTTSRequest(
-                        exercise_id=exercise["id"],
-                        text=exercise["prompt"],
-                        voice_type=voice_type
-                    ),
-                    db=db
-                )
-                generated.append({"exercise_id": exercise["id"], "voice_type": voice_type})
-            except Exception as e:
-                errors.append({"exercise_id": exercise["id"], "voice_type": voice_type, "error": str(e)})
+    async for event in _batch_generate_events(items):
+        if event["status"] == "ok":
+            generated.append({"exercise_id": event["exercise_id"], "voice_type": event["voice_type"]})
+        else:
+            errors.append({"exercise_id": event["exercise_id"], "voice_type": event["voice_type"], "error": event["error"]})
     
     return {"success": True, "generated": len(generated), "errors": errors if errors else None}
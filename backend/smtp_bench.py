@@ -0,0 +1,181 @@
+"""
+backend/smtp_bench.py
+Local fake SMTP server (aiosmtpd) and a throughput benchmark for smtp_sender.
+
+Needs aiosmtpd, which is a dev-only dependency (`pip install aiosmtpd`).
+
+Run from backend/:
+    # fake server for local development; prints every message it receives.
+    # Point the API at it: SMTP_HOST=127.0.0.1 SMTP_PORT=8025 SMTP_STARTTLS=false
+    # SMTP_USER=dev SMTP_PASS=dev (any credentials are accepted)
+    python smtp_bench.py serve [--port 8025]
+
+    # one-session-per-message (the old _send_email) vs SMTPPool
+    python smtp_bench.py bench [--messages 500] [--pool-size 4] [--rtt-ms 20]
+
+--rtt-ms adds that delay to every SMTP command the fake server answers, and
+--handshake-ms to each new session (standing in for the STARTTLS handshake),
+so the numbers resemble a remote provider rather than loopback.
+"""
+import argparse
+import asyncio
+import smtplib
+import logging
+import time
+from email.message import EmailMessage
+
+from smtp_sender import SMTPPool
+
+try:
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.smtp import AuthResult
+except ImportError:  # dev-only dependency
+    Controller = None
+    AuthResult = None
+
+
+class FakeSMTPHandler:
+    """Accepts every message; optional per-command latency."""
+
+    def __init__(self, rtt: float = 0.0, handshake: float = 0.0, echo: bool = False):
+        self.rtt = rtt
+        self.handshake = handshake
+        self.echo = echo
+        self.received = 0
+        self.sessions = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.sessions += 1
+        await asyncio.sleep(self.rtt + self.handshake)
+        session.host_name = hostname
+        return responses
+
+    async def handle_MAIL(self, server, session, envelope, address, mail_options):
+        await asyncio.sleep(self.rtt)
+        envelope.mail_from = address
+        envelope.mail_options.extend(mail_options)
+        return "250 OK"
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        await asyncio.sleep(self.rtt)
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.rtt)
+        self.received += 1
+        if self.echo:
+            print(f"--- EMAIL from {envelope.mail_from} to {', '.join(envelope.rcpt_tos)} ---")
+            print(envelope.content.decode("utf-8", errors="replace"))
+            print("--- END EMAIL ---")
+        return "250 Message accepted for delivery"
+
+
+def _accept_any(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=True)
+
+
+def start_fake_server(handler: FakeSMTPHandler, port: int) -> "Controller":
+    if Controller is None:
+        raise SystemExit("aiosmtpd is not installed (pip install aiosmtpd)")
+    # aiosmtpd logs a deprecation warning about its own Session.login_data on every AUTH
+    logging.getLogger("mail.log").setLevel(logging.ERROR)
+    controller = Controller(
+        handler,
+        hostname="127.0.0.1",
+        port=port,
+        authenticator=_accept_any,
+        auth_require_tls=False,
+    )
+    controller.start()
+    return controller
+
+
+def _cfg(port: int) -> dict:
+    return {
+        "host": "127.0.0.1",
+        "port": port,
+        "user": "bench",
+        "password": "bench",
+        "from": "bench@haylingua.local",
+        "starttls": False,
+    }
+
+
+def _messages(cfg: dict, n: int) -> list:
+    messages = []
+    for i in range(n):
+        msg = EmailMessage()
+        msg["From"] = cfg["from"]
+        msg["To"] = f"learner{i}@example.com"
+        msg["Subject"] = "Keep your streak going"
+        msg.set_content(f"Message {i}")
+        messages.append(msg)
+    return messages
+
+
+def _send_one_session_each(cfg: dict, messages: list) -> None:
+    for msg in messages:
+        with smtplib.SMTP(cfg["host"], cfg["port"], timeout=30) as s:
+            s.login(cfg["user"], cfg["password"])
+            s.send_message(msg)
+
+
+def bench(n: int, pool_size: int, rtt: float, handshake: float, port: int) -> None:
+    handler = FakeSMTPHandler(rtt=rtt, handshake=handshake)
+    controller = start_fake_server(handler, port)
+    cfg = _cfg(port)
+    try:
+        def run(label: str, fn) -> None:
+            received, sessions = handler.received, handler.sessions
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+            print(
+                f"{label:<28} {n} msgs in {elapsed:6.2f}s  {n / elapsed:8.1f} msg/s  "
+                f"({handler.sessions - sessions} sessions, {handler.received - received} received)"
+            )
+
+        run("one session per message", lambda: _send_one_session_each(cfg, _messages(cfg, n)))
+
+        pool = SMTPPool(cfg, size=1)
+        run("pooled, 1 session", lambda: [pool.send(m) for m in _messages(cfg, n)])
+        pool.close()
+
+        pool = SMTPPool(cfg, size=pool_size)
+        run(f"pooled send_many, {pool_size} sessions", lambda: pool.send_many(_messages(cfg, n)))
+        print(f"pool stats: {pool.stats()}")
+        pool.close()
+    finally:
+        controller.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake SMTP server and SMTPPool benchmark.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    serve = sub.add_parser("serve", help="run a fake SMTP server that prints messages")
+    serve.add_argument("--port", type=int, default=8025)
+    b = sub.add_parser("bench", help="compare one-session-per-message with SMTPPool")
+    b.add_argument("--port", type=int, default=8026)
+    b.add_argument("--messages", type=int, default=500)
+    b.add_argument("--pool-size", type=int, default=4)
+    b.add_argument("--rtt-ms", type=float, default=20.0, help="delay per SMTP command")
+    b.add_argument("--handshake-ms", type=float, default=100.0, help="extra delay per new session")
+    args = parser.parse_args()
+
+    if args.cmd == "serve":
+        controller = start_fake_server(FakeSMTPHandler(echo=True), args.port)
+        print(f"[smtp_bench] fake SMTP server on 127.0.0.1:{args.port} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            controller.stop()
+    else:
+        bench(args.messages, args.pool_size, args.rtt_ms / 1000, args.handshake_ms / 1000, args.port)
+
+
+if __name__ == "__main__":
+    main()
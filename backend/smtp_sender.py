@@ -0,0 +1,181 @@
+"""
+backend/smtp_sender.py
+Pooled, persistent SMTP sessions.
+
+Opening a session costs a TCP connect, EHLO, STARTTLS (a TLS handshake) and
+AUTH: several round trips before the first message, which used to be paid for
+every email. SMTPPool keeps up to `size` authenticated sessions open and sends
+many messages on each:
+
+- a session idle for longer than SMTP_IDLE_SECONDS is checked with NOOP first
+- a session is recycled after SMTP_MAX_MESSAGES_PER_SESSION messages (most
+  providers cap messages per connection)
+- a dropped connection (or a 421 reply) is reopened and the message is sent
+  once more on the new session
+
+send_many() spreads a batch over all sessions. Thread-safe: job runners call
+send() from worker threads. smtp_bench.py has a local fake server and a
+throughput benchmark.
+"""
+import os
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+from typing import Optional
+
+
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+SMTP_IDLE_SECONDS = float(os.getenv("SMTP_IDLE_SECONDS", "30"))
+SMTP_MAX_MESSAGES_PER_SESSION = int(os.getenv("SMTP_MAX_MESSAGES_PER_SESSION", "100"))
+SMTP_TIMEOUT_SECONDS = 30
+
+
+def _is_connection_error(e: Exception) -> bool:
+    """True when the session is unusable (reconnect), False for per-message errors."""
+    if isinstance(e, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(e, smtplib.SMTPResponseException):
+        return e.smtp_code == 421
+    # SMTPException subclasses OSError; anything else is socket/TLS level
+    return isinstance(e, OSError) and not isinstance(e, smtplib.SMTPException)
+
+
+class _Session:
+    def __init__(self, cfg: dict, lock: threading.Lock):
+        self.cfg = cfg
+        # the pool's lock: counters are read by stats() from other threads
+        self._lock = lock
+        self.smtp: Optional[smtplib.SMTP] = None
+        self.sent = 0
+        self.opened = 0
+        self.last_used = 0.0
+
+    def open(self) -> None:
+        cfg = self.cfg
+        s = smtplib.SMTP(cfg["host"], cfg["port"], timeout=SMTP_TIMEOUT_SECONDS)
+        try:
+            if cfg.get("starttls", True):
+                s.starttls()
+            if cfg.get("user"):
+                s.login(cfg["user"], cfg["password"])
+        except Exception:
+            s.close()
+            raise
+        with self._lock:
+            self.smtp = s
+            self.sent = 0
+            self.opened += 1
+        self.last_used = time.monotonic()
+
+    def close(self) -> None:
+        with self._lock:
+            s, self.smtp = self.smtp, None
+        if s is None:
+            return
+        try:
+            s.quit()
+        except Exception:
+            s.close()
+
+    def _alive(self) -> bool:
+        try:
+            return self.smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    def ensure_open(self) -> None:
+        if self.smtp is not None and self.sent >= SMTP_MAX_MESSAGES_PER_SESSION:
+            self.close()
+        elif self.smtp is not None and time.monotonic() - self.last_used > SMTP_IDLE_SECONDS and not self._alive():
+            self.close()
+        if self.smtp is None:
+            self.open()
+
+    def send(self, msg: EmailMessage) -> None:
+        self.ensure_open()
+        self.smtp.send_message(msg)
+        with self._lock:
+            self.sent += 1
+        self.last_used = time.monotonic()
+
+
+class SMTPPool:
+    """Up to `size` reusable SMTP sessions for one server/account."""
+
+    def __init__(self, cfg: dict, size: int = SMTP_POOL_SIZE):
+        self.cfg = cfg
+        self.size = max(1, size)
+        # guards the counters (pool and per-session); sessions themselves are
+        # only used by the thread that took them from _idle
+        self._lock = threading.Lock()
+        self._sessions = [_Session(cfg, self._lock) for _ in range(self.size)]
+        # LIFO: reuse the most recently used (warm) session first
+        self._idle: queue.LifoQueue[_Session] = queue.LifoQueue()
+        for session in self._sessions:
+            self._idle.put(session)
+        self.messages_sent = 0
+        self.reconnects = 0
+        self._closed = False
+
+    def send(self, msg: EmailMessage) -> None:
+        """Send one message; raises smtplib errors (e.g. SMTPRecipientsRefused) to the caller."""
+        session = self._idle.get()
+        try:
+            try:
+                session.send(msg)
+            except Exception as e:
+                if not _is_connection_error(e):
+                    raise
+                # stale/dropped session: one more try on a fresh connection
+                session.close()
+                with self._lock:
+                    self.reconnects += 1
+                session.send(msg)
+            with self._lock:
+                self.messages_sent += 1
+        finally:
+            if self._closed:
+                session.close()
+            self._idle.put(session)
+
+    def send_many(self, messages: list[EmailMessage]) -> list[Optional[Exception]]:
+        """Send a batch over all sessions; returns the error (or None) per message, in order."""
+        def send_one(msg: EmailMessage) -> Optional[Exception]:
+            try:
+                self.send(msg)
+                return None
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.size) as ex:
+            return list(ex.map(send_one, messages))
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Close idle sessions, waiting up to `timeout` for busy ones.
+
+        A session still sending after that is closed when it is handed back.
+        """
+        self._closed = True
+        deadline = time.monotonic() + timeout
+        taken = []
+        while len(taken) < self.size:
+            try:
+                taken.append(self._idle.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        for session in taken:
+            session.close()
+            self._idle.put(session)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "open_sessions": sum(1 for s in self._sessions if s.smtp is not None),
+                "sessions_opened": sum(s.opened for s in self._sessions),
+                "messages_sent": self.messages_sent,
+                "reconnects": self.reconnects,
+            }
@@ -0,0 +1,349 @@
+"""
+backend/storage_gc.py
+Garbage collection of orphaned audio/uploads, with storage accounting.
+
+Categories (each reported as count/bytes found and count/bytes deleted):
+  audio_rows      exercise_audio / exercise_audio_targets rows whose exercise is
+                  gone (older databases have these tables without the FK cascade)
+  audio_assets    shared TTS assets that no row references any more
+  audio_variants  processed variants of clips that nothing references any more
+  store_files     files in audio_store not referenced by any table
+  audio_packs     lesson packs that are no longer any lesson's current pack
+  tts_cache       /tts cache files whose text no longer appears in any exercise
+  avatars         uploaded avatars no user points at
+
+DB rows go first, so files they referenced are collected in the same run.
+Deletes happen in batches (one transaction per DB batch). Files and assets
+younger than the grace period are never touched: writes store the file before
+the row that references it is committed.
+
+Runs as a background job (POST /cms/storage/gc) or from backend/:
+    python storage_gc.py [--dry-run] [--batch 500]
+"""
+import argparse
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from sqlalchemy import text
+
+from audio_pack import pack_clips, pack_id_for, pack_root
+from audio_pregen import PREGEN_VOICE_TYPES, derive_audio_targets
+from audio_store import store_root
+from database import engine
+from job_queue import enqueue_job, job_handler, set_job_progress
+from routes_audio import ELEVEN_MODEL_ID, FEMALE_VOICE_ID, MALE_VOICE_ID
+from tts_cache import TTS_DEFAULT_VOICE_ID, tts_cache_key, tts_disk_cache
+
+
+GC_JOB_KIND = "storage_gc"
+GC_BATCH = 500
+GC_GRACE_SECONDS = int(os.getenv("GC_GRACE_SECONDS", str(24 * 3600)))
+# /tts serves free text too, so unreferenced cache files get a longer grace
+GC_TTS_CACHE_GRACE_SECONDS = int(os.getenv("GC_TTS_CACHE_GRACE_DAYS", "30")) * 24 * 3600
+
+CATEGORIES = (
+    "audio_rows", "audio_assets", "audio_variants", "store_files", "audio_packs", "tts_cache", "avatars",
+)
+
+Progress = Callable[[dict], None]
+
+
+def _entry() -> dict:
+    return {"count": 0, "bytes": 0, "deleted": 0, "deleted_bytes": 0}
+
+
+# ------------------------------
+# DB rows
+# ------------------------------
+
+# (category, table, key column, size expression, orphan condition)
+_ROW_RULES = [
+    (
+        "audio_rows", "exercise_audio", "id",
+        "COALESCE(octet_length(audio_data), audio_size, 0)",
+        "NOT EXISTS (SELECT 1 FROM exercises e WHERE e.id = exercise_audio.exercise_id)",
+    ),
+    (
+        "audio_rows", "exercise_audio_targets", "id",
+        "COALESCE(octet_length(audio_data), audio_size, 0)",
+        "NOT EXISTS (SELECT 1 FROM exercises e WHERE e.id = exercise_audio_targets.exercise_id)",
+    ),
+    (
+        "audio_assets", "audio_assets", "id",
+        "audio_size",
+        """
+        audio_assets.created_at < NOW() - make_interval(secs => :grace)
+        AND NOT EXISTS (SELECT 1 FROM exercise_audio a WHERE a.asset_id = audio_assets.id)
+        AND NOT EXISTS (SELECT 1 FROM exercise_audio_targets t WHERE t.asset_id = audio_assets.id)
+        """,
+    ),
+    (
+        "audio_variants", "audio_variants", "ctid",
+        "audio_size",
+        """
+        audio_variants.created_at < NOW() - make_interval(secs => :grace)
+        AND NOT EXISTS (SELECT 1 FROM exercise_audio a WHERE a.content_hash = audio_variants.source_hash)
+        AND NOT EXISTS (SELECT 1 FROM exercise_audio_targets t WHERE t.content_hash = audio_variants.source_hash)
+        AND NOT EXISTS (SELECT 1 FROM audio_assets s WHERE s.content_hash = audio_variants.source_hash)
+        """,
+    ),
+]
+
+
+def _gc_rows(entry: dict, table: str, key: str, size_sql: str, where: str, dry_run: bool, batch: int) -> None:
+    params = {"grace": GC_GRACE_SECONDS, "batch": batch}
+    with engine.connect() as conn:
+        count, size = conn.execute(
+            text(f"SELECT COUNT(*), COALESCE(SUM({size_sql}), 0) FROM {table} WHERE {where}"),
+            params,
+        ).one()
+    entry["count"] += int(count)
+    entry["bytes"] += int(size)
+    if dry_run or not count:
+        return
+
+    while True:
+        with engine.begin() as conn:
+            sizes = conn.execute(
+                text(
+                    f"""
+                    DELETE FROM {table}
+                    WHERE {key} IN (SELECT {key} FROM {table} WHERE {where} LIMIT :batch)
+                    RETURNING {size_sql}
+                    """
+                ),
+                params,
+            ).scalars().all()
+        if not sizes:
+            break
+        entry["deleted"] += len(sizes)
+        entry["deleted_bytes"] += sum(int(s or 0) for s in sizes)
+
+
+# ------------------------------
+# Files
+# ------------------------------
+
+def _old_files(root: Path, grace: int, pattern: str = "*") -> list[tuple[Path, int]]:
+    """(path, size) of regular files under root last modified before the grace period."""
+    if not root.is_dir():
+        return []
+    cutoff = time.time() - grace
+    found = []
+    for p in root.rglob(pattern):
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        if p.is_file() and st.st_mtime < cutoff:
+            found.append((p, st.st_size))
+    return found
+
+
+def _gc_files(
+    entry: dict,
+    candidates: list[tuple[Path, int]],
+    dry_run: bool,
+    batch: int,
+    on_delete: Optional[Callable[[Path], None]] = None,
+) -> None:
+    entry["count"] += len(candidates)
+    entry["bytes"] += sum(size for _, size in candidates)
+    if dry_run:
+        return
+    for i in range(0, len(candidates), batch):
+        for p, size in candidates[i:i + batch]:
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                print(f"[storage_gc] could not delete {p}: {e}")
+                continue
+            entry["deleted"] += 1
+            entry["deleted_bytes"] += size
+            if on_delete is not None:
+                on_delete(p)
+
+
+def _referenced_store_paths() -> set[str]:
+    with engine.connect() as conn:
+        return set(
+            conn.execute(
+                text(
+                    """
+                    SELECT file_path FROM exercise_audio WHERE file_path IS NOT NULL
+                    UNION SELECT file_path FROM exercise_audio_targets WHERE file_path IS NOT NULL
+                    UNION SELECT file_path FROM audio_assets
+                    UNION SELECT file_path FROM audio_variants
+                    """
+                )
+            ).scalars().all()
+        )
+
+
+def _store_orphans() -> list[tuple[Path, int]]:
+    referenced = _referenced_store_paths()
+    root, packs = store_root(), pack_root()
+    orphans = []
+    for p, size in _old_files(root, GC_GRACE_SECONDS):
+        if packs in p.parents:
+            continue
+        # leftover temp files (.incoming/, .tmp-*) are never referenced
+        if p.relative_to(root).as_posix() not in referenced:
+            orphans.append((p, size))
+    return orphans
+
+
+def _current_pack_ids() -> set[str]:
+    with engine.connect() as conn:
+        lesson_ids = conn.execute(text("SELECT id FROM lessons")).scalars().all()
+        return {
+            pack_id_for(pack_clips(conn, int(lid), voice))
+            for lid in lesson_ids
+            for voice in (None, *PREGEN_VOICE_TYPES)
+        }
+
+
+def _pack_orphans() -> list[tuple[Path, int]]:
+    current = _current_pack_ids()
+    return [(p, size) for p, size in _old_files(pack_root(), GC_GRACE_SECONDS) if p.stem not in current]
+
+
+def _referenced_tts_keys() -> set[str]:
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT kind, prompt, config FROM exercises")).mappings().all()
+    texts = set()
+    for r in rows:
+        if (r["prompt"] or "").strip():
+            texts.add(r["prompt"].strip())
+        texts.update(value for _, value in derive_audio_targets(r["kind"], r["prompt"], r["config"]))
+    voices = (TTS_DEFAULT_VOICE_ID, MALE_VOICE_ID, FEMALE_VOICE_ID)
+    return {tts_cache_key(t, v, ELEVEN_MODEL_ID) for t in texts for v in voices}
+
+
+def _tts_cache_orphans() -> list[tuple[Path, int]]:
+    referenced = _referenced_tts_keys()
+    return [
+        (p, size)
+        for p, size in _old_files(tts_disk_cache.root, GC_TTS_CACHE_GRACE_SECONDS, "*.mp3")
+        if p.stem not in referenced
+    ]
+
+
+def _avatar_dirs() -> list[Path]:
+    """Every place me_avatar_upload may have written to (same candidates, in order)."""
+    candidates = [os.getenv("UPLOADS_DIR") or "", "/var/data/uploads", "uploads"]
+    dirs = []
+    for base in candidates:
+        if not base:
+            continue
+        d = Path(base) / "avatars"
+        if d.is_dir() and d.resolve() not in [x.resolve() for x in dirs]:
+            dirs.append(d)
+    return dirs
+
+
+def _avatar_orphans() -> list[tuple[Path, int]]:
+    with engine.connect() as conn:
+        urls = conn.execute(
+            text(
+                """
+                SELECT avatar_url FROM users WHERE avatar_url LIKE '/static/avatars/%'
+                UNION SELECT banner_url FROM users WHERE banner_url LIKE '/static/avatars/%'
+                """
+            )
+        ).scalars().all()
+    referenced = {u.rsplit("/", 1)[-1] for u in urls if u}
+    orphans = []
+    for d in _avatar_dirs():
+        for p, size in _old_files(d, GC_GRACE_SECONDS, "u*_*"):
+            if p.name not in referenced:
+                orphans.append((p, size))
+    return orphans
+
+
+# ------------------------------
+# Entry points
+# ------------------------------
+
+def table_sizes() -> dict:
+    """On-disk size (incl. TOAST + indexes) of the tables that hold audio."""
+    with engine.connect() as conn:
+        return {
+            t: int(conn.execute(text("SELECT pg_total_relation_size(CAST(:t AS regclass))"), {"t": t}).scalar() or 0)
+            for t in ("exercise_audio", "exercise_audio_targets", "audio_assets", "audio_variants")
+        }
+
+
+def run_gc(dry_run: bool = True, batch: int = GC_BATCH, progress: Optional[Progress] = None) -> dict:
+    """Find (and unless dry_run, delete) orphaned audio. Returns the per-category report."""
+    batch = max(1, int(batch))
+    report = {"dry_run": dry_run, "categories": {c: _entry() for c in CATEGORIES}}
+    cats = report["categories"]
+
+    def step(name: str) -> None:
+        report["step"] = name
+        if progress is not None:
+            progress(report)
+
+    for category, table, key, size_sql, where in _ROW_RULES:
+        step(category)
+        _gc_rows(cats[category], table, key, size_sql, where, dry_run, batch)
+
+    step("store_files")
+    _gc_files(cats["store_files"], _store_orphans(), dry_run, batch)
+    step("audio_packs")
+    _gc_files(cats["audio_packs"], _pack_orphans(), dry_run, batch)
+    step("tts_cache")
+    _gc_files(cats["tts_cache"], _tts_cache_orphans(), dry_run, batch, on_delete=lambda p: tts_disk_cache.forget(p.stem))
+    step("avatars")
+    _gc_files(cats["avatars"], _avatar_orphans(), dry_run, batch)
+
+    report.pop("step", None)
+    report["orphan_bytes"] = sum(c["bytes"] for c in cats.values())
+    report["deleted_bytes"] = sum(c["deleted_bytes"] for c in cats.values())
+    report["tables"] = table_sizes()
+    return report
+
+
+@job_handler(GC_JOB_KIND)
+async def storage_gc_job(job_id: int, payload: dict) -> dict:
+    def progress(report: dict) -> None:
+        set_job_progress(job_id, report)
+
+    return await asyncio.to_thread(
+        run_gc, bool(payload.get("dry_run", True)), int(payload.get("batch") or GC_BATCH), progress
+    )
+
+
+def enqueue_storage_gc(db, dry_run: bool, batch: int = GC_BATCH) -> int:
+    return enqueue_job(db, GC_JOB_KIND, {"dry_run": bool(dry_run), "batch": int(batch)}, dedupe_key=GC_JOB_KIND)
+
+
+def _fmt_mb(n: int) -> str:
+    return f"{n / 1024 / 1024:.1f} MB"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Delete orphaned audio rows/files and report storage per category.")
+    parser.add_argument("--batch", type=int, default=GC_BATCH, help="rows/files per batch")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be deleted")
+    args = parser.parse_args()
+
+    report = run_gc(dry_run=args.dry_run, batch=args.batch)
+    for name, c in report["categories"].items():
+        print(
+            f"[storage_gc] {name}: {c['count']} orphaned ({_fmt_mb(c['bytes'])}), "
+            f"{c['deleted']} deleted ({_fmt_mb(c['deleted_bytes'])})"
+        )
+    for table, size in report["tables"].items():
+        print(f"[storage_gc] table {table}: {_fmt_mb(size)}")
+    print("[storage_gc] done ✅")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import pytest
+
+import audio_cache
+from audio_cache import AudioLRUCache, CachedAudio
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = FakeClock()
+    monkeypatch.setattr(audio_cache, "time", c)
+    return c
+
+
+def clip(size, tag="x"):
+    # created_at's default_factory is the real clock, bound at import time
+    return CachedAudio(
+        audio_format="mp3", content_hash=tag * 64, data=b"\0" * size, created_at=audio_cache.time.monotonic()
+    )
+
+
+def key(exercise_id, variant="normalized"):
+    return (exercise_id, None, "female", variant)
+
+
+def test_evicts_least_recently_used_by_bytes(clock):
+    cache = AudioLRUCache(max_bytes=300, max_item_bytes=200, ttl_seconds=60)
+    for i in (1, 2, 3):
+        assert cache.put(key(i), clip(100))
+    assert cache.get(key(1)) is not None  # 2 is now the oldest
+    assert cache.put(key(4), clip(150))
+    assert cache.get(key(2)) is None
+    assert cache.get(key(3)) is None
+    assert cache.get(key(1)) is not None
+    assert cache.get(key(4)) is not None
+    stats = cache.stats()
+    assert stats["bytes"] == 250
+    assert stats["evictions"] == 2
+
+
+def test_rejects_items_over_the_item_limit(clock):
+    cache = AudioLRUCache(max_bytes=1000, max_item_bytes=100, ttl_seconds=60)
+    assert cache.put(key(1), clip(101)) is False
+    assert cache.stats()["entries"] == 0
+
+
+def test_replacing_a_key_keeps_byte_count(clock):
+    cache = AudioLRUCache(max_bytes=1000, max_item_bytes=500, ttl_seconds=60)
+    cache.put(key(1), clip(100))
+    cache.put(key(1), clip(300))
+    assert cache.stats()["bytes"] == 300
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = AudioLRUCache(max_bytes=1000, max_item_bytes=500, ttl_seconds=60)
+    cache.put(key(1), clip(100))
+    clock.now += 61
+    assert cache.get(key(1)) is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_invalidate_exercise_drops_every_variant(clock):
+    cache = AudioLRUCache(max_bytes=1000, max_item_bytes=500, ttl_seconds=60)
+    cache.put(key(1), clip(10))
+    cache.put(key(1, "opus"), clip(10))
+    cache.put(key(2), clip(10))
+    cache.invalidate_exercise(1)
+    assert cache.get(key(1)) is None
+    assert cache.get(key(1, "opus")) is None
+    assert cache.get(key(2)) is not None
+
+
+def test_as_row_matches_playback_rows():
+    row = CachedAudio(audio_format="mp3", content_hash="b" * 64, data=b"abc", source_hash="a" * 64, fallback=True).as_row()
+    assert row == {
+        "audio_format": "mp3",
+        "content_hash": "b" * 64,
+        "file_path": None,
+        "audio_data": b"abc",
+        "source_hash": "a" * 64,
+        "fallback": True,
+    }
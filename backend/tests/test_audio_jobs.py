@@ -0,0 +1,34 @@
+from audio_jobs import ANALYSIS_RATE, _parse_astats
+
+
+# astats prints per-channel blocks, then an "Overall" block; the last value wins
+ASTATS_STDERR = """
+[Parsed_astats_1 @ 0x55d0] Channel: 1
+[Parsed_astats_1 @ 0x55d0] Peak level dB: -3.500000
+[Parsed_astats_1 @ 0x55d0] RMS level dB: -20.000000
+[Parsed_astats_1 @ 0x55d0] Number of samples: 48000
+[Parsed_astats_1 @ 0x55d0] Overall
+[Parsed_astats_1 @ 0x55d0] Peak level dB: -3.010300
+[Parsed_astats_1 @ 0x55d0] RMS level dB: -18.245000
+[Parsed_astats_1 @ 0x55d0] Number of samples: 72000
+"""
+
+
+def test_parse_astats_reads_overall_block():
+    stats = _parse_astats(ASTATS_STDERR)
+    assert stats == {
+        "duration_seconds": round(72000 / ANALYSIS_RATE, 3),
+        "peak_db": -3.0103,
+        "rms_db": -18.245,
+    }
+
+
+def test_parse_astats_silence():
+    stats = _parse_astats("Peak level dB: -inf\nRMS level dB: -inf\nNumber of samples: 4800\n")
+    assert stats["peak_db"] == float("-inf")
+    assert stats["rms_db"] == float("-inf")
+    assert stats["duration_seconds"] == round(4800 / ANALYSIS_RATE, 3)
+
+
+def test_parse_astats_missing_output():
+    assert _parse_astats("") == {"duration_seconds": None, "peak_db": None, "rms_db": None}
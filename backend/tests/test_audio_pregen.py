@@ -0,0 +1,43 @@
+import json
+
+from audio_pregen import derive_audio_targets
+
+
+def test_prompt_and_kind_specific_targets():
+    config = {"question": "Ա", "choices": ["ա", " ", "բ"]}
+    assert derive_audio_targets("letter_recognition", "Pick the letter", config) == [
+        ("prompt", "Pick the letter"),
+        ("question", "Ա"),
+        ("choice_0", "ա"),
+        ("choice_2", "բ"),
+    ]
+
+
+def test_config_may_be_a_json_string():
+    config = json.dumps({"letter": "Բ", "word": "բարև"})
+    assert derive_audio_targets("char_intro", None, config) == [("letter", "Բ"), ("word", "բարև")]
+
+
+def test_invalid_config_only_yields_prompt():
+    assert derive_audio_targets("char_intro", "Listen", "{not json") == [("prompt", "Listen")]
+    assert derive_audio_targets("char_intro", "Listen", ["a"]) == [("prompt", "Listen")]
+
+
+def test_sentence_order_falls_back_to_joined_tokens():
+    targets = derive_audio_targets("sentence_order", "", {"tokens": ["Ես", "եմ"]})
+    assert targets == [("sentence", "Ես եմ"), ("token_0", "Ես"), ("token_1", "եմ")]
+
+
+def test_match_pairs_targets():
+    config = {"pairs": [{"a": "շուն", "b": "dog"}, "bad"]}
+    assert derive_audio_targets("match_pairs", None, config) == [("pair_0_a", "շուն"), ("pair_0_b", "dog")]
+
+
+def test_unknown_kind_uses_generic_lists_and_dedupes_keys():
+    config = {"choices": ["a"], "options": ["b"], "tokens": ["c"]}
+    assert derive_audio_targets("something_new", None, config) == [
+        ("choices_0", "a"),
+        ("options_0", "b"),
+        ("tokens_0", "c"),
+    ]
+    assert derive_audio_targets(None, "x", {}) == [("prompt", "x")]
@@ -0,0 +1,15 @@
+import io
+
+import audio_store
+
+
+def test_store_root_is_created_on_first_use(tmp_path, monkeypatch):
+    root = tmp_path / "store"
+    monkeypatch.setenv("AUDIO_STORE_DIR", str(root))
+    monkeypatch.setattr(audio_store, "_root", None)
+    assert not root.exists()
+
+    stored = audio_store.put_stream(io.BytesIO(b"abc"), "mp3", max_bytes=10)
+
+    assert audio_store.store_root() == root
+    assert audio_store.resolve(stored.file_path) == root / stored.file_path
@@ -0,0 +1,89 @@
+import httpx
+import pytest
+
+from brevo_sync import attributes_hash, contact_attributes
+from circuit_breaker import CircuitBreaker
+from integrations import brevo
+
+
+# ---------- attributes_hash ----------
+
+def test_hash_ignores_key_order_and_email_case():
+    a = attributes_hash("Ana@Example.com", {"XP_TOTAL": 10, "USERNAME": "ana"})
+    b = attributes_hash("ana@example.com", {"USERNAME": "ana", "XP_TOTAL": 10})
+    assert a == b
+
+
+def test_hash_ignores_unsent_none_values():
+    assert attributes_hash("a@x", {"BIO": None, "XP_TOTAL": 1}) == attributes_hash("a@x", {"XP_TOTAL": 1})
+
+
+def test_hash_changes_with_any_sent_attribute():
+    row = {"id": 1, "username": "ana", "total_xp": 10, "streak_days": 2}
+    base = attributes_hash("a@x", contact_attributes(row))
+    assert attributes_hash("a@x", contact_attributes({**row, "streak_days": 3})) != base
+    assert attributes_hash("b@x", contact_attributes(row)) != base
+
+
+# ---------- import_contacts ----------
+
+CONTACTS = [{"email": "a@x", "attributes": {"XP_TOTAL": 1}}, {"email": "b@x", "attributes": {"BIO": None}}]
+
+
+class FakeBrevo:
+    def __init__(self):
+        self.sent = []
+        self.answer = lambda url, payload: 201
+
+
+@pytest.fixture
+def brevo_api(monkeypatch):
+    """Brevo enabled, every request answered with the status from `answer(url, payload)`."""
+    monkeypatch.setenv("BREVO_ENABLED", "true")
+    monkeypatch.setenv("BREVO_API_KEY", "test-key")
+    monkeypatch.delenv("BREVO_LIST_ID", raising=False)
+    api = FakeBrevo()
+
+    class FakeClient:
+        def __init__(self, timeout):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def post(self, url, headers, json):
+            api.sent.append((url, json))
+            return httpx.Response(api.answer(url, json))
+
+    monkeypatch.setattr(brevo.httpx, "Client", FakeClient)
+    # a fresh breaker, so failures here don't leak into other tests
+    monkeypatch.setattr(brevo, "brevo_breaker", CircuitBreaker("brevo", latency_budget=5.0, slow_call_seconds=2.0))
+    return api
+
+
+def test_import_returns_every_email_when_accepted(brevo_api):
+    brevo_api.answer = lambda url, payload: 202
+    assert brevo.import_contacts(CONTACTS, list_id=3) == {"a@x", "b@x"}
+    (url, payload), = brevo_api.sent
+    assert url.endswith("/contacts/import")
+    assert payload["jsonBody"][1] == {"email": "b@x", "attributes": {}}
+
+
+def test_rejected_import_accepts_nobody(brevo_api):
+    brevo_api.answer = lambda url, payload: 400
+    assert brevo.import_contacts(CONTACTS, list_id=3) == set()
+
+
+def test_listless_fallback_reports_each_contact(brevo_api):
+    brevo_api.answer = lambda url, payload: 400 if payload["email"] == "b@x" else 201
+    assert brevo.import_contacts(CONTACTS) == {"a@x"}
+    assert [p["email"] for _, p in brevo_api.sent] == ["a@x", "b@x"]
+
+
+def test_server_errors_are_retryable(brevo_api):
+    brevo_api.answer = lambda url, payload: 503
+    with pytest.raises(brevo.BrevoError):
+        brevo.import_contacts(CONTACTS, list_id=3)
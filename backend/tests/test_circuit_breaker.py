@@ -0,0 +1,155 @@
+import asyncio
+
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = FakeClock()
+    monkeypatch.setattr(circuit_breaker, "time", c)
+    return c
+
+
+def make(**kw):
+    opts = {"latency_budget": 1.0, "slow_call_seconds": 0.5, "min_calls": 4, "open_seconds": 30.0}
+    opts.update(kw)
+    return CircuitBreaker("test", **opts)
+
+
+def trip(b):
+    for _ in range(b.min_calls):
+        b.before_call()
+        b.record(0.01, failed=True)
+    assert b.state == OPEN
+
+
+def test_stays_closed_below_min_calls(clock):
+    b = make()
+    for _ in range(3):
+        b.before_call()
+        b.record(0.01, failed=True)
+    assert b.state == CLOSED
+
+
+def test_opens_at_failure_ratio(clock):
+    b = make()
+    for failed in (False, False, True, True):
+        b.before_call()
+        b.record(0.01, failed=failed)
+    assert b.state == OPEN
+    assert b.times_opened == 1
+
+
+def test_opens_when_most_calls_are_slow(clock):
+    b = make()
+    for _ in range(4):
+        b.before_call()
+        b.record(0.6, failed=False)
+    assert b.state == OPEN
+
+
+def test_old_outcomes_leave_the_window(clock):
+    b = make()
+    for _ in range(3):
+        b.record(0.01, failed=True)
+    clock.now += 61
+    for failed in (False, False, False, True):
+        b.record(0.01, failed=failed)
+    assert b.state == CLOSED
+
+
+def test_open_breaker_rejects_until_open_seconds_pass(clock):
+    b = make()
+    trip(b)
+    clock.now += 10
+    with pytest.raises(CircuitOpen) as exc:
+        b.before_call()
+    assert exc.value.retry_after == pytest.approx(20.0)
+    assert b.rejected == 1
+
+
+def test_half_open_lets_a_limited_number_of_probes_through(clock):
+    b = make()
+    trip(b)
+    clock.now += 31
+    b.before_call()
+    assert b.state == HALF_OPEN
+    with pytest.raises(CircuitOpen):
+        b.before_call()
+
+
+def test_successful_probe_closes(clock):
+    b = make()
+    trip(b)
+    clock.now += 31
+    b.before_call()
+    b.record(0.01, failed=False)
+    assert b.state == CLOSED
+    assert b.metrics()["window"]["calls"] == 0
+
+
+@pytest.mark.parametrize("duration, failed", [(0.01, True), (0.6, False)])
+def test_failed_or_slow_probe_reopens(clock, duration, failed):
+    b = make()
+    trip(b)
+    clock.now += 31
+    b.before_call()
+    b.record(duration, failed=failed)
+    assert b.state == OPEN
+    assert b.times_opened == 2
+    with pytest.raises(CircuitOpen):
+        b.before_call()
+
+
+def test_released_probe_slot_can_be_reused(clock):
+    b = make()
+    trip(b)
+    clock.now += 31
+    b.before_call()
+    b.release()
+    b.before_call()
+    assert b.state == HALF_OPEN
+
+
+def test_late_result_while_open_is_ignored(clock):
+    b = make()
+    trip(b)
+    b.record(0.01, failed=False)
+    assert b.state == OPEN
+
+
+def test_call_sync_counts_is_failure_results(clock):
+    b = make()
+    for status in (200, 503, 503, 503):
+        assert b.call_sync(lambda: status, lambda r: r >= 500) == status
+    assert b.failures == 3
+    assert b.state == OPEN
+
+
+def test_call_sync_counts_exceptions(clock):
+    b = make()
+
+    def boom():
+        raise OSError("connection reset")
+
+    with pytest.raises(OSError):
+        b.call_sync(boom)
+    assert b.failures == 1
+
+
+def test_async_call_times_out_at_latency_budget():
+    b = make(latency_budget=0.01)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(b.call(lambda: asyncio.sleep(1)))
+    assert b.failures == 1
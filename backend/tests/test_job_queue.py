@@ -0,0 +1,218 @@
+import asyncio
+import json
+from contextlib import contextmanager
+
+import pytest
+
+import job_queue
+
+
+class FakeResult:
+    def __init__(self, row):
+        self.row = row
+
+    def mappings(self):
+        return self
+
+    def first(self):
+        return self.row
+
+    def scalar(self):
+        return self.row
+
+
+class FakeEngine:
+    """Stands in for database.engine: records every statement, answers with scripted rows."""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.calls = []
+
+    @contextmanager
+    def begin(self):
+        yield self
+
+    def execute(self, stmt, params=None):
+        self.calls.append((" ".join(str(stmt).split()), params or {}))
+        return FakeResult(self.rows.pop(0) if self.rows else None)
+
+
+def _job(attempts=1, max_attempts=5, kind="test_job"):
+    return {"id": 7, "kind": kind, "payload": {"n": 1}, "attempts": attempts, "max_attempts": max_attempts}
+
+
+@pytest.fixture
+def fake_engine(monkeypatch):
+    def install(rows=()):
+        engine = FakeEngine(rows)
+        monkeypatch.setattr(job_queue, "engine", engine)
+        return engine
+
+    return install
+
+
+@pytest.fixture
+def handlers(monkeypatch):
+    registry = {}
+    monkeypatch.setattr(job_queue, "_handlers", registry)
+    return registry
+
+
+# ---------- enqueue_job ----------
+
+def test_enqueue_inserts_with_on_conflict():
+    db = FakeEngine([41])
+    assert job_queue.enqueue_job(db, "test_job", {"n": 1}, dedupe_key="k") == 41
+    (sql, params), = db.calls
+    assert "ON CONFLICT (dedupe_key) WHERE status = 'queued' DO NOTHING" in sql
+    assert params["dedupe_key"] == "k"
+
+
+def test_enqueue_reuses_the_queued_job_holding_the_key():
+    db = FakeEngine([None, 12])
+    assert job_queue.enqueue_job(db, "test_job", {}, dedupe_key="k") == 12
+    assert db.calls[1][0].startswith("SELECT id FROM jobs WHERE dedupe_key")
+
+
+def test_enqueue_inserts_again_when_the_queued_job_was_claimed_meanwhile():
+    db = FakeEngine([None, None, 13])
+    assert job_queue.enqueue_job(db, "test_job", {}, dedupe_key="k") == 13
+    assert len(db.calls) == 3
+
+
+def test_retry_only_requeues_dead_jobs():
+    db = FakeEngine([7])
+    assert job_queue.retry_job(db, 7) is True
+    sql, _ = db.calls[0]
+    assert "status = 'dead'" in sql
+    assert "dedupe_key = NULL" in sql
+
+
+# ---------- _claim_job ----------
+
+def test_claim_job_without_handlers_does_not_touch_the_db(fake_engine, handlers):
+    engine = fake_engine()
+    assert job_queue._claim_job() is None
+    assert engine.calls == []
+
+
+def test_claim_job_dead_letters_stale_jobs_before_claiming(fake_engine, handlers):
+    handlers["test_job"] = object()
+    engine = fake_engine([None, _job()])
+
+    assert job_queue._claim_job() == _job()
+
+    (stale_sql, stale_params), (claim_sql, claim_params) = engine.calls
+    assert "WHERE status = 'running'" in stale_sql
+    assert "WHEN attempts >= max_attempts THEN 'dead' ELSE 'queued'" in stale_sql
+    # requeued jobs give up their dedupe key (unique among queued jobs)
+    assert "dedupe_key = NULL" in stale_sql
+    assert stale_params == {"stale": job_queue.JOB_STALE_SECONDS}
+    assert "FOR UPDATE SKIP LOCKED" in claim_sql
+    assert claim_params == {"kinds": ["test_job"]}
+
+
+def test_claim_job_returns_none_on_empty_queue(fake_engine, handlers):
+    handlers["test_job"] = object()
+    fake_engine()
+    assert job_queue._claim_job() is None
+
+
+# ---------- _finish_job ----------
+
+def _finished(engine):
+    sql, params = engine.calls[-1]
+    assert sql.startswith("UPDATE jobs")
+    return params
+
+
+def test_finish_job_success_marks_done(fake_engine):
+    engine = fake_engine()
+    job_queue._finish_job(_job(), {"sent": 3}, None)
+    params = _finished(engine)
+    assert params["status"] == "done"
+    assert params["delay"] == 0.0
+    assert json.loads(params["result"]) == {"sent": 3}
+    assert params["error"] is None
+
+
+def test_finish_job_failure_is_retried_with_backoff(fake_engine):
+    engine = fake_engine()
+    job_queue._finish_job(_job(attempts=2), None, "boom")
+    params = _finished(engine)
+    assert params["status"] == "queued"
+    assert "dedupe_key = CASE WHEN :status = 'queued' THEN NULL" in engine.calls[-1][0]
+    base = job_queue.JOB_RETRY_BASE_SECONDS * 2
+    assert 0.75 * base <= params["delay"] <= 1.25 * base
+
+
+def test_finish_job_out_of_attempts_is_dead(fake_engine):
+    engine = fake_engine()
+    job_queue._finish_job(_job(attempts=5, max_attempts=5), None, "boom")
+    params = _finished(engine)
+    assert params["status"] == "dead"
+    assert params["delay"] == 0.0
+    assert params["error"] == "boom"
+
+
+def test_finish_job_permanent_error_is_dead_on_first_attempt(fake_engine):
+    engine = fake_engine()
+    job_queue._finish_job(_job(attempts=1), None, "bad payload", permanent=True)
+    assert _finished(engine)["status"] == "dead"
+
+
+def test_retry_delay_grows_and_is_capped():
+    for attempts in (1, 2, 3):
+        expected = job_queue.JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+        assert 0.75 * expected <= job_queue._retry_delay(attempts) <= 1.25 * expected
+    capped = job_queue._retry_delay(40)
+    assert 0.75 * job_queue.JOB_RETRY_MAX_SECONDS <= capped <= 1.25 * job_queue.JOB_RETRY_MAX_SECONDS
+
+
+# ---------- run_next_job ----------
+
+def test_run_next_job_dead_letters_permanent_errors(fake_engine, handlers):
+    async def handler(job_id, payload):
+        raise job_queue.PermanentJobError("ffmpeg failed")
+
+    handlers["test_job"] = handler
+    engine = fake_engine([None, _job(attempts=1)])
+
+    assert asyncio.run(job_queue.run_next_job()) is True
+    params = _finished(engine)
+    assert params["status"] == "dead"
+    assert params["error"] == "ffmpeg failed"
+
+
+def test_run_next_job_retries_transient_errors(fake_engine, handlers):
+    async def handler(job_id, payload):
+        raise RuntimeError("upstream 503")
+
+    handlers["test_job"] = handler
+    engine = fake_engine([None, _job(attempts=1)])
+
+    assert asyncio.run(job_queue.run_next_job()) is True
+    assert _finished(engine)["status"] == "queued"
+
+
+def test_run_next_job_passes_payload_and_stores_result(fake_engine, handlers):
+    seen = []
+
+    async def handler(job_id, payload):
+        seen.append((job_id, payload))
+        return {"ok": True}
+
+    handlers["test_job"] = handler
+    engine = fake_engine([None, _job()])
+
+    assert asyncio.run(job_queue.run_next_job()) is True
+    assert seen == [(7, {"n": 1})]
+    params = _finished(engine)
+    assert params["status"] == "done"
+    assert json.loads(params["result"]) == {"ok": True}
+
+
+def test_run_next_job_idle_queue(fake_engine, handlers):
+    handlers["test_job"] = object()
+    fake_engine()
+    assert asyncio.run(job_queue.run_next_job()) is False
@@ -0,0 +1,116 @@
+import json
+
+import pytest
+from starlette.requests import Request
+
+import audio_pack
+import routes
+from http_compression import PayloadCache
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+class FakeDB:
+    def __init__(self, content_version, packs=None, voice_pref=None):
+        self.content_version = content_version
+        self.packs = packs or {}
+        self.voice_pref = voice_pref
+
+    def execute(self, stmt, params=None):
+        sql = str(stmt)
+        if "content_version FROM course_path" in sql:
+            return FakeResult(self.content_version)
+        if "packs ->> :voice" in sql:
+            return FakeResult(self.packs.get(params["voice"]))
+        if "FROM user_onboarding" in sql:
+            return FakeResult(self.voice_pref)
+        raise AssertionError(sql)
+
+
+def _request():
+    return Request({"type": "http", "method": "GET", "headers": []})
+
+
+@pytest.fixture
+def lesson_rows(monkeypatch):
+    """Each build of the lesson payload returns the next revision of the lesson."""
+    builds = []
+
+    def load(db, slug):
+        builds.append(slug)
+        return {"slug": slug, "revision": len(builds)}
+
+    monkeypatch.setattr(routes, "lesson_payload_cache", PayloadCache(ttl_seconds=300))
+    monkeypatch.setattr(routes, "_load_lesson_with_exercises", load)
+    return builds
+
+
+def _revision(response):
+    return json.loads(response.body)["revision"]
+
+
+def get_lesson(db, voice=None, authorization=None):
+    return routes.get_lesson("alphabet-1", _request(), voice=voice, authorization=authorization, db=db)
+
+
+def test_lesson_payload_is_built_once_per_content_version(lesson_rows):
+    db = FakeDB(content_version=4)
+    assert _revision(get_lesson(db)) == 1
+    assert _revision(get_lesson(db)) == 1
+    assert lesson_rows == ["alphabet-1"]
+
+
+def test_cms_write_in_any_worker_retires_the_cached_payload(lesson_rows):
+    db = FakeDB(content_version=4)
+    get_lesson(db)
+    # another process committed a CMS edit (course_path.content_version bumped)
+    db.content_version = 5
+    assert _revision(get_lesson(db)) == 2
+
+
+# ---------- Link preload ----------
+
+PACK = "0" * 32
+
+
+@pytest.fixture
+def packs_on_disk(monkeypatch):
+    monkeypatch.setattr(audio_pack, "open_pack", lambda pack_id: object() if pack_id == PACK else None)
+
+
+def test_preloads_the_pack_for_the_requested_voice(lesson_rows, packs_on_disk):
+    r = get_lesson(FakeDB(4, packs={"male": PACK}), voice="male")
+    assert r.headers["Link"] == f"</audio/packs/{PACK}>; rel=preload; as=fetch; crossorigin=anonymous"
+    assert "Link" not in get_lesson(FakeDB(4, packs={"male": PACK}), voice="female").headers
+
+
+def test_random_voice_preloads_the_two_voice_pack(lesson_rows, packs_on_disk):
+    assert PACK in get_lesson(FakeDB(4, packs={"": PACK}), voice="all").headers["Link"]
+
+
+def test_voice_falls_back_to_the_users_onboarding_preference(lesson_rows, packs_on_disk, monkeypatch):
+    monkeypatch.setattr(routes, "_get_user_id_from_bearer", lambda authorization: 9)
+    r = get_lesson(FakeDB(4, packs={"male": PACK}, voice_pref="Male"), authorization="Bearer t")
+    assert PACK in r.headers["Link"]
+
+
+def test_no_preload_when_the_voice_is_unknown(lesson_rows, packs_on_disk):
+    assert "Link" not in get_lesson(FakeDB(4, packs={"female": PACK, "": PACK})).headers
+
+
+def test_no_preload_for_a_pack_missing_from_disk(lesson_rows, packs_on_disk):
+    assert "Link" not in get_lesson(FakeDB(4, packs={"female": "f" * 32}), voice="female").headers
+
+
+@pytest.mark.parametrize(
+    "pref, expected",
+    [("Male", "male"), ("female", "female"), ("Random", ""), ("Both", ""), ("all", ""), (None, "female"), ("x", "female")],
+)
+def test_pack_voice_matches_the_client(pref, expected):
+    assert audio_pack.pack_voice(pref) == expected
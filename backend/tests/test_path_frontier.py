@@ -0,0 +1,105 @@
+import pytest
+
+import lesson_analytics
+import routes
+
+
+class FakeResult:
+    def __init__(self, row):
+        self.row = row
+
+    def mappings(self):
+        return self
+
+    def first(self):
+        return self.row
+
+
+class FakeDB:
+    """Request connection answering the frontier queries from in-memory state."""
+
+    def __init__(self, frontier, path_index, version=3, stored_version=3, first_open=None, lessons_total=10):
+        self.frontier = frontier
+        self.stored_version = stored_version
+        self.version = version
+        self.path_index = path_index
+        self.first_open = first_open
+        self.lessons_total = lessons_total
+        self.stored = []
+        self.statements = []
+
+    def execute(self, stmt, params=None):
+        sql = " ".join(str(stmt).split())
+        params = params or {}
+        self.statements.append(sql)
+        if "LEFT JOIN user_path_state" in sql:
+            return FakeResult({"version": self.version, "frontier_index": self.frontier, "path_version": self.stored_version})
+        if sql.startswith("SELECT l.path_index, cp.version"):
+            return FakeResult({"path_index": self.path_index, "version": self.version})
+        if "AS first_open" in sql:
+            return FakeResult({"first_open": self.first_open, "lessons_total": self.lessons_total})
+        if sql.startswith("INSERT INTO user_path_state"):
+            self.stored.append((params["f"], params["v"]))
+            self.frontier, self.stored_version = params["f"], params["v"]
+        return FakeResult(None)
+
+
+# ---------- _update_path_frontier ----------
+
+def test_completing_the_frontier_lesson_advances_past_completed_ones():
+    db = FakeDB(frontier=4, path_index=4, first_open=7)
+    routes._update_path_frontier(db, 1, 40, True)
+    assert db.stored == [(7, 3)]
+
+
+def test_completing_the_last_lesson_moves_frontier_to_the_end():
+    db = FakeDB(frontier=9, path_index=9, first_open=None, lessons_total=10)
+    routes._update_path_frontier(db, 1, 90, True)
+    assert db.stored == [(10, 3)]
+
+
+def test_lesson_falling_back_below_the_frontier_moves_it_back():
+    db = FakeDB(frontier=6, path_index=2)
+    routes._update_path_frontier(db, 1, 20, False)
+    assert db.stored == [(2, 3)]
+
+
+@pytest.mark.parametrize("path_index, completed", [(8, False), (2, True), (8, True)])
+def test_other_lessons_leave_the_frontier_alone(path_index, completed):
+    db = FakeDB(frontier=6, path_index=path_index)
+    routes._update_path_frontier(db, 1, 80, completed)
+    assert db.stored == []
+
+
+def test_stale_path_version_recomputes_the_frontier_first():
+    db = FakeDB(frontier=6, stored_version=2, path_index=8, first_open=3)
+    routes._update_path_frontier(db, 1, 80, False)
+    assert db.stored == [(3, 3)]
+
+
+def test_unpublished_lessons_never_hold_the_frontier():
+    db = FakeDB(frontier=4, path_index=4, first_open=7)
+    routes._update_path_frontier(db, 1, 40, True)
+    first_open_sql, = [s for s in db.statements if "AS first_open" in s]
+    assert "AND l.is_published = true" in first_open_sql
+
+
+# ---------- lesson_reset ----------
+
+def test_resetting_a_completed_lesson_moves_the_frontier_back(monkeypatch):
+    monkeypatch.setattr(lesson_analytics, "_get_user_id_from_bearer", lambda authorization: 1)
+    db = FakeDB(frontier=6, path_index=2)
+
+    assert lesson_analytics.lesson_reset(20, authorization="Bearer t", db=db) == {"ok": True}
+
+    assert any(s.startswith("UPDATE user_lesson_progress") and "completed_at = NULL" in s for s in db.statements)
+    assert db.stored == [(2, 3)]
+
+
+def test_resetting_an_open_lesson_keeps_the_frontier(monkeypatch):
+    monkeypatch.setattr(lesson_analytics, "_get_user_id_from_bearer", lambda authorization: 1)
+    db = FakeDB(frontier=6, path_index=6)
+
+    lesson_analytics.lesson_reset(60, authorization="Bearer t", db=db)
+
+    assert db.stored == []
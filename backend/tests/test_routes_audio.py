@@ -0,0 +1,199 @@
+import asyncio
+import io
+
+import httpx
+import pytest
+from fastapi import HTTPException, UploadFile
+from starlette.requests import Request
+
+import audio_store
+import routes_audio
+from audio_store import url_version
+from circuit_breaker import CircuitBreaker
+from routes_audio import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, _audio_response, _parse_range
+
+
+# ---------- _parse_range ----------
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("bytes=0-99", (0, 99)),
+        ("bytes=100-", (100, 999)),
+        ("bytes=-100", (900, 999)),
+        ("bytes=-5000", (0, 999)),
+        ("bytes=500-5000", (500, 999)),
+        ("BYTES = 0-0", (0, 0)),
+    ],
+)
+def test_parse_range(header, expected):
+    assert _parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["items=0-1", "bytes=0-1,5-6", "bytes=a-b", "bytes=-0"])
+def test_parse_range_unhandled_falls_back_to_full_response(header):
+    assert _parse_range(header, 1000) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=50-10"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(HTTPException) as exc:
+        _parse_range(header, 1000)
+    assert exc.value.status_code == 416
+    assert exc.value.headers["Content-Range"] == "bytes */1000"
+
+
+# ---------- _audio_response ----------
+
+SOURCE = "a" * 64
+
+
+def _request(headers=()):
+    return Request({"type": "http", "method": "GET", "headers": [(k.encode(), v.encode()) for k, v in headers]})
+
+
+def _row(**kw):
+    row = {
+        "audio_format": "mp3",
+        "content_hash": SOURCE,
+        "file_path": None,
+        "audio_data": b"0123456789",
+        "source_hash": SOURCE,
+    }
+    row.update(kw)
+    return row
+
+
+def test_versioned_clip_is_immutable():
+    r = _audio_response(_request(), _row(), version=url_version(SOURCE))
+    assert r.headers["Cache-Control"] == IMMUTABLE_CACHE_CONTROL
+
+
+def test_variant_shares_the_original_version():
+    r = _audio_response(_request(), _row(content_hash="b" * 64), version=url_version(SOURCE))
+    assert r.headers["Cache-Control"] == IMMUTABLE_CACHE_CONTROL
+
+
+def test_fallback_original_is_not_pinned_under_the_versioned_url():
+    r = _audio_response(_request(), _row(fallback=True), version=url_version(SOURCE))
+    assert r.headers["Cache-Control"] == REVALIDATE_CACHE_CONTROL
+
+
+def test_unversioned_or_stale_version_revalidates():
+    assert _audio_response(_request(), _row()).headers["Cache-Control"] == REVALIDATE_CACHE_CONTROL
+    r = _audio_response(_request(), _row(), version="deadbeef")
+    assert r.headers["Cache-Control"] == REVALIDATE_CACHE_CONTROL
+
+
+def test_matching_etag_is_not_modified():
+    r = _audio_response(_request([("if-none-match", f'"{SOURCE}"')]), _row())
+    assert r.status_code == 304
+
+
+def test_byte_range_from_bytea_row():
+    r = _audio_response(_request([("range", "bytes=2-4")]), _row())
+    assert r.status_code == 206
+    assert r.body == b"234"
+    assert r.headers["Content-Range"] == "bytes 2-4/10"
+
+
+# ---------- _post_with_retry ----------
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class FakeTTS:
+    """ElevenLabs stand-in answering each POST with the next scripted status (or exception)."""
+
+    def __init__(self, clock, answers, seconds_per_call=0.0):
+        self.clock = clock
+        self.answers = list(answers)
+        self.seconds_per_call = seconds_per_call
+        self.calls = 0
+
+    async def post(self, url, headers, json):
+        self.calls += 1
+        self.clock.now += self.seconds_per_call
+        answer = self.answers.pop(0) if len(self.answers) > 1 else self.answers[0]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+@pytest.fixture
+def retry_clock(monkeypatch):
+    clock = FakeClock()
+
+    async def sleep(seconds):
+        clock.now += seconds
+
+    monkeypatch.setattr(routes_audio, "time", clock)
+    monkeypatch.setattr(routes_audio.asyncio, "sleep", sleep)
+    monkeypatch.setattr(routes_audio, "random", type("R", (), {"random": staticmethod(lambda: 0.5)}))
+    monkeypatch.setattr(routes_audio, "TTS_RETRY_BASE_SECONDS", 1.0)
+    monkeypatch.setattr(routes_audio, "TTS_RETRY_DEADLINE_SECONDS", 20.0)
+    monkeypatch.setattr(
+        routes_audio, "eleven_breaker", CircuitBreaker("test", latency_budget=20.0, slow_call_seconds=10.0)
+    )
+    return clock
+
+
+def _post(client):
+    return asyncio.run(routes_audio._post_with_retry(client, "https://tts", {}, {}))
+
+
+def test_transient_errors_are_retried(retry_clock):
+    client = FakeTTS(retry_clock, [httpx.Response(503), httpx.Response(200)])
+    assert _post(client).status_code == 200
+    assert client.calls == 2
+
+
+def test_retries_stop_at_the_deadline(retry_clock):
+    client = FakeTTS(retry_clock, [httpx.Response(503)], seconds_per_call=5.0)
+    assert _post(client).status_code == 503
+    # 5s + 1s backoff + 5s + 2s backoff + 5s; a further 4s backoff would pass the 20s deadline
+    assert client.calls == 3
+    assert retry_clock.now - 1000.0 < 20.0
+
+
+def test_long_retry_after_is_not_waited_for(retry_clock):
+    client = FakeTTS(retry_clock, [httpx.Response(429, headers={"retry-after": "30"})])
+    assert _post(client).status_code == 429
+    assert client.calls == 1
+
+
+def test_retries_stop_once_the_breaker_opens(retry_clock, monkeypatch):
+    monkeypatch.setattr(
+        routes_audio,
+        "eleven_breaker",
+        CircuitBreaker("test", latency_budget=20.0, slow_call_seconds=10.0, min_calls=2),
+    )
+    client = FakeTTS(retry_clock, [httpx.Response(503)])
+    assert _post(client).status_code == 503
+    assert client.calls == 2
+
+
+def test_transport_error_is_raised_when_out_of_time(retry_clock):
+    client = FakeTTS(retry_clock, [httpx.ConnectError("refused")], seconds_per_call=19.5)
+    with pytest.raises(httpx.ConnectError):
+        _post(client)
+    assert client.calls == 1
+
+
+# ---------- _store_upload ----------
+
+@pytest.mark.parametrize("declared_size", [None, routes_audio.MAX_AUDIO_SIZE + 1])
+def test_oversized_upload_is_413(declared_size, tmp_path, monkeypatch):
+    monkeypatch.setattr(routes_audio, "MAX_AUDIO_SIZE", 4)
+    monkeypatch.setenv("AUDIO_STORE_DIR", str(tmp_path))
+    monkeypatch.setattr(audio_store, "_root", None)
+    upload = UploadFile(io.BytesIO(b"too long"), size=declared_size)
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(routes_audio._store_upload(upload, "mp3", "Empty file"))
+    assert exc.value.status_code == 413
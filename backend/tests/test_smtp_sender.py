@@ -0,0 +1,74 @@
+import smtplib
+from email.message import EmailMessage
+
+import pytest
+
+import smtp_sender
+from smtp_sender import SMTPPool
+
+
+class FakeSMTP:
+    """smtplib.SMTP stand-in; `drop_next` makes the next send fail like a dropped connection."""
+
+    drop_next = 0
+
+    def __init__(self, host, port, timeout):
+        pass
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def noop(self):
+        return (250, b"ok")
+
+    def send_message(self, msg):
+        if FakeSMTP.drop_next:
+            FakeSMTP.drop_next -= 1
+            raise smtplib.SMTPServerDisconnected("gone")
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(smtp_sender.smtplib, "SMTP", FakeSMTP)
+    monkeypatch.setattr(FakeSMTP, "drop_next", 0)
+    p = SMTPPool({"host": "localhost", "port": 25, "user": "u", "password": "p"}, size=4)
+    yield p
+    p.close()
+
+
+def _messages(n):
+    out = []
+    for i in range(n):
+        msg = EmailMessage()
+        msg["To"] = f"user{i}@example.com"
+        out.append(msg)
+    return out
+
+
+def test_counters_add_up_across_threads(pool, monkeypatch):
+    monkeypatch.setattr(smtp_sender, "SMTP_MAX_MESSAGES_PER_SESSION", 10)
+    assert pool.send_many(_messages(400)) == [None] * 400
+    stats = pool.stats()
+    assert stats["messages_sent"] == 400
+    # every session is recycled after 10 messages
+    assert stats["sessions_opened"] >= 40
+    assert stats["reconnects"] == 0
+
+
+def test_dropped_connection_is_reopened_and_counted(pool):
+    pool.send(_messages(1)[0])
+    FakeSMTP.drop_next = 1
+    pool.send(_messages(1)[0])
+    stats = pool.stats()
+    assert stats["messages_sent"] == 2
+    assert stats["reconnects"] == 1
+    assert stats["sessions_opened"] == 2
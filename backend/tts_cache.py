@@ -0,0 +1,218 @@
+"""
+backend/tts_cache.py
+Disk cache for the legacy /tts endpoint.
+
+- TTSDiskCache: MP3s sharded as ab/cd/<key>.mp3, file I/O in the threadpool,
+  total size capped with LRU eviction (index built at startup).
+- SingleFlight coalesces concurrent cache misses: when many learners request the
+  same uncached sentence at once (typically right after a lesson is published),
+  only the first request calls ElevenLabs and the others await its result.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from audio_store import write_atomic
+
+
+T = TypeVar("T")
+
+# voice used by /tts when the client doesn't pass one
+TTS_DEFAULT_VOICE_ID = "JBFqnCBsd6RMkjVDRZzb"
+
+
+def tts_cache_key(text_value: str, voice_id: str, model_id: str) -> str:
+    h = hashlib.sha256()
+    h.update(model_id.encode("utf-8"))
+    h.update(b"\n")
+    h.update(voice_id.encode("utf-8"))
+    h.update(b"\n")
+    h.update(text_value.encode("utf-8"))
+    return h.hexdigest()
+
+
+class SingleFlight:
+    """In-process request coalescing keyed by string (per worker, asyncio only)."""
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        while (fut := self._inflight.get(key)) is not None:
+            try:
+                # shield: a cancelled follower must not cancel the leader's call
+                return await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                if not fut.cancelled():
+                    raise
+                # the leader's request went away; retry (possibly as the new leader)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            # mark retrieved so an error with no followers isn't logged as never retrieved
+            fut.exception()
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+
+class TTSDiskCache:
+    """Size-capped MP3 cache on disk.
+
+    The in-memory index (key -> size, LRU order) is per worker. Lookups always
+    try the file itself, so entries written by other workers are still hits;
+    eviction is therefore approximate across workers, which is fine for a cache.
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def path_for(self, key: str) -> Path:
+        return self.root / key[:2] / key[2:4] / f"{key}.mp3"
+
+    # ---------- index ----------
+
+    def _track(self, key: str, size: int) -> None:
+        with self._lock:
+            old = self._index.pop(key, None)
+            if old is not None:
+                self._bytes -= old
+            self._index[key] = size
+            self._bytes += size
+
+    def _untrack(self, key: str) -> None:
+        with self._lock:
+            old = self._index.pop(key, None)
+            if old is not None:
+                self._bytes -= old
+
+    def forget(self, key: str) -> None:
+        """Drop a key from the index after its file was removed outside the cache."""
+        self._untrack(key)
+
+    def _scan(self) -> list[tuple[float, str, int]]:
+        self.root.mkdir(parents=True, exist_ok=True)
+        found: dict[str, tuple[float, str, int]] = {}
+        # list() first: files moved into shards below must not be walked twice
+        for p in list(self.root.rglob("*.mp3")):
+            key = p.stem
+            if p.parent == self.root:
+                # pre-sharding flat layout: move it into its shard
+                dest = self.path_for(key)
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    os.replace(p, dest)
+                except OSError:
+                    continue
+                p = dest
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            found[key] = (max(st.st_atime, st.st_mtime), key, st.st_size)
+        return list(found.values())
+
+    async def load_index(self) -> None:
+        """Scan the cache directory (threadpool) and evict down to the cap."""
+        found = await asyncio.to_thread(self._scan)
+        found.sort()  # oldest first == least recently used
+        with self._lock:
+            self._index = OrderedDict((key, size) for _, key, size in found)
+            self._bytes = sum(size for _, _, size in found)
+            self.loaded = True
+        await self._evict()
+
+    # ---------- reads / writes ----------
+
+    async def get(self, key: str) -> Optional[bytes]:
+        path = self.path_for(key)
+        try:
+            data = await asyncio.to_thread(path.read_bytes)
+        except FileNotFoundError:
+            data = b""
+        if not data:
+            self._untrack(key)
+            self.misses += 1
+            return None
+        self._track(key, len(data))
+        self.hits += 1
+        return data
+
+    async def put(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(write_atomic, self.path_for(key), data)
+        self._track(key, len(data))
+        await self._evict()
+
+    async def _evict(self) -> None:
+        victims = []
+        with self._lock:
+            while self._index and self._bytes > self.max_bytes:
+                key, size = self._index.popitem(last=False)
+                self._bytes -= size
+                self.evictions += 1
+                victims.append(self.path_for(key))
+        if victims:
+            await asyncio.to_thread(_unlink_all, victims)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "root": str(self.root),
+                "index_loaded": self.loaded,
+                "entries": len(self._index),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "inflight": tts_flight.inflight(),
+            }
+
+
+def _unlink_all(paths: list[Path]) -> None:
+    for p in paths:
+        try:
+            p.unlink()
+        except OSError:
+            pass
+
+
+def _tts_cache_dir() -> Path:
+    base = os.getenv("AUDIO_DIR", "")
+    if base:
+        return Path(base) / "tts_cache"
+    return Path(__file__).resolve().parent / "uploads" / "tts_cache"
+
+
+tts_flight = SingleFlight()
+tts_disk_cache = TTSDiskCache(
+    _tts_cache_dir(),
+    max_bytes=int(os.getenv("TTS_CACHE_MAX_MB", "512")) * 1024 * 1024,
+)
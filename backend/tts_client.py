@@ -0,0 +1,103 @@
+"""
+backend/tts_client.py
+App-lifetime HTTP client for ElevenLabs.
+
+One pooled httpx.AsyncClient (keep-alive, HTTP/2 when `h2` is installed) is
+opened on startup and closed on shutdown, so TTS calls reuse warm TLS
+connections instead of handshaking on every request. The /voices list used by
+the voice-id fallback is cached with a TTL.
+
+Every ElevenLabs call goes through `eleven_breaker` (circuit_breaker.py), so a
+slow or failing upstream makes TTS fail fast instead of tying up workers.
+"""
+import asyncio
+import os
+import time
+from typing import Optional
+
+import httpx
+
+from circuit_breaker import CircuitOpen, get_breaker
+
+try:
+    import h2  # noqa: F401  (enables http2=True in httpx)
+    HTTP2_AVAILABLE = True
+except Exception:
+    HTTP2_AVAILABLE = False
+
+
+ELEVEN_API_URL = "https://api.elevenlabs.io/v1"
+
+TTS_HTTP_TIMEOUT = float(os.getenv("TTS_HTTP_TIMEOUT", "60"))
+TTS_HTTP_MAX_CONNECTIONS = int(os.getenv("TTS_HTTP_MAX_CONNECTIONS", "20"))
+TTS_HTTP_KEEPALIVE = int(os.getenv("TTS_HTTP_KEEPALIVE", "10"))
+VOICES_TTL_SECONDS = float(os.getenv("ELEVEN_VOICES_TTL_SECONDS", "3600"))
+
+# Synthesis of a sentence normally takes 1-5 s.
+eleven_breaker = get_breaker("elevenlabs", latency_budget=20.0, slow_call_seconds=10.0)
+
+
+def eleven_failed(response: httpx.Response) -> bool:
+    """Responses that count against the breaker (rate limits, upstream errors)."""
+    return response.status_code == 429 or response.status_code >= 500
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_tts_client() -> httpx.AsyncClient:
+    """Shared client; created lazily so scripts outside the app lifespan still work."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=TTS_HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=TTS_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=TTS_HTTP_KEEPALIVE,
+                keepalive_expiry=60.0,
+            ),
+        )
+    return _client
+
+
+async def open_tts_client() -> None:
+    get_tts_client()
+
+
+async def close_tts_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+# ------------------------------
+# Voice list cache
+# ------------------------------
+
+_voices: Optional[list] = None
+_voices_fetched_at = 0.0
+_voices_lock = asyncio.Lock()
+
+
+async def get_voices(headers: dict) -> list:
+    """Return the account's voices (GET /voices), cached for VOICES_TTL_SECONDS."""
+    global _voices, _voices_fetched_at
+    if _voices is not None and time.monotonic() - _voices_fetched_at < VOICES_TTL_SECONDS:
+        return _voices
+
+    async with _voices_lock:
+        # another request may have refreshed it while we waited
+        if _voices is not None and time.monotonic() - _voices_fetched_at < VOICES_TTL_SECONDS:
+            return _voices
+        try:
+            resp = await eleven_breaker.call(
+                lambda: get_tts_client().get(f"{ELEVEN_API_URL}/voices", headers=headers), eleven_failed
+            )
+        except (CircuitOpen, TimeoutError):
+            return _voices or []
+        if resp.status_code != 200:
+            return _voices or []
+        _voices = (resp.json() or {}).get("voices") or []
+        _voices_fetched_at = time.monotonic()
+        return _voices
@@ -0,0 +1,51 @@
+"""
+backend/worker.py
+Dedicated background-job worker (emails, Brevo sync, TTS pre-generation, GC).
+
+Runs the same job_queue runners as the API processes, without serving HTTP.
+When a worker is deployed, start the API with JOBS_POLLER_ENABLED=false so
+jobs only run here. Several workers can run side by side (claims use
+FOR UPDATE SKIP LOCKED).
+
+Run from backend/:
+    python worker.py [--concurrency 4]
+"""
+import argparse
+import asyncio
+import signal
+
+import routes  # noqa: F401  (registers every job handler on import)
+from audio_jobs import shutdown_audio_jobs
+from job_queue import JOB_CONCURRENCY, start_job_runners, stop_job_poller
+from mailer import close_smtp_pool
+from tts_client import close_tts_client, open_tts_client
+
+
+async def run(concurrency: int) -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await open_tts_client()
+    start_job_runners(concurrency)
+    print(f"[worker] running {concurrency} job runner(s)")
+    try:
+        await stop.wait()
+    finally:
+        print("[worker] stopping")
+        await stop_job_poller()
+        await asyncio.to_thread(close_smtp_pool)
+        await close_tts_client()
+        shutdown_audio_jobs()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run persisted background jobs.")
+    parser.add_argument("--concurrency", type=int, default=JOB_CONCURRENCY, help="jobs run at the same time")
+    args = parser.parse_args()
+    asyncio.run(run(max(1, args.concurrency)))
+
+
+if __name__ == "__main__":
+    main()
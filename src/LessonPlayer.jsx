@@ -9,6 +9,7 @@ import LessonCompletionScreen from "./LessonCompletionScreen";
 import ExerciseAnalyticsModal from "./ExerciseAnalyticsModal";
 import ExerciseShell from "./ExerciseShell";
 import { sfx } from "./lib/sfx";
+import { loadAudioManifest, loadAudioPack, packVoice } from "./exercises/tts";
 
 // 🔧 Make sure this matches your backend URL
 const API_BASE =
@@ -315,9 +316,15 @@ export default function LessonPlayer() {
       setLoading(true);
       setLoadError(null);
 
-      const url = `${API_BASE}/lessons/${slug}`;
+      // voice: the server preloads (Link header) the same audio pack loadAudioPack() downloads
+      const url = `${API_BASE}/lessons/${slug}?voice=${packVoice() || "all"}`;
       console.log("[LessonPlayer] Loading lesson from:", url);
 
+      // In parallel: which clips exist, so exercises don't probe /audio/... for 404s,
+      // and the lesson's clips in one download.
+      loadAudioManifest(API_BASE, slug);
+      loadAudioPack(API_BASE, slug);
+
       try {
         const res = await fetch(url, {
           method: "GET",
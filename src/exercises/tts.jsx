@@ -47,6 +47,105 @@ async function tryFetchTargetAudio(base, exerciseId, targetKey, voice) {
   return URL.createObjectURL(blob);
 }
 
+// ---------- Lesson audio manifest ----------
+// GET /lessons/{slug}/audio-manifest lists every stored clip of a lesson, so we
+// can go straight to the right URL (or to /tts) instead of probing for 404s.
+let manifestState = null; // { slug, promise, exerciseIds:Set, urls:Map }
+
+function manifestKey(exerciseId, targetKey, voice) {
+  return `${exerciseId}|${targetKey || ""}|${voice}`;
+}
+
+export function loadAudioManifest(apiBaseUrl, slug) {
+  if (!slug) return Promise.resolve(null);
+  if (manifestState && manifestState.slug === slug) return manifestState.promise;
+
+  const base = getBase(apiBaseUrl);
+  const state = { slug, exerciseIds: new Set(), urls: new Map(), promise: null };
+  state.promise = fetch(`${base}/lessons/${encodeURIComponent(slug)}/audio-manifest`, { method: "GET" })
+    .then((res) => (res.ok ? res.json() : null))
+    .then((data) => {
+      if (!data) return null;
+      for (const id of data.exercise_ids || []) state.exerciseIds.add(Number(id));
+      for (const it of data.items || []) {
+        state.urls.set(manifestKey(it.exercise_id, it.target_key, it.voice), `${base}${it.url}`);
+      }
+      return state;
+    })
+    .catch(() => null);
+  manifestState = state;
+  return state.promise;
+}
+
+// Returns { known: bool, url: string|null }. known=false -> manifest doesn't cover it, probe as before.
+async function lookupManifest(exerciseId, targetKey, voice) {
+  if (!manifestState) return { known: false, url: null };
+  const state = await manifestState.promise;
+  if (!state || !state.exerciseIds.has(Number(exerciseId))) return { known: false, url: null };
+  return { known: true, url: state.urls.get(manifestKey(exerciseId, targetKey, voice)) || null };
+}
+
+// ---------- Lesson audio pack ----------
+// GET /lessons/{slug}/audio-pack indexes one file holding every stored clip of
+// the lesson: download it once, then cut clips out locally (no request per clip).
+// Until the download finishes, clips are fetched by their own URL instead of
+// waiting for the whole pack.
+let packState = null; // { slug, voice, promise, ready, clips:Map, buf:ArrayBuffer }
+
+const PACK_TYPES = { mp3: "audio/mpeg", ogg: "audio/ogg", wav: "audio/wav", webm: "audio/webm" };
+
+// Voice of the lesson pack for a preference: random -> "" (pack with both voices).
+export function packVoice(voicePref) {
+  const p = normalizeVoicePref(voicePref ?? localStorage.getItem("hay_voice_pref"));
+  return p === "random" ? "" : p;
+}
+
+export function loadAudioPack(apiBaseUrl, slug, voicePref) {
+  if (!slug) return Promise.resolve(null);
+  const voice = packVoice(voicePref);
+  if (packState && packState.slug === slug && packState.voice === voice) return packState.promise;
+
+  const base = getBase(apiBaseUrl);
+  const query = voice ? `?voice=${encodeURIComponent(voice)}` : "";
+  const state = { slug, voice, ready: false, clips: new Map(), buf: null, promise: null };
+  state.promise = fetch(`${base}/lessons/${encodeURIComponent(slug)}/audio-pack${query}`, { method: "GET" })
+    .then((res) => (res.ok ? res.json() : null))
+    .then(async (index) => {
+      if (!index || !(index.clips || []).length) return null;
+      const res = await fetch(`${base}${index.url}`, { method: "GET" });
+      if (!res.ok) return null;
+      state.buf = await res.arrayBuffer();
+      for (const c of index.clips) {
+        state.clips.set(manifestKey(c.exercise_id, c.target_key, c.voice), c);
+      }
+      state.ready = true;
+      return state;
+    })
+    .catch(() => null);
+  packState = state;
+  return state.promise;
+}
+
+// Object URL for a clip from the pack, or null when the pack doesn't have it
+// (or hasn't finished downloading yet).
+function packClipUrl(exerciseId, targetKey, voice) {
+  const state = packState;
+  if (!state || !state.ready) return null;
+  const c = state.clips.get(manifestKey(exerciseId, targetKey, voice));
+  if (!c || c.offset + c.length > state.buf.byteLength) return null;
+  const blob = new Blob([new Uint8Array(state.buf, c.offset, c.length)], {
+    type: PACK_TYPES[c.format] || "audio/mpeg",
+  });
+  return URL.createObjectURL(blob);
+}
+
+async function fetchAudioUrl(url) {
+  const res = await fetch(url, { method: "GET" });
+  if (!res.ok) return null;
+  const blob = await res.blob();
+  return URL.createObjectURL(blob);
+}
+
 async function fetchLegacyTts(base, text) {
   const res = await fetch(`${base}/tts`, {
     method: "POST",
@@ -81,10 +180,20 @@ export async function ttsFetch(apiBaseUrl, input) {
     for (const v of voiceCandidates(voicePref)) {
       // 0) If per-target audio exists, prefer it.
       if (targetKey) {
-        const tu = await tryFetchTargetAudio(base, exerciseId, targetKey, v);
+        const packed = packClipUrl(exerciseId, targetKey, v);
+        if (packed) return packed;
+        const m = await lookupManifest(exerciseId, targetKey, v);
+        const tu = m.known
+          ? m.url && (await fetchAudioUrl(m.url))
+          : await tryFetchTargetAudio(base, exerciseId, targetKey, v);
         if (tu) return tu;
       }
-      const u = await tryFetchExerciseAudio(base, exerciseId, v);
+      const packed = packClipUrl(exerciseId, null, v);
+      if (packed) return packed;
+      const m = await lookupManifest(exerciseId, null, v);
+      const u = m.known
+        ? m.url && (await fetchAudioUrl(m.url))
+        : await tryFetchExerciseAudio(base, exerciseId, v);
       if (u) return u;
     }
   }